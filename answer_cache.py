@@ -0,0 +1,129 @@
+"""
+ذاكرة دائمة لردود المساعد على الأسئلة العامة
+الأسئلة المتكررة ("ما هي أركان الإسلام؟") تُجاب من قاعدة SQLite محلية بدلاً من
+تشغيل جديد للمساعد. المفتاح هو السؤال بعد نفس التوحيد المستخدم في البحث،
+ولكل رد مدة صلاحية، ويُحذف الأقدم استخداماً عند تجاوز الحد.
+الأسئلة المعتمدة على سياق المحادثة ("وضح هذا أكثر") لا تُخزن ولا تُجاب من الذاكرة.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from arabic_normalizer import content_terms, light_stem, normalize_arabic, normalize_phrase, normalize_terms
+
+# كلمات تدل على أن السؤال يشير إلى ما سبق في المحادثة
+_FOLLOW_UP_MARKERS = """
+هذا هذه ذلك تلك هؤلاء اولئك ذاك السابق السابقه سابقا قبل اكثر ايضا كذلك مجددا ثانيه تابع اكمل وضح
+this that these those it its they them more above previous again earlier also continue elaborate
+"""
+FOLLOW_UP_MARKERS = frozenset(light_stem(normalize_arabic(word)) for word in _FOLLOW_UP_MARKERS.split())
+
+
+def is_follow_up(text: str) -> bool:
+    """هل يعتمد السؤال على سياق المحادثة فلا يصلح رده لغير صاحبه"""
+    terms = normalize_terms(text)
+    return not content_terms(text) or any(term in FOLLOW_UP_MARKERS for term in terms)
+
+
+class AnswerCache:
+    """ردود المساعد في SQLite مع مدة صلاحية وحذف الأقدم استخداماً"""
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_entries: int = 10000, namespace: str = "",
+                 clock: Callable[[], float] = time.time):
+        """namespace: يفصل ردود المساعدين المختلفين في نفس الملف (معرف المساعد)"""
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.namespace = namespace
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self._connection.commit()
+        self._size = self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def key(self, question: str) -> Optional[str]:
+        """مفتاح السؤال الموحد، أو None إن كان لا يصلح للتخزين"""
+        if self.ttl <= 0 or self.max_entries <= 0 or is_follow_up(question):
+            return None
+        phrase = normalize_phrase(question)
+        return f"{self.namespace}\x1f{phrase}" if phrase else None
+
+    def get(self, question: str) -> Optional[str]:
+        """الرد المحفوظ للسؤال إن وُجد ولم تنته صلاحيته"""
+        key = self.key(question)
+        if key is None:
+            self.bypassed += 1
+            return None
+
+        now = self.clock()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT answer, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self._connection.commit()
+                    self._size -= 1
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, question: str, answer: str):
+        """حفظ رد السؤال وحذف الأقدم استخداماً عند تجاوز الحد"""
+        key = self.key(question)
+        if key is None or not answer:
+            return
+
+        now = self.clock()
+        with self._lock:
+            inserted = self._connection.execute(
+                "INSERT OR IGNORE INTO answers (key, answer, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, answer, now, now)
+            ).rowcount
+            if inserted:
+                self._size += 1
+            else:
+                self._connection.execute(
+                    "UPDATE answers SET answer = ?, created = ?, last_used = ? WHERE key = ?",
+                    (answer, now, now, key)
+                )
+            if self._size > self.max_entries:
+                self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now: float):
+        """حذف المنتهية صلاحيتها ثم الأقدم استخداماً حتى 90% من الحد"""
+        self._connection.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        self._size = self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        excess = self._size - int(self.max_entries * 0.9)
+        if excess > 0:
+            self._connection.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._size -= excess
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bypassed": self.bypassed, "size": self._size}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
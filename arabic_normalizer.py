@@ -0,0 +1,91 @@
+"""
+توحيد الكتابة العربية والتجذيع الخفيف
+يُطبق بنفس الطريقة عند بناء الفهارس وعند معالجة الاستعلام حتى تتطابق
+صيغ الكتابة المختلفة (أشكال الألف، التاء المربوطة، التشكيل، السوابق)
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+
+# جدول تحويل محسوب مرة واحدة: توحيد الحروف وحذف التشكيل والتطويل
+_TRANSLATION = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+    "ؤ": "و",
+    "ئ": "ي",
+    "ـ": None,  # التطويل
+    **{chr(code): None for code in range(0x064B, 0x0653)},  # الفتحتان حتى السكون والمد
+    "ٰ": None,  # الألف الخنجرية
+})
+
+_WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# السوابق مرتبة من الأطول إلى الأقصر
+_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال", "و", "ب")
+_SUFFIXES = ("ات", "ون", "ين")
+# أقل طول يبقى بعد حذف السابقة أو اللاحقة
+_MIN_STEM_LENGTH = 3
+
+
+def normalize_arabic(text: str) -> str:
+    """توحيد الحروف وحذف التشكيل والتطويل مع تحويل الحروف اللاتينية للصغيرة"""
+    return text.lower().translate(_TRANSLATION)
+
+
+@lru_cache(maxsize=65536)
+def light_stem(word: str) -> str:
+    """حذف سابقة واحدة ولاحقة جمع واحدة إن بقي جذع كافٍ
+
+    النتائج محفوظة لكل كلمة فتُجذّع الكلمات المتكررة بين الاستعلامات مرة واحدة.
+    """
+    for prefix in _PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= _MIN_STEM_LENGTH:
+            word = word[len(prefix):]
+            break
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM_LENGTH:
+            word = word[:-len(suffix)]
+            break
+    return word
+
+
+def normalize_terms(text: str) -> List[str]:
+    """تقسيم النص إلى كلمات موحدة ومجذعة"""
+    return [light_stem(word) for word in _WORD_PATTERN.findall(normalize_arabic(text))]
+
+
+def normalize_phrase(text: str) -> str:
+    """الصيغة الموحدة لعبارة كاملة (لأسماء المفاهيم المركبة)"""
+    return " ".join(normalize_terms(text))
+
+
+def raw_terms(text: str) -> List[str]:
+    """تقسيم النص دون توحيد (السلوك السابق، للمقارنة)"""
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def raw_phrase(text: str) -> str:
+    return text.lower()
+
+
+# كلمات وظيفية لا تدل على مفهوم (تُوحد بنفس قواعد الفهرس عند التحميل)
+_STOPWORDS = """
+في من الى إلى على عن مع هل ما ماذا لماذا كيف متى اين أين كم اي أي هو هي هم هن انا أنا
+انت أنت نحن هذا هذه ذلك تلك الذي التي الذين ان إن أن لا لم لن قد كان كانت يكون او أو
+ثم بل كل بعض غير بين عند بعد قبل حتى اذا إذا لو لكن ليس وهو وهي فهو فهي يا معنى عندي
+the a an is are was were be of in on at to for and or what who why how when where which
+does do did about me my i you your it its this that tell please
+"""
+STOPWORDS = frozenset(light_stem(normalize_arabic(word)) for word in _STOPWORDS.split())
+
+
+def is_stopword(term: str) -> bool:
+    """هل الكلمة (الموحدة) كلمة وظيفية"""
+    return term in STOPWORDS
+
+
+def content_terms(text: str) -> List[str]:
+    """كلمات النص الموحدة بعد حذف الكلمات الوظيفية"""
+    return [term for term in normalize_terms(text) if term not in STOPWORDS]
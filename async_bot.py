@@ -0,0 +1,249 @@
+"""
+تشغيل البوت فوق asyncio
+AsyncTeleBot و AsyncOpenAI بدلاً من العملاء المتزامنين: انتظار تشغيل المساعد
+لا يحجز خيطاً، فتبقى مئات التشغيلات معلقة في عملية واحدة دون تأخير الردود المحلية.
+المعالجات نفسها من EnhancedIslamicBot: تُنفذ متزامنة مع بوت مسجِّل يجمع الرسائل
+الصادرة، ثم تُرسل هذه الرسائل وتُنتظر استفسارات OpenAI بشكل غير متزامن.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from typing import List, Tuple
+
+from openai import AsyncOpenAI
+from telebot.async_telebot import AsyncTeleBot
+
+from main import EnhancedIslamicBot
+from outbound_queue import AsyncRateLimitedBot, AsyncRateLimiter
+from run_poller import RunDeadlineExceeded
+from streaming_reply import STREAM_PLACEHOLDER, StreamingReply
+
+logger = logging.getLogger(__name__)
+
+
+class _RecordingBot:
+    """بديل TeleBot للمعالجات المتزامنة: يسجل الإرسال بدلاً من تنفيذه"""
+
+    def __init__(self):
+        self.outbox: List[Tuple[str, tuple, dict]] = []
+
+    def _record(self, method: str):
+        def record(*args, **kwargs):
+            self.outbox.append((method, args, kwargs))
+        return record
+
+    def __getattr__(self, method: str):
+        # reply_to و send_message و send_chat_action وغيرها
+        return self._record(method)
+
+    def drain(self) -> List[Tuple[str, tuple, dict]]:
+        outbox, self.outbox = self.outbox, []
+        return outbox
+
+
+class AsyncIslamicBot(EnhancedIslamicBot):
+    """البوت الإسلامي المحسن على asyncio"""
+
+    # عنصر مؤجل في صندوق الصادر: استفسار OpenAI ينفذ بعد إرسال ما قبله
+    OPENAI_QUERY = "_openai_query"
+
+    def _create_clients(self):
+        self.bot = _RecordingBot()
+        self.openai_client = None
+        self.dispatcher = None
+        self.async_bot = AsyncTeleBot(self.telegram_token)
+        self.async_openai = AsyncOpenAI(api_key=self.openai_api_key)
+
+        # نفس حدود طابور الرسائل الصادرة وإعادة المحاولة بعد 429 (OUTBOUND_GLOBAL_RATE=0 للتعطيل)؛
+        # عداداته تظهر في /stats مكان الطابور
+        self.outbound_queue = None
+        global_rate = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+        if global_rate > 0:
+            self.outbound_queue = AsyncRateLimiter(
+                global_rate=global_rate,
+                chat_rate=float(os.getenv('OUTBOUND_CHAT_RATE', '1')),
+                chat_burst=float(os.getenv('OUTBOUND_CHAT_BURST', '3'))
+            )
+            self.async_bot = AsyncRateLimitedBot(self.async_bot, self.outbound_queue)
+
+    def setup_handlers(self):
+        """تسجيل نفس المعالجات على AsyncTeleBot"""
+        for command, handler_name in self.COMMAND_HANDLERS.items():
+            self.async_bot.message_handler(commands=[command])(self._async_handler(getattr(self, handler_name)))
+
+        self.async_bot.message_handler(func=lambda message: True)(self._async_handler(self.handle_message))
+
+    def _async_handler(self, handler):
+        async def run_handler(message):
+            # المعالج المتزامن لا ينتظر شيئاً فلا تتداخل معه مهمة أخرى قبل تفريغ الصادر
+            handler(message)
+            await self._deliver(self.bot.drain())
+        run_handler.__name__ = handler.__name__
+        return run_handler
+
+    async def _deliver(self, outbox: List[Tuple[str, tuple, dict]]):
+        """إرسال رسائل المعالج بالترتيب وتنفيذ استفسارات OpenAI المؤجلة"""
+        for method, args, kwargs in outbox:
+            try:
+                if method == self.OPENAI_QUERY:
+                    await self._handle_openai_query_async(*args)
+                else:
+                    await getattr(self.async_bot, method)(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"خطأ في إرسال الرد ({method}): {e}")
+                self.usage_stats['errors'] += 1
+
+    def _handle_openai_query(self, message, session):
+        # يُنفذ بعد إرسال ما سجله المعالج قبله (مثل إشعار الكتابة)
+        self.bot.outbox.append((self.OPENAI_QUERY, (message, session), {}))
+
+    async def _handle_openai_query_async(self, message, session):
+        """معالجة الاستفسارات العامة باستخدام AsyncOpenAI"""
+        try:
+            user_id = message.from_user.id
+
+            # الأسئلة المتكررة تُجاب من الذاكرة دون تشغيل المساعد؛ SQLite خارج حلقة الأحداث
+            cached = await asyncio.to_thread(self._cached_answer, message.text)
+            if cached is not None:
+                await self.async_bot.reply_to(message, cached)
+                self._record_cached_answer(session, user_id)
+                thread_id = await asyncio.to_thread(self.active_threads.get, user_id)
+                if thread_id is not None:
+                    await self._remember_exchange_async(thread_id, message.text, cached)
+                return
+
+            # إنشاء أو استخدام thread موجود؛ مخزن الروابط قد يقرأ SQLite فيُستدعى خارج حلقة الأحداث
+            thread_id = await asyncio.to_thread(self.active_threads.get, user_id)
+            fresh_thread = False
+            if thread_id is None:
+                new_thread_id = self.thread_pool.acquire() if self.thread_pool is not None else None
+                if new_thread_id is None:
+                    new_thread_id = (await self.async_openai.beta.threads.create()).id
+                # رسالة سابقة لنفس المستخدم قد تكون أنشأت thread أثناء الانتظار
+                thread_id = await asyncio.to_thread(self.active_threads.setdefault, user_id, new_thread_id)
+                fresh_thread = thread_id == new_thread_id
+                logger.info(f"thread جديد تم إنشاؤه للمستخدم {user_id}")
+
+            await self.async_openai.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message.text
+            )
+
+            async with self.run_poller.slot_async():
+                if self.openai_streaming:
+                    await self._stream_openai_reply_async(message, session, thread_id, fresh_thread)
+                    return
+
+                run = await self.async_openai.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id
+                )
+
+                # انتظار اكتمال التشغيل دون حجز خيط
+                run_status = await self.run_poller.wait_async(
+                    lambda: self.async_openai.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id),
+                    lambda: self.async_openai.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                )
+
+            if run_status.status != 'completed':
+                logger.error(f"فشل في تشغيل المساعد: {run_status.status}")
+                await self.async_bot.reply_to(message, "حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.")
+                return
+
+            messages = await self.async_openai.beta.threads.messages.list(
+                thread_id=thread_id,
+                order="desc",
+                limit=1
+            )
+
+            response_text = self._assistant_reply_text(messages)
+            if response_text is not None:
+                await self.async_bot.reply_to(message, response_text)
+                self._record_openai_success(session, user_id)
+                await asyncio.to_thread(self._cache_answer, message.text, response_text, fresh_thread)
+                return
+
+            await self.async_bot.reply_to(message, "لم أتمكن من الحصول على رد مناسب. يرجى إعادة صياغة سؤالك.")
+
+        except RunDeadlineExceeded as e:
+            logger.error(f"انتهت مهلة انتظار رد المساعد: {e}")
+            await self.async_bot.reply_to(message, "الطلب يستغرق وقتاً أطول من المعتاد. يرجى المحاولة مرة أخرى.")
+        except Exception as e:
+            logger.error(f"خطأ في معالجة استفسار OpenAI: {e}")
+            await self.async_bot.reply_to(message, "حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.")
+            self.usage_stats['errors'] += 1
+
+    async def _remember_exchange_async(self, thread_id: str, question: str, answer: str):
+        """إضافة سؤال ورد من الذاكرة إلى thread المستخدم دون تشغيل المساعد"""
+        try:
+            for role, content in (("user", question), ("assistant", answer)):
+                await self.async_openai.beta.threads.messages.create(thread_id=thread_id, role=role, content=content)
+        except Exception as e:
+            logger.error(f"تعذر إضافة الرد المحفوظ إلى thread: {e}")
+
+    async def _stream_openai_reply_async(self, message, session, thread_id: str, fresh_thread: bool):
+        """تشغيل المساعد متدفقاً وتعديل رسالة مؤقتة بالنص المتراكم"""
+        chat_id = message.chat.id
+        reply = StreamingReply(min_interval=self.stream_edit_interval)
+        message_id = (await self.async_bot.reply_to(message, STREAM_PLACEHOLDER)).message_id
+
+        async def apply(actions):
+            nonlocal message_id
+            for action, text in actions:
+                if action == "edit":
+                    await self.async_bot.edit_message_text(text, chat_id, message_id)
+                else:
+                    message_id = (await self.async_bot.send_message(chat_id, text)).message_id
+
+        try:
+            async with self.async_openai.beta.threads.runs.stream(
+                thread_id=thread_id,
+                assistant_id=self.assistant_id
+            ) as stream:
+                async for delta in stream.text_deltas:
+                    await apply(reply.feed(delta))
+                run = await stream.get_final_run()
+            await apply(reply.finish())
+        except Exception as e:
+            logger.error(f"خطأ في الرد المتدفق: {e}")
+            await self.async_bot.edit_message_text("حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.", chat_id, message_id)
+            self.usage_stats['errors'] += 1
+            return
+
+        if run.status != 'completed' or not reply.text.strip():
+            logger.error(f"فشل في تشغيل المساعد: {run.status}")
+            await self.async_bot.edit_message_text(self._stream_failure_text(reply), chat_id, message_id)
+            return
+        self._record_openai_success(session, message.from_user.id)
+        await asyncio.to_thread(self._cache_answer, message.text, reply.text, fresh_thread)
+
+    async def _run_async(self):
+        filler = None
+        if self.thread_pool is not None:
+            filler = asyncio.create_task(self.thread_pool.fill_async(self.async_openai.beta.threads.create))
+        try:
+            await self.async_bot.remove_webhook()
+            await self.async_bot.infinity_polling(timeout=10)
+        finally:
+            if filler is not None:
+                self.thread_pool.close()
+                filler.cancel()
+            self.active_threads.close()
+            await self.async_bot.close_session()
+            await self.async_openai.close()
+
+    def run(self):
+        """تشغيل البوت على حلقة asyncio"""
+        logger.info("🚀 بدء تشغيل البوت الإسلامي المحسن (asyncio)...")
+        if self.webhook_url:
+            logger.warning("وضع webhook متاح في التشغيل المتزامن فقط؛ سيُستخدم الاستطلاع")
+        try:
+            asyncio.run(self._run_async())
+        except KeyboardInterrupt:
+            logger.info("تم إيقاف البوت بواسطة المستخدم")
+        except Exception as e:
+            logger.error(f"خطأ في تشغيل البوت: {e}")
+            sys.exit(1)
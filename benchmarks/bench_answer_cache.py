@@ -0,0 +1,71 @@
+"""
+قياس ذاكرة ردود المساعد
+يعيد تشغيل سجل أسئلة عامة بتوزيع منحرف وكتابات مختلفة لنفس السؤال (همزات وتشكيل)
+ويقيس نسبة الإصابة وزمن القراءة من SQLite مقارنة بزمن تشغيل المساعد
+
+الاستخدام:
+    python benchmarks/bench_answer_cache.py [--questions 20000] [--distinct 2000] [--run-seconds 6]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import AnswerCache  # noqa: E402
+
+TOPICS = ["أركان الإسلام", "أركان الإيمان", "صلاة الجمعة", "زكاة الفطر", "صيام الست", "عمرة رمضان",
+          "آداب المسجد", "فضل الذكر", "حقوق الجار", "بر الوالدين"]
+TEMPLATES = ["ما هي {}؟", "ما معنى {}", "اشرح لي {}", "ما حكم {}؟", "what is {}"]
+
+
+def variant(question: str, rng: random.Random) -> str:
+    """كتابة مختلفة لنفس السؤال كما يكتبها المستخدمون"""
+    if rng.random() < 0.5:
+        question = question.replace("أ", "ا").replace("إ", "ا")
+    if rng.random() < 0.3:
+        question = question.replace("؟", "")
+    return question
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=2000)
+    parser.add_argument("--run-seconds", type=float, default=6.0, help="متوسط زمن تشغيل المساعد")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    distinct = [rng.choice(TEMPLATES).format(f"{rng.choice(TOPICS)} {i}") for i in range(args.distinct)]
+    weights = [1 / (rank + 1) for rank in range(len(distinct))]
+    log = [variant(question, rng) for question in rng.choices(distinct, weights=weights, k=args.questions)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = AnswerCache(os.path.join(directory, "answers.sqlite"), max_entries=args.distinct)
+        lookup_seconds = 0.0
+        runs = 0
+        for question in log:
+            start = time.perf_counter()
+            answer = cache.get(question)
+            lookup_seconds += time.perf_counter() - start
+            if answer is None:
+                runs += 1
+                cache.put(question, f"رد على: {question}")
+        cache.close()
+
+    hits = len(log) - runs
+    lookup_ms = lookup_seconds / len(log) * 1000
+    average_without = args.run_seconds
+    average_with = (runs * args.run_seconds + hits * lookup_ms / 1000) / len(log)
+    print(f"{len(log)} سؤال ({args.distinct} فريد): نسبة الإصابة {hits / len(log):.1%}")
+    print(f"زمن القراءة من الذاكرة: {lookup_ms:.3f} ms")
+    print(f"تشغيلات المساعد: {len(log)} -> {runs}")
+    print(f"متوسط زمن الرد: {average_without:.2f} s -> {average_with:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
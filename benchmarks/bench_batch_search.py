@@ -0,0 +1,98 @@
+"""
+قياس إنتاجية البحث بالدفعات
+يقارن استدعاء search_concepts_scored لكل استعلام بـ search_concepts_batch
+(في عملية واحدة وعلى عدة عمليات) عند إعادة تشغيل سجل استعلامات كبير
+
+الاستخدام:
+    python benchmarks/bench_batch_search.py [--concepts 2000] [--queries 20000] [--processes 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concept_model import ConceptCategory, IslamicConcept  # noqa: E402
+from concept_store import InMemoryConceptStore  # noqa: E402
+from islamic_context_explainer import IslamicContextExplainer  # noqa: E402
+
+CATEGORIES = list(ConceptCategory)
+WORDS = ["الصلاة", "الزكاة", "الصوم", "الحج", "التوحيد", "الإحسان", "الجهاد", "القبلة",
+         "الوضوء", "الطهارة", "المسجد", "الدعاء", "الصدقة", "العمرة", "التوبة", "الذكر",
+         "prayer", "fasting", "charity", "hajj", "ما", "هي", "في", "الإسلام", "حكم", "معنى"]
+
+
+def build_corpus(count: int) -> InMemoryConceptStore:
+    """القاعدة المدمجة مع مفاهيم اصطناعية تستخدم نفس المفردات"""
+    concepts = dict(IslamicContextExplainer().concepts_database.iter_concepts())
+    rng = random.Random(0)
+    for i in range(count):
+        name = f"{rng.choice(WORDS)} {i}"
+        concepts[f"c{i}"] = IslamicConcept(
+            name=name,
+            arabic_name=name,
+            category=CATEGORIES[i % len(CATEGORIES)],
+            definition=" ".join(rng.choices(WORDS, k=12)),
+            cultural_context=" ".join(rng.choices(WORDS, k=10)),
+            historical_background=" ".join(rng.choices(WORDS, k=10)),
+            practical_application=" ".join(rng.choices(WORDS, k=8)),
+            related_concepts=rng.sample(WORDS, 3),
+            sources=["القرآن الكريم"],
+            examples=[" ".join(rng.choices(WORDS, k=5))],
+            common_misconceptions=[],
+        )
+    return InMemoryConceptStore(concepts)
+
+
+def build_query_log(count: int):
+    """سجل استعلامات بتوزيع منحرف: قلة من الاستعلامات تتكرر كثيراً"""
+    rng = random.Random(1)
+    distinct = [" ".join(rng.choices(WORDS, k=rng.randint(1, 4))) for _ in range(max(1, count // 4))]
+    weights = [1 / (rank + 1) for rank in range(len(distinct))]
+    return rng.choices(distinct, weights=weights, k=count)
+
+
+def _timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concepts", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    explainer = IslamicContextExplainer(store=build_corpus(args.concepts))
+    queries = build_query_log(args.queries)
+    explainer.search_concepts("الصلاة", mode="bm25")  # بناء BM25 خارج القياس
+
+    print(f"{len(explainer.concepts_database)} مفهوم، {len(queries)} استعلام "
+          f"({len(set(queries))} فريد)")
+    print(f"{'النمط':>8} | {'الطريقة':>18} | {'استعلام/ثانية':>14}")
+    for mode in explainer.RANKING_MODES:
+        single, elapsed = _timed(lambda: [
+            explainer.search_concepts_scored(query, top_k=args.top_k, mode=mode) for query in queries
+        ])
+        print(f"{mode:>8} | {'استعلام بعد آخر':>18} | {len(queries) / elapsed:>14,.0f}")
+
+        batch, elapsed = _timed(lambda: explainer.search_concepts_batch(queries, args.top_k, mode))
+        assert batch == single
+        print(f"{mode:>8} | {'دفعة واحدة':>18} | {len(queries) / elapsed:>14,.0f}")
+
+        if args.processes > 1:
+            parallel, elapsed = _timed(lambda: explainer.search_concepts_batch(
+                queries, args.top_k, mode, processes=args.processes, min_parallel_batch=1))
+            assert parallel == single
+            label = f"دفعة × {args.processes} عمليات"
+            print(f"{mode:>8} | {label:>18} | {len(queries) / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
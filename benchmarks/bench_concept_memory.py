@@ -0,0 +1,103 @@
+"""
+قياس استهلاك الذاكرة لكل مفهوم
+يقارن التمثيل القديم (dataclass بقوائم) بالتمثيل المضغوط (slots و tuple و intern)
+وبالمخزن العمودي، عند 10 آلاف و100 ألف مفهوم
+
+الاستخدام:
+    python benchmarks/bench_concept_memory.py [--sizes 10000 100000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concept_model import ConceptCategory, IslamicConcept  # noqa: E402
+from concept_store import ColumnarConceptStore  # noqa: E402
+
+SHARED_SOURCES = ["القرآن الكريم", "السنة النبوية", "إجماع العلماء", "كتب الفقه", "كتب العقيدة"]
+SHARED_RELATED = [f"مفهوم مترابط {i}" for i in range(200)]
+CATEGORIES = list(ConceptCategory)
+
+
+@dataclass
+class LegacyConcept:
+    """التمثيل السابق: dataclass عادية بقوائم ونصوص غير موحدة"""
+    name: str
+    arabic_name: str
+    category: ConceptCategory
+    definition: str
+    cultural_context: str
+    historical_background: str
+    practical_application: str
+    related_concepts: List[str]
+    sources: List[str]
+    examples: List[str]
+    common_misconceptions: List[str]
+
+
+def _fields(i: int) -> dict:
+    """حقول مفهوم اصطناعي؛ النصوص المشتركة تُبنى من جديد كما لو قُرئت من ملف"""
+    copy = lambda text: text.encode("utf-8").decode("utf-8")  # noqa: E731 - نسخة غير موحدة من النص
+    return dict(
+        name=f"مفهوم {i}",
+        arabic_name=f"المفهوم {i}",
+        category=CATEGORIES[i % len(CATEGORIES)],
+        definition=f"تعريف المفهوم رقم {i} وهو نص متوسط الطول يشرح المعنى الأساسي للمفهوم",
+        cultural_context=f"السياق الثقافي للمفهوم {i} في حياة المسلمين اليومية",
+        historical_background=f"الخلفية التاريخية للمفهوم {i} منذ صدر الإسلام",
+        practical_application=f"التطبيق العملي للمفهوم {i}",
+        related_concepts=[copy(SHARED_RELATED[(i + k) % len(SHARED_RELATED)]) for k in range(4)],
+        sources=[copy(source) for source in SHARED_SOURCES[:3]],
+        examples=[f"مثال {k} على المفهوم {i}" for k in range(3)],
+        common_misconceptions=[f"خطأ شائع {k} حول المفهوم {i}" for k in range(2)],
+    )
+
+
+def _measure(build, count: int) -> float:
+    """متوسط البايتات المخصصة لكل مفهوم"""
+    gc.collect()
+    tracemalloc.start()
+    container = build(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return current / count
+
+
+def build_legacy(count: int):
+    return {f"c{i}": LegacyConcept(**_fields(i)) for i in range(count)}
+
+
+def build_compact(count: int):
+    return {f"c{i}": IslamicConcept(**_fields(i)) for i in range(count)}
+
+
+def build_columnar(count: int):
+    store = ColumnarConceptStore(cache_size=0)
+    for i in range(count):
+        store.append(f"c{i}", IslamicConcept(**_fields(i)))
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"Python {sys.version.split()[0]}")
+    print(f"{'المفاهيم':>10} | {'القديم':>10} | {'المضغوط':>10} | {'العمودي':>10}  (بايت/مفهوم)")
+    for count in args.sizes:
+        legacy = _measure(build_legacy, count)
+        compact = _measure(build_compact, count)
+        columnar = _measure(build_columnar, count)
+        print(f"{count:>10} | {legacy:>10.0f} | {compact:>10.0f} | {columnar:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
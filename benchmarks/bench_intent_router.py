@@ -0,0 +1,69 @@
+"""
+قياس موجه النوايا المحلي
+يقارن التوجيه القديم (أي نتيجة بحث تعني سؤال مفهوم) بموجه النوايا على سجل
+رسائل مختلط: دقة القرار "مفهوم محلي أم سؤال عام" وزمن القرار بارداً ومحفوظاً
+
+الاستخدام:
+    python benchmarks/bench_intent_router.py [--repeat 1000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from islamic_context_explainer import IslamicContextExplainer  # noqa: E402
+
+# (الرسالة، هل هي سؤال عن مفهوم في القاعدة)
+MESSAGE_LOG = [
+    ("الصلاة", True), ("ما هي الصلاة", True), ("what is prayer", True), ("ما حكم الصلاة في السفر", True),
+    ("ما هو الجهاد", True), ("جهاد النفس", True), ("التوحيد", True), ("التوحبد", True),
+    ("الإحسان", True), ("hajj", True), ("عبادة بدنية وروحية", True), ("tawheed", True),
+    ("كيف حالك اليوم", False), ("السلام عليكم", False), ("شكرا لك", False), ("tell me a joke", False),
+    ("من هو النبي محمد", False), ("ما هي عاصمة فرنسا", False), ("hi", False), ("اريد وصفة كعكة", False),
+    ("كم الساعة الآن", False), ("ما رأيك في هذا", False), ("how are you", False), ("في", False),
+]
+
+
+def _old_route(explainer: IslamicContextExplainer, text: str) -> bool:
+    """التوجيه السابق: بحث كامل ثم بحث تقريبي، وأي نتيجة تعني سؤال مفهوم"""
+    return bool(explainer.search_concepts(text) or explainer.fuzzy_search_concepts(text))
+
+
+def _new_route(explainer: IslamicContextExplainer, text: str) -> bool:
+    return explainer.route_query(text).is_concept_query
+
+
+def _measure(route, explainer_factory, repeat: int):
+    explainer = explainer_factory()
+    start = time.perf_counter()
+    decisions = [route(explainer, text) for text, _ in MESSAGE_LOG]
+    cold = (time.perf_counter() - start) / len(MESSAGE_LOG)
+    correct = sum(decision == expected for decision, (_, expected) in zip(decisions, MESSAGE_LOG))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text, _ in MESSAGE_LOG:
+            route(explainer, text)
+    warm = (time.perf_counter() - start) / (repeat * len(MESSAGE_LOG))
+    return correct / len(MESSAGE_LOG), cold * 1e6, warm * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'الموجه':>12} | {'دقة القرار':>10} | {'بارد (µs)':>10} | {'محفوظ (µs)':>10}")
+    for label, route, factory in (
+        ("القديم", _old_route, lambda: IslamicContextExplainer(normalize=False)),
+        ("موجه النوايا", _new_route, IslamicContextExplainer),
+    ):
+        accuracy, cold, warm = _measure(route, factory, args.repeat)
+        print(f"{label:>12} | {accuracy:>10.0%} | {cold:>10.1f} | {warm:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
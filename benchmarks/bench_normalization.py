@@ -0,0 +1,64 @@
+"""
+قياس أثر توحيد الكتابة العربية على البحث المحلي
+يشغّل سجل استعلامات نموذجياً (صيغ كتابة متنوعة لنفس المفاهيم) بالتوحيد ودونه
+ويقيس نسبة الاستعلامات التي تُجاب محلياً وزمن البحث، مع تقدير الزمن الكلي
+للرد بافتراض أن كل استعلام فائت يذهب إلى OpenAI
+
+الاستخدام:
+    python benchmarks/bench_normalization.py [--repeat 200] [--openai-latency 4.0]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from islamic_context_explainer import IslamicContextExplainer  # noqa: E402
+
+# (الاستعلام، المفهوم المتوقع) كما يكتبها المستخدمون فعلاً
+QUERY_LOG = [
+    ("الصلاة", "salah"), ("الصلاه", "salah"), ("صلاة", "salah"), ("الصَّلاة", "salah"),
+    ("ما هي الصلاه", "salah"), ("والصلاة", "salah"), ("بالصلاة", "salah"), ("الصـلاة", "salah"),
+    ("الحج", "hajj"), ("حج", "hajj"), ("الحَجّ", "hajj"), ("بالحج", "hajj"),
+    ("ما معنى الحج", "hajj"), ("والحج", "hajj"),
+    ("التوحيد", "tawhid"), ("توحيد", "tawhid"), ("التَّوحيد", "tawhid"), ("والتوحيد", "tawhid"),
+    ("الإحسان", "ihsan"), ("الاحسان", "ihsan"), ("احسان", "ihsan"), ("إحسان", "ihsan"),
+    ("بالإحسان", "ihsan"), ("الإِحسان", "ihsan"),
+    ("الجهاد", "jihad"), ("جهاد", "jihad"), ("الجِهاد", "jihad"), ("جهاد النفس", "jihad"),
+    ("والجهاد", "jihad"), ("ما هو الجهاد", "jihad"),
+]
+
+
+def _run(explainer: IslamicContextExplainer, repeat: int):
+    """نسبة الإصابة (المفهوم المتوقع أولاً) ومتوسط زمن البحث بالميكروثانية"""
+    hits = 0
+    for query, expected in QUERY_LOG:
+        results = explainer.search_concepts(query) or explainer.fuzzy_search_concepts(query)
+        hits += results[:1] == [expected]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query, _expected in QUERY_LOG:
+            explainer.search_concepts(query) or explainer.fuzzy_search_concepts(query)
+    elapsed = time.perf_counter() - start
+    return hits / len(QUERY_LOG), elapsed / (repeat * len(QUERY_LOG)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--openai-latency", type=float, default=4.0,
+                        help="متوسط زمن رد OpenAI بالثواني للاستعلامات الفائتة")
+    args = parser.parse_args()
+
+    print(f"{'الإعداد':>10} | {'الإصابة':>8} | {'زمن البحث (µs)':>15} | {'الزمن المتوقع للرد (s)':>22}")
+    for label, normalize in (("دون توحيد", False), ("مع توحيد", True)):
+        hit_rate, search_us = _run(IslamicContextExplainer(normalize=normalize), args.repeat)
+        expected_latency = search_us / 1e6 + (1 - hit_rate) * args.openai_latency
+        print(f"{label:>10} | {hit_rate:>8.0%} | {search_us:>15.1f} | {expected_latency:>22.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+قياس طابور الرسائل الصادرة أمام خادم Bot API وهمي
+الخادم المحلي يطبق حدوداً مثل تيليجرام (30 رسالة/ثانية للبوت ورسالة/ثانية لكل
+محادثة مع دفعة 3) ويرد بـ 429 و retry_after عند تجاوزها. يُرسل نفس الحمل
+(دفعة جماعية ثم ردود تفاعلية) مباشرة من خيوط متعددة ثم عبر OutboundQueue،
+ويُقاس عدد الرسائل الفاشلة وردود 429 وزمن وصول الردود التفاعلية
+
+الاستخدام:
+    python benchmarks/bench_outbound_queue.py [--chats 40] [--per-chat 4] [--interactive 20]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telebot  # noqa: E402
+from telebot import apihelper  # noqa: E402
+
+from outbound_queue import BULK, INTERACTIVE, OutboundQueue, TokenBucket  # noqa: E402
+from run_poller import percentile  # noqa: E402
+
+
+class FakeBotAPI(ThreadingHTTPServer):
+    """خادم Bot API وهمي بحدود معدل تيليجرام"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), self._handler())
+        self.lock = threading.Lock()
+        self.global_bucket = TokenBucket(30, 30, time.monotonic())
+        self.chat_buckets = {}
+        self.accepted = 0
+        self.rejected = 0
+
+    def admit(self, chat_id) -> float:
+        """0 إن قُبلت الرسالة وإلا مدة retry_after"""
+        now = time.monotonic()
+        with self.lock:
+            chat = self.chat_buckets.setdefault(chat_id, TokenBucket(1, 3, now))
+            wait = max(self.global_bucket.wait_time(now), chat.wait_time(now))
+            if wait > 0:
+                self.rejected += 1
+                return wait
+            self.global_bucket.take(now)
+            chat.take(now)
+            self.accepted += 1
+            return 0.0
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8")
+                # telebot يرسل المعاملات في عنوان الطلب لا في جسمه
+                params = dict(parse_qsl(urlsplit(self.path).query))
+                params.update(parse_qsl(body))
+                chat_id = int(params.get("chat_id", 0))
+                retry_after = api.admit(chat_id)
+                if retry_after:
+                    payload = {"ok": False, "error_code": 429,
+                               "description": f"Too Many Requests: retry after {retry_after:.0f}",
+                               "parameters": {"retry_after": max(1, round(retry_after))}}
+                    status = 429
+                else:
+                    payload = {"ok": True, "result": {"message_id": api.accepted, "date": 0,
+                                                      "chat": {"id": chat_id, "type": "private"}, "text": "ok"}}
+                    status = 200
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def workload(chats: int, per_chat: int, interactive: int):
+    """دفعة جماعية لكل المحادثات ثم ردود تفاعلية لمحادثات أخرى"""
+    bulk = [(chat_id, BULK) for _ in range(per_chat) for chat_id in range(1, chats + 1)]
+    replies = [(chats + 1 + i, INTERACTIVE) for i in range(interactive)]
+    return bulk, replies
+
+
+def run_direct(bot, bulk, replies):
+    failures = 0
+    latencies = []
+
+    def send(job):
+        chat_id, priority = job
+        start = time.perf_counter()
+        try:
+            bot.send_message(chat_id, "x")
+            return priority, time.perf_counter() - start, True
+        except Exception:
+            return priority, time.perf_counter() - start, False
+
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(send, bulk + replies))
+    for priority, latency, ok in results:
+        failures += not ok
+        if priority == INTERACTIVE:
+            latencies.append(latency)
+    return failures, latencies
+
+
+def run_queued(bot, bulk, replies):
+    queue = OutboundQueue(bot)
+    futures = [(priority, time.perf_counter(), queue.submit("send_message", chat_id, chat_id, "x",
+                                                            priority=priority))
+               for chat_id, priority in bulk + replies]
+    failures = 0
+    latencies = []
+    done_at = {}
+    for priority, submitted, future in futures:
+        future.add_done_callback(lambda f, s=submitted: done_at.__setitem__(f, time.perf_counter() - s))
+    for priority, _, future in futures:
+        try:
+            future.result(300)
+        except Exception:
+            failures += 1
+        if priority == INTERACTIVE:
+            latencies.append(done_at[future])
+    queue.close()
+    return failures, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--per-chat", type=int, default=4)
+    parser.add_argument("--interactive", type=int, default=20)
+    args = parser.parse_args()
+
+    bulk, replies = workload(args.chats, args.per_chat, args.interactive)
+    print(f"{len(bulk)} رسالة جماعية + {len(replies)} رد تفاعلي")
+    print(f"{'الطريقة':>8} | {'فشل':>5} | {'ردود 429':>8} | {'الزمن (ث)':>9} | {'رد تفاعلي p50/p99 (ث)':>22}")
+    for label, runner in (("مباشر", run_direct), ("الطابور", run_queued)):
+        server = FakeBotAPI()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        apihelper.API_URL = f"http://127.0.0.1:{server.server_address[1]}/bot{{0}}/{{1}}"
+        bot = telebot.TeleBot("123:fake", threaded=False)
+
+        start = time.perf_counter()
+        failures, latencies = runner(bot, bulk, replies)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        print(f"{label:>8} | {failures:>5} | {server.rejected:>8} | {elapsed:>9.2f} | "
+              f"{percentile(latencies, 0.5):>10.2f} / {percentile(latencies, 0.99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+قياس استطلاع تشغيلات المساعد
+يحاكي تشغيلات بأزمنة اكتمال عشوائية (توزيع لوغاريتمي طبيعي) وزمن طلب ثابت
+بساعة افتراضية، ويقارن الحلقة الثابتة (ثانية × 30 محاولة) بالجدولة الافتراضية
+(تراجع أسي يبدأ عند أسرع التشغيلات الأخيرة):
+p50/p99 لتأخر اكتشاف الاكتمال وعدد طلبات runs.retrieve لكل تشغيل
+
+الاستخدام:
+    python benchmarks/bench_run_polling.py [--runs 10000] [--median 4] [--request-latency 0.08]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_poller import RunDeadlineExceeded, RunPoller, percentile  # noqa: E402
+
+
+def simulate(make_poller, durations, request_latency: float):
+    now = [0.0]
+    poller = make_poller(clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    delays, polls, timeouts = [], 0, 0
+    for duration in durations:
+        now[0] = 0.0
+
+        def retrieve():
+            now[0] += request_latency
+            return SimpleNamespace(status="completed" if now[0] >= duration else "in_progress")
+
+        try:
+            poller.wait(retrieve, lambda: None)
+            delays.append(now[0] - duration)
+        except RunDeadlineExceeded:
+            timeouts += 1
+    polls = poller.stats()["polls"]
+    return delays, polls, timeouts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10000)
+    parser.add_argument("--median", type=float, default=4.0, help="الوسيط لزمن اكتمال التشغيل بالثواني")
+    parser.add_argument("--request-latency", type=float, default=0.08)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    durations = [args.median * math.exp(rng.gauss(0, 0.6)) for _ in range(args.runs)]
+
+    schedulers = (
+        ("ثابت 1s × 30", lambda **kw: RunPoller(initial_interval=1.0, max_interval=1.0, jitter=0,
+                                               deadline=30, first_poll_quantile=0, **kw)),
+        ("تراجع أسي", lambda **kw: RunPoller(**kw)),
+    )
+    print(f"{'الجدولة':>14} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'retrieve/تشغيل':>14} | {'مهلة':>5}")
+    for label, make_poller in schedulers:
+        delays, polls, timeouts = simulate(make_poller, durations, args.request_latency)
+        print(f"{label:>14} | {percentile(delays, 0.5) * 1000:>9.0f} | {percentile(delays, 0.99) * 1000:>9.0f}"
+              f" | {polls / len(durations):>14.1f} | {timeouts:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+قياس انتهاء الجلسات في SessionManager
+عدد كبير من الجلسات النشطة وجزء صغير منها منتهٍ؛ يُقارن المرور الكامل على
+الجلسات (الطريقة السابقة في cleanup_expired_sessions و get_session_stats)
+بكومة مواعيد الانتهاء والإحصاءات المحدثة عند التغير
+
+الاستخدام:
+    python benchmarks/bench_session_expiry.py [--sessions 200000] [--expired 0.01] [--calls 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_manager import SessionManager  # noqa: E402
+
+
+def build(sessions: int, expired_share: float, seed: int = 7) -> SessionManager:
+    manager = SessionManager()
+    for user_id in range(sessions):
+        manager.get_session(user_id)
+    past = datetime.now() - timedelta(minutes=manager.session_timeout + 1)
+    for user_id in random.Random(seed).sample(range(sessions), int(sessions * expired_share)):
+        manager.sessions[user_id].last_activity = past
+    return manager
+
+
+def full_scan_stats(manager: SessionManager):
+    """الطريقة السابقة: فحص كل جلسة ثم عد الحالات"""
+    expired = [user_id for user_id, session in manager.sessions.items()
+               if session.is_expired(manager.session_timeout)]
+    states_count = {}
+    for session in manager.sessions.values():
+        states_count[session.state.value] = states_count.get(session.state.value, 0) + 1
+    return len(expired), states_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200000)
+    parser.add_argument("--expired", type=float, default=0.01)
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+
+    manager = build(args.sessions, args.expired)
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        full_scan_stats(manager)
+    scan_ms = (time.perf_counter() - start) / args.calls * 1000
+
+    # الكومة تُفحص مواعيدها عند حلولها؛ تقديم الساعة يحاكي مرور مدة الجلسة
+    heap_manager = build(args.sessions, args.expired)
+    heap_manager._expiry = [(datetime.now() - timedelta(seconds=1) if session.is_expired(heap_manager.session_timeout)
+                             else deadline, sequence, session)
+                            for deadline, sequence, session in heap_manager._expiry]
+    heap_manager._expiry.sort(key=lambda entry: (entry[0], entry[1]))
+    start = time.perf_counter()
+    expired = heap_manager.cleanup_expired_sessions()
+    first_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(args.calls):
+        heap_manager.get_session_stats()
+    heap_ms = (time.perf_counter() - start) / args.calls * 1000
+
+    print(f"{args.sessions} جلسة، {expired} منتهية")
+    print(f"المرور الكامل لكل /stats: {scan_ms:.2f}ms")
+    print(f"الكومة: حذف المنتهية {first_ms:.2f}ms مرة واحدة، ثم {heap_ms:.3f}ms لكل /stats")
+
+
+if __name__ == "__main__":
+    main()
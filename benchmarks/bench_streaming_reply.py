@@ -0,0 +1,64 @@
+"""
+قياس الرد المتدفق
+يحاكي توليد المساعد (زمن أول جزء ثم معدل ثابت للأجزاء) بساعة افتراضية ويقارن
+زمن ظهور أول نص للمستخدم وعدد طلبات تيليجرام بين الانتظار حتى الاكتمال
+(استطلاع كل ثانية) والتدفق مع تعديلات محدودة المعدل
+
+الاستخدام:
+    python benchmarks/bench_streaming_reply.py [--first-token 0.6] [--tokens-per-second 40] [--tokens 600]
+"""
+
+import argparse
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streaming_reply import StreamingReply  # noqa: E402
+
+
+def simulate_streaming(first_token: float, rate: float, tokens: int, interval: float):
+    """(زمن أول نص، زمن النص الكامل، عدد الطلبات) مع التدفق"""
+    now = [0.0]
+    reply = StreamingReply(min_interval=interval, clock=lambda: now[0])
+    first_visible = None
+    requests = 1  # الرسالة المؤقتة
+    for i in range(tokens):
+        now[0] = first_token + i / rate
+        actions = reply.feed("كلمة ")
+        if actions and first_visible is None:
+            first_visible = now[0]
+        requests += len(actions)
+    requests += len(reply.finish())
+    return first_visible, now[0], requests
+
+
+def simulate_polling(first_token: float, rate: float, tokens: int, poll_interval: float = 1.0):
+    """(زمن أول نص، زمن النص الكامل، عدد الطلبات) مع الاستطلاع حتى الاكتمال"""
+    completed = first_token + (tokens - 1) / rate
+    # الاكتمال يُكتشف عند أول استطلاع بعده
+    detected = math.ceil(completed / poll_interval) * poll_interval
+    polls = int(detected / poll_interval) + 1
+    # الاستطلاعات ثم قائمة الرسائل ثم الرد
+    return detected, detected, polls + 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--first-token", type=float, default=0.6)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--tokens", type=int, default=600)
+    parser.add_argument("--edit-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'الطريقة':>10} | {'أول نص (ث)':>10} | {'الرد كاملاً (ث)':>14} | {'طلبات':>6}")
+    for label, (first, full, requests) in (
+        ("استطلاع", simulate_polling(args.first_token, args.tokens_per_second, args.tokens)),
+        ("تدفق", simulate_streaming(args.first_token, args.tokens_per_second, args.tokens, args.edit_interval)),
+    ):
+        print(f"{label:>10} | {first:>10.2f} | {full:>14.2f} | {requests:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+قياس مجمع threads المساعد المنشأة مسبقاً
+عميل وهمي يحاكي زمن رحلة beta.threads.create، ومستخدمون جدد يصلون بمعدل
+ثابت؛ يُقاس زمن الحصول على thread لأول رسالة مع المجمع ودونه
+
+الاستخدام:
+    python benchmarks/bench_thread_pool.py [--users 200] [--rate 3] [--create-ms 250] [--size 8]
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_poller import percentile  # noqa: E402
+from thread_pool import AssistantThreadPool  # noqa: E402
+
+
+def make_create(create_seconds: float):
+    counter = itertools.count()
+
+    def create():
+        time.sleep(create_seconds)
+        return SimpleNamespace(id=f"thread_{next(counter)}")
+    return create
+
+
+def run(pool, create, users: int, rate: float):
+    """زمن الحصول على thread لكل مستخدم جديد"""
+    latencies = []
+    for _ in range(users):
+        start = time.perf_counter()
+        thread_id = pool.acquire() if pool is not None else None
+        if thread_id is None:
+            create()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(1 / rate)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=3, help="مستخدمون جدد في الثانية")
+    parser.add_argument("--create-ms", type=float, default=250)
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--refill-rate", type=float, default=40)
+    args = parser.parse_args()
+
+    create = make_create(args.create_ms / 1000)
+    print(f"{args.users} مستخدم جديد بمعدل {args.rate}/ث، إنشاء thread {args.create_ms:.0f}ms")
+    print(f"{'الطريقة':>8} | {'p50 (مللي ث)':>12} | {'p99 (مللي ث)':>12} | {'إصابات':>6}")
+
+    latencies = run(None, create, args.users, args.rate)
+    print(f"{'دون مجمع':>8} | {percentile(latencies, 0.5) * 1000:>12.1f} | "
+          f"{percentile(latencies, 0.99) * 1000:>12.1f} | {0:>6}")
+
+    pool = AssistantThreadPool(size=args.size, refill_rate=args.refill_rate)
+    pool.start(create)
+    while pool.stats()["ready"] < args.size:
+        time.sleep(0.01)
+    latencies = run(pool, create, args.users, args.rate)
+    pool.close()
+    print(f"{'المجمع':>8} | {percentile(latencies, 0.5) * 1000:>12.1f} | "
+          f"{percentile(latencies, 0.99) * 1000:>12.1f} | {pool.stats()['hits']:>6}")
+
+
+if __name__ == "__main__":
+    main()
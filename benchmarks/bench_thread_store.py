@@ -0,0 +1,74 @@
+"""
+قياس مخزن روابط threads المساعد
+مستخدمون كثيرون بتوزيع Zipf (قلة نشطة وكثرة تسأل مرة واحدة) يطلبون thread
+لكل سؤال؛ يُقارن القاموس غير المحدود بـ ThreadStore في الذاكرة المستهلكة
+(tracemalloc) وزمن القراءة وعدد معاملات الكتابة، ثم يُقاس عدد الروابط
+المستعادة بعد إعادة التشغيل
+
+الاستخدام:
+    python benchmarks/bench_thread_store.py [--users 200000] [--requests 500000] [--max-entries 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thread_store import ThreadStore  # noqa: E402
+
+
+def workload(users: int, requests: int, seed: int = 7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(users)]
+    return rng.choices(range(users), weights=weights, k=requests)
+
+
+def run(store, user_ids):
+    """زمن الطلبات والذاكرة المحجوزة بعدها"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for user_id in user_ids:
+        if store.get(user_id) is None:
+            store[user_id] = f"thread_{user_id:024d}"
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=500000)
+    parser.add_argument("--max-entries", type=int, default=10000)
+    args = parser.parse_args()
+
+    user_ids = workload(args.users, args.requests)
+    print(f"{args.requests} طلب من {len(set(user_ids))} مستخدم")
+    print(f"{'المخزن':>8} | {'الزمن (ث)':>9} | {'ميكروثانية/طلب':>14} | {'الذاكرة (MB)':>12} | {'دفعات الكتابة':>13}")
+
+    elapsed, memory = run({}, user_ids)
+    print(f"{'قاموس':>8} | {elapsed:>9.2f} | {elapsed / len(user_ids) * 1e6:>14.2f} | "
+          f"{memory / 1e6:>12.1f} | {'-':>13}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "threads.sqlite")
+        store = ThreadStore(path, max_entries=args.max_entries)
+        elapsed, memory = run(store, user_ids)
+        store.close()
+        print(f"{'المخزن':>8} | {elapsed:>9.2f} | {elapsed / len(user_ids) * 1e6:>14.2f} | "
+              f"{memory / 1e6:>12.1f} | {store.stats()['flushes']:>13}")
+
+        restarted = ThreadStore(path, max_entries=args.max_entries)
+        recovered = sum(restarted.get(user_id) is not None for user_id in set(user_ids[-1000:]))
+        restarted.close()
+        print(f"بعد إعادة التشغيل: {recovered} من {len(set(user_ids[-1000:]))} مستخدم حديث استعادوا threads دون إنشاء")
+
+
+if __name__ == "__main__":
+    main()
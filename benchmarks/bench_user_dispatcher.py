@@ -0,0 +1,122 @@
+"""
+قياس موزع التحديثات حسب المستخدم
+حمل مختلط: بعض المستخدمين يسألون المساعد (معالجة بطيئة) وآخرون يطلبون الشارح
+المحلي (معالجة سريعة)، وكل مستخدم يرسل عدة رسائل متتالية. يُقارن مجمع خيوط
+مشترك كمجمع telebot بـ UserDispatcher بنفس العدد الكلي من الخيوط، ويُقاس زمن
+الردود المحلية وعدد الرسائل المعالجة بغير ترتيب إرسالها
+
+الاستخدام:
+    python benchmarks/bench_user_dispatcher.py [--users 200] [--messages 3] [--ai-share 0.3] [--ai-ms 300]
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_poller import percentile  # noqa: E402
+from user_dispatcher import UserDispatcher  # noqa: E402
+
+
+def workload(users: int, messages: int, ai_share: float, seed: int = 7):
+    """رسائل (المستخدم، الرقم، هل هي للمساعد) بترتيب الوصول"""
+    rng = random.Random(seed)
+    ai_users = set(rng.sample(range(users), int(users * ai_share)))
+    return [(user, number, user in ai_users) for number in range(messages) for user in range(users)]
+
+
+def jittered(seconds: float) -> float:
+    """زمن معالجة متفاوت كما في الواقع"""
+    return seconds * random.uniform(0.5, 1.5)
+
+
+class Recorder:
+    """أزمنة الردود المحلية وترتيب المعالجة لكل مستخدم"""
+
+    def __init__(self, total: int):
+        self.lock = threading.Lock()
+        self.local_latencies = []
+        self.last_number = {}
+        self.out_of_order = 0
+        self.remaining = total
+        self.done = threading.Event()
+
+    def processed(self, user: int, number: int, submitted: float, is_ai: bool):
+        with self.lock:
+            if not is_ai:
+                self.local_latencies.append(time.perf_counter() - submitted)
+            if self.last_number.get(user, -1) > number:
+                self.out_of_order += 1
+            self.last_number[user] = max(self.last_number.get(user, -1), number)
+            self.remaining -= 1
+            if not self.remaining:
+                self.done.set()
+
+
+def run_shared(messages, workers: int, ai_seconds: float, local_seconds: float):
+    recorder = Recorder(len(messages))
+
+    def handle(user, number, submitted, is_ai):
+        # الخيط يبقى محجوزاً طوال انتظار المساعد
+        time.sleep(jittered(local_seconds) + (ai_seconds if is_ai else 0))
+        recorder.processed(user, number, submitted, is_ai)
+
+    with ThreadPoolExecutor(workers) as pool:
+        for user, number, is_ai in messages:
+            pool.submit(handle, user, number, time.perf_counter(), is_ai)
+        recorder.done.wait()
+    return recorder
+
+
+def run_dispatcher(messages, workers: int, ai_seconds: float, local_seconds: float):
+    recorder = Recorder(len(messages))
+    fast_workers = max(1, workers // 4)
+    dispatcher = UserDispatcher(fast_workers=fast_workers, slow_workers=workers - fast_workers)
+
+    def ask_assistant(user, number, submitted):
+        time.sleep(ai_seconds)
+        recorder.processed(user, number, submitted, True)
+
+    def handle(user, number, submitted, is_ai):
+        time.sleep(jittered(local_seconds))
+        if is_ai:
+            dispatcher.continue_slow(ask_assistant, user, number, submitted)
+        else:
+            recorder.processed(user, number, submitted, False)
+
+    for user, number, is_ai in messages:
+        dispatcher.submit(user, handle, user, number, time.perf_counter(), is_ai)
+    recorder.done.wait()
+    dispatcher.close()
+    return recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=3)
+    parser.add_argument("--ai-share", type=float, default=0.3)
+    parser.add_argument("--ai-ms", type=float, default=300)
+    parser.add_argument("--local-ms", type=float, default=2)
+    parser.add_argument("--workers", type=int, default=20)
+    args = parser.parse_args()
+
+    messages = workload(args.users, args.messages, args.ai_share)
+    print(f"{len(messages)} رسالة من {args.users} مستخدم، {args.workers} خيطاً")
+    print(f"{'الطريقة':>8} | {'الزمن (ث)':>9} | {'رد محلي p50/p99 (مللي ث)':>26} | {'بغير ترتيب':>10}")
+    for label, runner in (("مشترك", run_shared), ("الموزع", run_dispatcher)):
+        start = time.perf_counter()
+        recorder = runner(messages, args.workers, args.ai_ms / 1000, args.local_ms / 1000)
+        elapsed = time.perf_counter() - start
+        latencies = recorder.local_latencies
+        print(f"{label:>8} | {elapsed:>9.2f} | {percentile(latencies, 0.5) * 1000:>12.1f} / "
+              f"{percentile(latencies, 0.99) * 1000:>11.1f} | {recorder.out_of_order:>10}")
+
+
+if __name__ == "__main__":
+    main()
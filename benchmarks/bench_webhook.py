@@ -0,0 +1,77 @@
+"""
+قياس استقبال التحديثات عبر webhook
+مرسلون وهميون متزامنون يرسلون تحديثات كما يرسلها تيليجرام إلى الخادم المحلي،
+ومعالج يحاكي زمن المعالجة؛ يُقاس زمن قبول التحديث (رد HTTP) وزمنه حتى بدء
+معالجته والإنتاجية لعدد مختلف من خيوط المعالجة
+
+الاستخدام:
+    python benchmarks/bench_webhook.py [--updates 2000] [--senders 16] [--handler-ms 5]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run_poller import percentile  # noqa: E402
+from webhook_server import WebhookServer, send_fake_update  # noqa: E402
+
+SECRET = "bench-secret"
+
+
+def run(workers: int, updates: int, senders: int, handler_seconds: float):
+    sent_at = {}
+    started_at = {}
+    done = threading.Event()
+
+    def process_update(update):
+        started_at[update["update_id"]] = time.perf_counter()
+        time.sleep(handler_seconds)
+        if len(started_at) == updates:
+            done.set()
+
+    server = WebhookServer(process_update, secret_token=SECRET, host="127.0.0.1", port=0,
+                           workers=workers, queue_size=updates)
+    server.start()
+    url = f"http://127.0.0.1:{server.port}/webhook"
+
+    def send(update_id):
+        sent_at[update_id] = time.perf_counter()
+        status = send_fake_update(url, {"update_id": update_id}, SECRET)
+        return time.perf_counter() - sent_at[update_id], status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(senders) as pool:
+        results = list(pool.map(send, range(updates)))
+    done.wait(60)
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    assert all(status == 200 for _, status in results)
+    acks = [latency for latency, _ in results]
+    waits = [started_at[i] - sent_at[i] for i in range(updates)]
+    return acks, waits, updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--senders", type=int, default=16)
+    parser.add_argument("--handler-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print("الاستطلاع (interval=1): حتى 1000 ms قبل استلام التحديث")
+    print(f"{'خيوط':>5} | {'قبول p50/p99 (ms)':>18} | {'حتى المعالجة p50/p99 (ms)':>26} | {'تحديث/ث':>8}")
+    for workers in (1, 4, 16):
+        acks, waits, throughput = run(workers, args.updates, args.senders, args.handler_ms / 1000)
+        print(f"{workers:>5} | {percentile(acks, 0.5) * 1000:>8.2f} / {percentile(acks, 0.99) * 1000:>7.2f}"
+              f" | {percentile(waits, 0.5) * 1000:>12.2f} / {percentile(waits, 0.99) * 1000:>11.2f}"
+              f" | {throughput:>8,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+محرك ترتيب BM25 للمفاهيم الإسلامية
+إحصاءات المصطلحات مخزنة كمصفوفات NumPy بصيغة CSR (مصطلح -> مفاهيم)
+فيُحسب الاستعلام بعمليات مصفوفية ويُختار أفضل k عبر np.partition
+"""
+
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from arabic_normalizer import normalize_terms
+from concept_model import IslamicConcept
+
+# أوزان الحقول: تكرار المصطلح في الاسم أهم من تكراره في الأمثلة
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "arabic_name": 3.0,
+    "aliases": 3.0,
+    "related_concepts": 2.0,
+    "definition": 1.5,
+    "cultural_context": 1.0,
+    "historical_background": 1.0,
+    "practical_application": 1.0,
+    "examples": 1.0,
+    "common_misconceptions": 1.0,
+    "sources": 0.5,
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """تقسيم النص إلى كلمات بنفس قواعد فهرس الكلمات المفتاحية (موحدة ومجذعة)"""
+    return normalize_terms(text)
+
+
+class BM25Ranker:
+    """ترتيب BM25 فوق جميع حقول المفاهيم"""
+
+    def __init__(self, concepts: Iterable[Tuple[str, IslamicConcept]], k1: float = 1.5, b: float = 0.75,
+                 tokenizer: Callable[[str], List[str]] = tokenize):
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self.concept_ids: List[str] = []
+        self.vocabulary: Dict[str, int] = {}
+
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        frequencies: List[float] = []
+        lengths: List[float] = []
+
+        for concept_id, concept in concepts:
+            doc_id = len(self.concept_ids)
+            self.concept_ids.append(concept_id)
+
+            counts = self._weighted_terms(concept)
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                frequencies.append(frequency)
+
+        self._build_postings(
+            np.asarray(term_ids, dtype=np.int64),
+            np.asarray(doc_ids, dtype=np.int32),
+            np.asarray(frequencies, dtype=np.float32),
+            np.asarray(lengths, dtype=np.float32),
+        )
+
+    def _weighted_terms(self, concept: IslamicConcept) -> Counter:
+        """تكرار المصطلحات الموزون حسب الحقل"""
+        counts: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = getattr(concept, field)
+            texts = [value] if isinstance(value, str) else value
+            for text in texts:
+                for term in self.tokenizer(text):
+                    counts[term] += weight
+        return counts
+
+    def _build_postings(self, term_ids: np.ndarray, doc_ids: np.ndarray,
+                        frequencies: np.ndarray, lengths: np.ndarray):
+        """بناء قوائم الورود بصيغة CSR مع الأوزان المحسوبة مسبقاً"""
+        order = np.argsort(term_ids, kind="stable")
+        term_ids = term_ids[order]
+        self.postings_docs = doc_ids[order]
+        frequencies = frequencies[order]
+
+        vocabulary_size = len(self.vocabulary)
+        document_frequency = np.bincount(term_ids, minlength=vocabulary_size)
+        self.postings_indptr = np.zeros(vocabulary_size + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=self.postings_indptr[1:])
+
+        document_count = len(self.concept_ids)
+        self.idf = np.log1p(
+            (document_count - document_frequency + 0.5) / (document_frequency + 0.5)
+        ).astype(np.float32)
+
+        # وزن BM25 لكل ورود لا يعتمد على الاستعلام فيُحسب مرة واحدة
+        average_length = float(lengths.mean()) if len(lengths) else 0.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(average_length, 1e-9))
+        doc_norm = norm[self.postings_docs] if len(self.postings_docs) else np.zeros(0, dtype=np.float32)
+        self.postings_weights = (
+            self.idf[term_ids] * frequencies * (self.k1 + 1) / (frequencies + doc_norm)
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.concept_ids)
+
+    def _query_term_ids(self, words: Sequence[str]) -> np.ndarray:
+        term_ids = {self.vocabulary[word] for word in words if word in self.vocabulary}
+        return np.fromiter(term_ids, dtype=np.int64, count=len(term_ids))
+
+    def candidate_scores(self, words: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """المفاهيم التي تحتوي مصطلحاً واحداً على الأقل ونقاطها
+
+        العمل متناسب مع طول قوائم ورود مصطلحات الاستعلام لا مع حجم القاعدة.
+        """
+        term_ids = self._query_term_ids(words)
+        if not len(term_ids):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64)
+
+        starts = self.postings_indptr[term_ids]
+        ends = self.postings_indptr[term_ids + 1]
+        # جمع شرائح الورود لجميع المصطلحات في مصفوفة فهارس واحدة
+        counts = ends - starts
+        positions = np.repeat(ends - counts.cumsum(), counts) + np.arange(counts.sum())
+
+        docs, inverse = np.unique(self.postings_docs[positions], return_inverse=True)
+        scores = np.bincount(inverse, weights=self.postings_weights[positions], minlength=len(docs))
+        return docs, scores
+
+    def score(self, words: Sequence[str]) -> np.ndarray:
+        """نقاط BM25 لجميع المفاهيم كمصفوفة كاملة"""
+        scores = np.zeros(len(self.concept_ids), dtype=np.float64)
+        docs, doc_scores = self.candidate_scores(words)
+        scores[docs] = doc_scores
+        return scores
+
+    def top_k(self, words: Sequence[str], k: int = 5) -> List[Tuple[str, float]]:
+        """أفضل k مفاهيم ذات نقاط موجبة مرتبة تنازلياً"""
+        if k <= 0:
+            return []
+        docs, scores = self.candidate_scores(words)
+        positive = scores > 0
+        docs, scores = docs[positive], scores[positive]
+        if not len(docs):
+            return []
+
+        if len(docs) > k:
+            # الإبقاء على كل ما يساوي النقطة k حتى يُحسم التساوي بترتيب المفهوم
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            keep = scores >= threshold
+            docs, scores = docs[keep], scores[keep]
+
+        # ترتيب تنازلي بالنقاط ثم بترتيب المفهوم في المخزن عند التساوي
+        order = np.lexsort((docs, -scores))[:k]
+        return [(self.concept_ids[docs[i]], float(scores[i])) for i in order]
+
+    def top_k_batch(self, queries: Sequence[Sequence[str]], k: int = 5) -> List[List[Tuple[str, float]]]:
+        """أفضل k مفاهيم لكل استعلام في مرور مصفوفي واحد
+
+        ورود جميع الاستعلامات تُجمع في مصفوفة واحدة وتُجمع نقاطها بمفتاح
+        (الاستعلام، المفهوم)، بنفس ترتيب الجمع في top_k فتتطابق النتائج.
+        """
+        results: List[List[Tuple[str, float]]] = [[] for _ in queries]
+        if k <= 0 or not len(queries):
+            return results
+
+        query_term_ids = [self._query_term_ids(words) for words in queries]
+        term_counts = np.fromiter((len(ids) for ids in query_term_ids), dtype=np.int64, count=len(queries))
+        if not term_counts.sum():
+            return results
+        term_ids = np.concatenate(query_term_ids)
+        term_queries = np.repeat(np.arange(len(queries), dtype=np.int64), term_counts)
+
+        starts = self.postings_indptr[term_ids]
+        counts = self.postings_indptr[term_ids + 1] - starts
+        positions = np.repeat(starts + counts - counts.cumsum(), counts) + np.arange(counts.sum())
+        posting_queries = np.repeat(term_queries, counts)
+
+        keys = posting_queries * len(self.concept_ids) + self.postings_docs[positions]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        scores = np.bincount(inverse, weights=self.postings_weights[positions], minlength=len(unique_keys))
+        query_ids, docs = np.divmod(unique_keys, len(self.concept_ids))
+
+        positive = scores > 0
+        query_ids, docs, scores = query_ids[positive], docs[positive], scores[positive]
+        # ترتيب كل استعلام تنازلياً بالنقاط ثم بترتيب المفهوم، والاستعلامات متتالية
+        order = np.lexsort((docs, -scores, query_ids))
+        query_ids, docs, scores = query_ids[order], docs[order], scores[order]
+        boundaries = np.searchsorted(query_ids, np.arange(len(queries) + 1))
+        for query_id in range(len(queries)):
+            start = boundaries[query_id]
+            end = min(boundaries[query_id + 1], start + k)
+            results[query_id] = [(self.concept_ids[docs[i]], float(scores[i])) for i in range(start, end)]
+        return results
@@ -0,0 +1,92 @@
+"""
+فهرس التصنيفات وتصفحها على صفحات
+قائمة ورود لكل تصنيف تُحدّث عند إضافة المفاهيم أو حذفها، وتصفح بمؤشر
+يكلّف حجم الصفحة فقط بدلاً من المرور على القاعدة كاملة
+"""
+
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from concept_model import ConceptCategory
+
+
+@dataclass
+class CategoryPage:
+    """صفحة من مفاهيم تصنيف واحد"""
+    category: ConceptCategory
+    concept_ids: List[str]
+    next_cursor: Optional[str]
+    total: int
+
+
+class CategoryIndex:
+    """قوائم ورود المفاهيم لكل تصنيف مرتبة حسب ترتيب الإضافة"""
+
+    def __init__(self):
+        # لكل تصنيف: أرقام تسلسلية متزايدة ومعرفات المفاهيم المقابلة لها
+        self._sequences: Dict[ConceptCategory, List[int]] = {}
+        self._concept_ids: Dict[ConceptCategory, List[str]] = {}
+        # معرف المفهوم -> (تصنيفه، رقمه التسلسلي)
+        self._positions: Dict[str, Tuple[ConceptCategory, int]] = {}
+        self._next_sequence = 0
+
+    def __contains__(self, concept_id: str) -> bool:
+        return concept_id in self._positions
+
+    def add(self, concept_id: str, category: ConceptCategory):
+        """إضافة مفهوم لتصنيفه (أو نقله إن تغير تصنيفه)"""
+        if concept_id in self._positions:
+            if self._positions[concept_id][0] == category:
+                return
+            self.remove(concept_id)
+
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        self._sequences.setdefault(category, []).append(sequence)
+        self._concept_ids.setdefault(category, []).append(concept_id)
+        self._positions[concept_id] = (category, sequence)
+
+    def remove(self, concept_id: str):
+        """حذف مفهوم من فهرس تصنيفه"""
+        position = self._positions.pop(concept_id, None)
+        if position is None:
+            return
+        category, sequence = position
+        sequences = self._sequences[category]
+        index = bisect_left(sequences, sequence)
+        del sequences[index]
+        del self._concept_ids[category][index]
+
+    def count(self, category: ConceptCategory) -> int:
+        """عدد مفاهيم التصنيف"""
+        return len(self._sequences.get(category, ()))
+
+    def categories(self) -> List[ConceptCategory]:
+        """التصنيفات التي تحتوي مفاهيم بترتيب تعريفها"""
+        return [category for category in ConceptCategory if self.count(category)]
+
+    def concept_ids(self, category: ConceptCategory) -> List[str]:
+        """جميع معرفات مفاهيم التصنيف"""
+        return list(self._concept_ids.get(category, ()))
+
+    def page(self, category: ConceptCategory, cursor: Optional[str] = None,
+             page_size: int = 10) -> CategoryPage:
+        """صفحة من مفاهيم التصنيف تبدأ بعد المؤشر المعطى"""
+        page_size = max(1, page_size)
+        sequences = self._sequences.get(category, [])
+        start = 0
+        if cursor:
+            try:
+                start = bisect_right(sequences, int(cursor))
+            except ValueError:
+                raise ValueError(f"مؤشر تصفح غير صالح: {cursor}") from None
+
+        end = min(start + page_size, len(sequences))
+        next_cursor = str(sequences[end - 1]) if end < len(sequences) else None
+        return CategoryPage(
+            category=category,
+            concept_ids=self._concept_ids.get(category, [])[start:end],
+            next_cursor=next_cursor,
+            total=len(sequences),
+        )
@@ -0,0 +1,123 @@
+"""
+رسم العلاقات بين المفاهيم الإسلامية
+فهرس للأسماء وقوائم تجاور للمفاهيم المترابطة تُبنى مرة واحدة عند التحميل
+لتقديم اقتراحات متعددة القفزات دون مسح قاعدة المفاهيم
+"""
+
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from concept_model import IslamicConcept
+
+
+class ConceptGraph:
+    """رسم بياني للمفاهيم: العقد معرفات المفاهيم والأضلاع المفاهيم المترابطة"""
+
+    def __init__(self, normalize: Callable[[str], str] = str.lower):
+        # دالة توحيد الأسماء قبل مقارنتها
+        self.normalize = normalize
+        # الاسم العربي الموحد -> معرف المفهوم
+        self.name_index: Dict[str, str] = {}
+        # اسم المفهوم المترابط الموحد -> المفاهيم التي تذكره
+        self._mentions: Dict[str, List[str]] = {}
+        # الأضلاع الخارجة والداخلة بعد ربط الأسماء بالمعرفات
+        self._outgoing: Dict[str, List[str]] = {}
+        self._incoming: Dict[str, List[str]] = {}
+        self._recommendations_cache: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+
+    @classmethod
+    def build(cls, concepts: Iterable[Tuple[str, IslamicConcept]],
+              normalize: Callable[[str], str] = str.lower) -> "ConceptGraph":
+        """بناء الرسم من جميع المفاهيم"""
+        graph = cls(normalize)
+        for concept_id, concept in concepts:
+            graph.add_concept(concept_id, concept)
+        return graph
+
+    def add_concept(self, concept_id: str, concept: IslamicConcept):
+        """إضافة مفهوم وربطه بالمفاهيم التي يذكرها أو تذكره"""
+        self._recommendations_cache.clear()
+
+        name = self.normalize(concept.arabic_name)
+        if name not in self.name_index:
+            self.name_index[name] = concept_id
+            # المفاهيم التي ذكرت هذا الاسم قبل إضافته
+            for source in self._mentions.get(name, ()):
+                if source != concept_id:
+                    self._link(source, concept_id)
+
+        for related_name in concept.related_concepts:
+            related_name = self.normalize(related_name)
+            self._mentions.setdefault(related_name, []).append(concept_id)
+            target = self.name_index.get(related_name)
+            if target is not None and target != concept_id:
+                self._link(concept_id, target)
+
+    def remove_concept(self, concept_id: str, concept: IslamicConcept):
+        """حذف مفهوم وأضلاعه؛ ذكر المفاهيم الأخرى لاسمه يبقى ليُربط عند إعادة إضافته"""
+        self._recommendations_cache.clear()
+
+        name = self.normalize(concept.arabic_name)
+        if self.name_index.get(name) == concept_id:
+            del self.name_index[name]
+
+        for related_name in concept.related_concepts:
+            mentions = self._mentions.get(self.normalize(related_name))
+            if mentions and concept_id in mentions:
+                mentions.remove(concept_id)
+
+        for target in self._outgoing.pop(concept_id, ()):
+            self._incoming[target].remove(concept_id)
+        for source in self._incoming.pop(concept_id, ()):
+            self._outgoing[source].remove(concept_id)
+
+    def _link(self, source: str, target: str):
+        outgoing = self._outgoing.setdefault(source, [])
+        if target not in outgoing:
+            outgoing.append(target)
+            self._incoming.setdefault(target, []).append(source)
+
+    def resolve_name(self, name: str) -> Optional[str]:
+        """معرف المفهوم الذي يحمل الاسم العربي المعطى"""
+        return self.name_index.get(self.normalize(name))
+
+    def neighbours(self, concept_id: str) -> List[str]:
+        """المفاهيم المتصلة مباشرة (في الاتجاهين)"""
+        neighbours = list(self._outgoing.get(concept_id, ()))
+        for source in self._incoming.get(concept_id, ()):
+            if source not in neighbours:
+                neighbours.append(source)
+        return neighbours
+
+    def recommendations(self, concept_id: str, max_hops: int = 3) -> List[Tuple[str, int]]:
+        """المفاهيم على بعد 1 إلى max_hops قفزات مرتبة حسب القرب
+
+        الترتيب حسب عدد القفزات ثم عدد المسارات القصيرة الواصلة للمفهوم.
+        النتيجة تُحفظ لكل مفهوم فتصبح الطلبات التالية بزمن ثابت تقريباً.
+        """
+        cache_key = (concept_id, max_hops)
+        if cache_key in self._recommendations_cache:
+            return self._recommendations_cache[cache_key]
+
+        distances = {concept_id: 0}
+        path_counts = {concept_id: 1}
+        order: List[str] = []
+        queue = deque([concept_id])
+        while queue:
+            current = queue.popleft()
+            if distances[current] >= max_hops:
+                continue
+            for neighbour in self.neighbours(current):
+                if neighbour not in distances:
+                    distances[neighbour] = distances[current] + 1
+                    path_counts[neighbour] = 0
+                    order.append(neighbour)
+                    queue.append(neighbour)
+                if distances[neighbour] == distances[current] + 1:
+                    path_counts[neighbour] += path_counts[current]
+
+        position = {node: i for i, node in enumerate(order)}
+        ranked = sorted(order, key=lambda node: (distances[node], -path_counts[node], position[node]))
+        result = [(node, distances[node]) for node in ranked]
+        self._recommendations_cache[cache_key] = result
+        return result
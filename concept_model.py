@@ -0,0 +1,78 @@
+"""
+نموذج بيانات المفاهيم الإسلامية
+التصنيفات وهيكل المفهوم وتحويله من وإلى السجلات المخزنة
+"""
+
+import sys
+from dataclasses import dataclass, fields
+from enum import Enum
+from typing import Any, Dict, Iterable, Tuple
+
+# slots متاحة في dataclass بدءاً من Python 3.10
+_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+class ConceptCategory(Enum):
+    """تصنيفات المفاهيم الإسلامية"""
+    WORSHIP = "عبادات"
+    BELIEFS = "عقائد"
+    JURISPRUDENCE = "فقه"
+    HISTORY = "تاريخ"
+    ETHICS = "أخلاق"
+    CULTURE = "ثقافة"
+    SPIRITUALITY = "روحانيات"
+    TERMINOLOGY = "مصطلحات"
+
+def _intern_all(values: Iterable[str]) -> Tuple[str, ...]:
+    return tuple(sys.intern(value) for value in values)
+
+@dataclass(**_DATACLASS_OPTIONS)
+class IslamicConcept:
+    """هيكل بيانات المفاهيم الإسلامية
+    
+    الحقول متعددة القيم تُحفظ كـ tuple، والنصوص المتكررة بين المفاهيم
+    (الأسماء والمصادر والمفاهيم المترابطة) تُوحّد عبر sys.intern.
+    الأسماء البديلة (aliases) تضم المعاني الإنجليزية والكتابات اللاتينية
+    الشائعة (salah و salat و prayer) وتُفهرس مع الأسماء العربية.
+    """
+    name: str
+    arabic_name: str
+    category: ConceptCategory
+    definition: str
+    cultural_context: str
+    historical_background: str
+    practical_application: str
+    related_concepts: Tuple[str, ...]
+    sources: Tuple[str, ...]
+    examples: Tuple[str, ...]
+    common_misconceptions: Tuple[str, ...]
+    aliases: Tuple[str, ...] = ()
+    
+    def __post_init__(self):
+        self.name = sys.intern(self.name)
+        self.arabic_name = sys.intern(self.arabic_name)
+        self.related_concepts = _intern_all(self.related_concepts)
+        self.sources = _intern_all(self.sources)
+        self.examples = tuple(self.examples)
+        self.common_misconceptions = tuple(self.common_misconceptions)
+        self.aliases = _intern_all(self.aliases)
+
+def concept_to_dict(concept_id: str, concept: IslamicConcept) -> Dict[str, Any]:
+    """تحويل المفهوم إلى سجل قابل للتخزين"""
+    record: Dict[str, Any] = {"id": concept_id}
+    for field in fields(IslamicConcept):
+        value = getattr(concept, field.name)
+        if isinstance(value, ConceptCategory):
+            value = value.name
+        elif isinstance(value, tuple):
+            value = list(value)
+        record[field.name] = value
+    return record
+
+def concept_from_dict(record: Dict[str, Any]) -> IslamicConcept:
+    """بناء المفهوم من سجل مخزن"""
+    values = {field.name: record[field.name] for field in fields(IslamicConcept) if field.name in record}
+    category = values["category"]
+    if not isinstance(category, ConceptCategory):
+        # قبول اسم التصنيف أو قيمته العربية
+        values["category"] = ConceptCategory[category] if category in ConceptCategory.__members__ else ConceptCategory(category)
+    return IslamicConcept(**values)
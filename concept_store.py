@@ -0,0 +1,507 @@
+"""
+مخازن قاعدة معرفة المفاهيم الإسلامية
+واجهات قابلة للاستبدال (ذاكرة، JSONL، SQLite) تحمّل المفاهيم عند الطلب
+مع ذاكرة مؤقتة محدودة للسجلات المحملة
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import fields
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from concept_model import ConceptCategory, IslamicConcept, concept_from_dict, concept_to_dict
+
+logger = logging.getLogger(__name__)
+
+# الحقول متعددة القيم (تخزن بصيغة JSON في SQLite وبفاصل في المخزن العمودي)
+_LIST_FIELDS = ("related_concepts", "sources", "examples", "common_misconceptions", "aliases")
+
+
+class ConceptStore(Mapping):
+    """الواجهة الأساسية لمخزن المفاهيم مع ذاكرة LRU للسجلات المحملة"""
+
+    def __init__(self, cache_size: int = 1024):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, IslamicConcept]" = OrderedDict()
+        self._lock = threading.RLock()
+        # قائمة المعرفات للاختيار العشوائي؛ تُحسب عند الحاجة بعد كل تعديل
+        self._ids: Optional[List[str]] = None
+
+    def _load(self, concept_id: str) -> Optional[IslamicConcept]:
+        """تحميل سجل مفهوم واحد من المصدر"""
+        raise NotImplementedError
+
+    def concept_ids(self) -> List[str]:
+        """معرفات جميع المفاهيم بترتيب المصدر"""
+        raise NotImplementedError
+
+    def iter_concepts(self) -> Iterator[Tuple[str, IslamicConcept]]:
+        """المرور على جميع المفاهيم دون الاحتفاظ بها في الذاكرة المؤقتة"""
+        for concept_id in self.concept_ids():
+            concept = self._load(concept_id)
+            if concept is not None:
+                yield concept_id, concept
+
+    def _save(self, concept_id: str, concept: IslamicConcept):
+        """كتابة سجل مفهوم (جديد أو معدل) في المصدر"""
+        raise TypeError(f"المخزن للقراءة فقط: {type(self).__name__}")
+
+    def _delete(self, concept_id: str):
+        """حذف سجل مفهوم من المصدر"""
+        raise TypeError(f"المخزن للقراءة فقط: {type(self).__name__}")
+
+    def put(self, concept_id: str, concept: IslamicConcept):
+        """إضافة مفهوم أو استبداله"""
+        with self._lock:
+            self._save(concept_id, concept)
+            self._cache.pop(concept_id, None)
+            self._ids = None
+
+    def delete(self, concept_id: str):
+        """حذف مفهوم"""
+        with self._lock:
+            if concept_id not in self:
+                raise KeyError(concept_id)
+            self._delete(concept_id)
+            self._cache.pop(concept_id, None)
+            self._ids = None
+
+    def __getitem__(self, concept_id: str) -> IslamicConcept:
+        with self._lock:
+            if concept_id in self._cache:
+                self._cache.move_to_end(concept_id)
+                return self._cache[concept_id]
+
+            concept = self._load(concept_id)
+            if concept is None:
+                raise KeyError(concept_id)
+
+            if self.cache_size > 0:
+                self._cache[concept_id] = concept
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return concept
+
+    def random_id(self, rng: random.Random = random) -> Optional[str]:
+        """معرف مفهوم عشوائي دون سرد جميع المعرفات في كل استدعاء"""
+        with self._lock:
+            if self._ids is None:
+                self._ids = self.concept_ids()
+            ids = self._ids
+        return rng.choice(ids) if ids else None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.concept_ids())
+
+    def __len__(self) -> int:
+        return len(self.concept_ids())
+
+    def cache_info(self) -> Dict[str, int]:
+        """حالة الذاكرة المؤقتة للسجلات المحملة"""
+        with self._lock:
+            return {"cached": len(self._cache), "cache_size": self.cache_size, "total": len(self)}
+
+    def close(self):
+        """تحرير موارد المخزن"""
+        with self._lock:
+            self._cache.clear()
+
+
+class InMemoryConceptStore(ConceptStore):
+    """مخزن يحتفظ بجميع المفاهيم في الذاكرة (القاعدة المدمجة)"""
+
+    def __init__(self, concepts: Dict[str, IslamicConcept]):
+        super().__init__(cache_size=0)
+        self._concepts = concepts
+
+    def _load(self, concept_id: str) -> Optional[IslamicConcept]:
+        return self._concepts.get(concept_id)
+
+    def _save(self, concept_id: str, concept: IslamicConcept):
+        self._concepts[concept_id] = concept
+
+    def _delete(self, concept_id: str):
+        del self._concepts[concept_id]
+
+    def concept_ids(self) -> List[str]:
+        return list(self._concepts)
+
+    def __contains__(self, concept_id) -> bool:
+        return concept_id in self._concepts
+
+    def __len__(self) -> int:
+        return len(self._concepts)
+
+
+class JSONLConceptStore(ConceptStore):
+    """مخزن ملف JSONL: سجل لكل سطر، ويبقى في الذاكرة موضع كل سجل فقط
+
+    التعديلات تُلحق بنهاية الملف: السجل الأحدث لمعرف ما هو المعتمد،
+    والحذف سطر {"id": ..., "deleted": true}.
+    """
+
+    def __init__(self, path: str, cache_size: int = 1024, offsets: Optional[Dict[str, int]] = None,
+                 offsets_size: Optional[int] = None):
+        """offsets: مواضع محسوبة مسبقاً (من لقطة الفهرس) لتجنب مسح الملف
+        offsets_size: حجم الملف عند حسابها؛ ما أُلحق بعده يُمسح وحده
+        """
+        super().__init__(cache_size=cache_size)
+        self.path = path
+        self._file = open(path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        if offsets is None or (offsets_size is not None and offsets_size > self._size):
+            # الملف أُعيد كتابته أصغر: المواضع لا تصلح
+            self._offsets = self._scan_offsets()
+        elif offsets_size is not None and offsets_size < self._size:
+            # تعديلات أُلحقت بعد حساب المواضع (add/update/remove_concept)
+            self._offsets = self._scan_offsets(dict(offsets), offsets_size)
+        else:
+            self._offsets = offsets
+
+    def _scan_offsets(self, offsets: Optional[Dict[str, int]] = None, start: int = 0) -> Dict[str, int]:
+        """قراءة الملف من start مرة واحدة لتسجيل موضع بداية كل سجل"""
+        offsets = {} if offsets is None else offsets
+        self._file.seek(start)
+        offset = start
+        for line in self._file:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("deleted"):
+                    offsets.pop(record["id"], None)
+                else:
+                    offsets[record["id"]] = offset
+            offset += len(line)
+        self._size = offset
+        return offsets
+
+    @property
+    def offsets(self) -> Dict[str, int]:
+        """مواضع السجلات داخل الملف"""
+        return self._offsets
+
+    @property
+    def size(self) -> int:
+        """حجم الملف الذي تغطيه المواضع"""
+        return self._size
+
+    def _load(self, concept_id: str) -> Optional[IslamicConcept]:
+        offset = self._offsets.get(concept_id)
+        if offset is None:
+            return None
+        with self._lock:
+            self._file.seek(offset)
+            line = self._file.readline()
+        return concept_from_dict(json.loads(line))
+
+    def _append(self, record: Dict) -> int:
+        """إلحاق سجل بنهاية الملف وإرجاع موضعه"""
+        if not isinstance(self._offsets, dict):
+            # المواضع المقروءة من لقطة الفهرس للقراءة فقط
+            self._offsets = dict(self._offsets)
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        with open(self.path, "ab") as handle:
+            offset = handle.tell()
+            handle.write(line)
+        self._size = offset + len(line)
+        return offset
+
+    def _save(self, concept_id: str, concept: IslamicConcept):
+        self._offsets[concept_id] = self._append(concept_to_dict(concept_id, concept))
+
+    def _delete(self, concept_id: str):
+        self._append({"id": concept_id, "deleted": True})
+        del self._offsets[concept_id]
+
+    def iter_concepts(self) -> Iterator[Tuple[str, IslamicConcept]]:
+        # قراءة تسلسلية بملف مستقل حتى لا تتعارض مع التحميل عند الطلب
+        offsets = self._offsets
+        with open(self.path, "rb") as handle:
+            offset = 0
+            for line in handle:
+                if line.strip():
+                    record = json.loads(line)
+                    # تخطي السجلات التي استُبدلت أو حُذفت
+                    if offsets.get(record["id"]) == offset:
+                        yield record["id"], concept_from_dict(record)
+                offset += len(line)
+
+    def concept_ids(self) -> List[str]:
+        return list(self._offsets)
+
+    def __contains__(self, concept_id) -> bool:
+        return concept_id in self._offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class SQLiteConceptStore(ConceptStore):
+    """مخزن SQLite: جدول للمفاهيم يُستعلم عنه عند الطلب"""
+
+    def __init__(self, path: str, cache_size: int = 1024):
+        super().__init__(cache_size=cache_size)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._add_missing_columns()
+
+    def _add_missing_columns(self):
+        """إضافة أعمدة الحقول الأحدث (مثل aliases) إلى القواعد القديمة قبل أول كتابة"""
+        existing = {row["name"] for row in self._connection.execute("PRAGMA table_info(concepts)")}
+        missing = [field.name for field in fields(IslamicConcept) if field.name not in existing]
+        if not existing or not missing:
+            return
+        try:
+            with self._connection:
+                for column in missing:
+                    default = "[]" if column in _LIST_FIELDS else ""
+                    self._connection.execute(f"ALTER TABLE concepts ADD COLUMN {column} TEXT DEFAULT '{default}'")
+        except sqlite3.OperationalError as e:
+            # قاعدة للقراءة فقط: القراءة تتحمل غياب الأعمدة والكتابة غير ممكنة أصلاً
+            logger.warning(f"تعذر إضافة الأعمدة {missing} إلى {self.path}: {e}")
+
+    def _row_to_concept(self, row: sqlite3.Row) -> IslamicConcept:
+        record = dict(row)
+        for column in _LIST_FIELDS:
+            # الأعمدة المضافة لاحقاً قد لا توجد في القواعد القديمة
+            if column in record:
+                record[column] = json.loads(record[column])
+        return concept_from_dict(record)
+
+    def _load(self, concept_id: str) -> Optional[IslamicConcept]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT * FROM concepts WHERE id = ?", (concept_id,)
+            ).fetchone()
+        return self._row_to_concept(row) if row is not None else None
+
+    def _save(self, concept_id: str, concept: IslamicConcept):
+        columns, values = _sqlite_row(concept_id, concept)
+        assignments = ", ".join(f"{column} = ?" for column in columns[1:])
+        placeholders = ", ".join("?" for _ in columns)
+        with self._connection:
+            # التعديل في مكانه يحافظ على ترتيب المفاهيم (rowid)
+            updated = self._connection.execute(
+                f"UPDATE concepts SET {assignments} WHERE id = ?", values[1:] + [concept_id]
+            ).rowcount
+            if not updated:
+                self._connection.execute(
+                    f"INSERT INTO concepts ({', '.join(columns)}) VALUES ({placeholders})", values
+                )
+
+    def _delete(self, concept_id: str):
+        with self._connection:
+            self._connection.execute("DELETE FROM concepts WHERE id = ?", (concept_id,))
+
+    def iter_concepts(self) -> Iterator[Tuple[str, IslamicConcept]]:
+        # اتصال مستقل للقراءة التسلسلية
+        connection = sqlite3.connect(self.path)
+        connection.row_factory = sqlite3.Row
+        try:
+            for row in connection.execute("SELECT * FROM concepts ORDER BY rowid"):
+                yield row["id"], self._row_to_concept(row)
+        finally:
+            connection.close()
+
+    def concept_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._connection.execute("SELECT id FROM concepts ORDER BY rowid").fetchall()
+        return [row["id"] for row in rows]
+
+    def __contains__(self, concept_id) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM concepts WHERE id = ?", (concept_id,)
+            ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM concepts").fetchone()[0]
+
+    def random_id(self, rng: random.Random = random) -> Optional[str]:
+        """معرف عشوائي بقفزة في فهرس rowid بدلاً من قراءة جميع المعرفات
+
+        بعد الحذف يزيد احتمال المفهوم التالي لفجوة في rowid قليلاً.
+        """
+        with self._lock:
+            # استعلامان منفصلان: SQLite يقرأ MIN أو MAX وحده من طرف الفهرس مباشرة
+            low = self._connection.execute("SELECT MIN(rowid) FROM concepts").fetchone()[0]
+            high = self._connection.execute("SELECT MAX(rowid) FROM concepts").fetchone()[0]
+            if low is None:
+                return None
+            row = self._connection.execute(
+                "SELECT id FROM concepts WHERE rowid >= ? ORDER BY rowid LIMIT 1", (rng.randint(low, high),)
+            ).fetchone()
+        return row["id"]
+
+    def close(self):
+        super().close()
+        self._connection.close()
+
+
+class _TextColumn:
+    """عمود نصوص مضغوط: كتلة UTF-8 واحدة ومصفوفة مواضع بدلاً من كائن str لكل قيمة"""
+
+    def __init__(self):
+        self._blob = bytearray()
+        self._offsets = array("I", [0])
+
+    def append(self, text: str):
+        self._blob += text.encode("utf-8")
+        self._offsets.append(len(self._blob))
+
+    def __getitem__(self, row: int) -> str:
+        return self._blob[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def nbytes(self) -> int:
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+
+class ColumnarConceptStore(ConceptStore):
+    """مخزن عمودي للقاعدة كاملة في الذاكرة
+
+    كل حقل نصي عمود مضغوط، والتصنيف مصفوفة بايتات، فتنخفض تكلفة المفهوم
+    إلى حجم نصوصه تقريباً. السجلات تُبنى عند الطلب عبر ذاكرة LRU.
+    """
+
+    # فاصل عناصر الحقول متعددة القيم داخل العمود
+    _LIST_SEPARATOR = "\x1f"
+
+    def __init__(self, concepts: Iterable[Tuple[str, IslamicConcept]] = (), cache_size: int = 1024):
+        super().__init__(cache_size=cache_size)
+        self._field_names = [field.name for field in fields(IslamicConcept) if field.name != "category"]
+        self._columns = {name: _TextColumn() for name in self._field_names}
+        self._categories = array("B")
+        self._category_members = list(ConceptCategory)
+        self._rows: Dict[str, int] = {}
+        for concept_id, concept in concepts:
+            self.append(concept_id, concept)
+
+    def append(self, concept_id: str, concept: IslamicConcept):
+        """إضافة مفهوم جديد في نهاية الأعمدة"""
+        if concept_id in self._rows:
+            raise ValueError(f"المفهوم موجود مسبقاً: {concept_id}")
+        self._append_row(concept_id, concept)
+        self._ids = None
+
+    def _save(self, concept_id: str, concept: IslamicConcept):
+        # النسخة السابقة تبقى في الأعمدة دون مرجع (الأعمدة للإلحاق فقط)
+        self._append_row(concept_id, concept)
+
+    def _delete(self, concept_id: str):
+        del self._rows[concept_id]
+
+    def _append_row(self, concept_id: str, concept: IslamicConcept):
+        self._rows[concept_id] = len(self._categories)
+        self._categories.append(self._category_members.index(concept.category))
+        for name in self._field_names:
+            value = getattr(concept, name)
+            if not isinstance(value, str):
+                value = self._LIST_SEPARATOR.join(value)
+            self._columns[name].append(value)
+
+    def _load(self, concept_id: str) -> Optional[IslamicConcept]:
+        row = self._rows.get(concept_id)
+        if row is None:
+            return None
+        values = {}
+        for name in self._field_names:
+            value = self._columns[name][row]
+            if name in _LIST_FIELDS:
+                value = value.split(self._LIST_SEPARATOR) if value else ()
+            values[name] = value
+        return IslamicConcept(category=self._category_members[self._categories[row]], **values)
+
+    def concept_ids(self) -> List[str]:
+        return list(self._rows)
+
+    def __contains__(self, concept_id) -> bool:
+        return concept_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def nbytes(self) -> int:
+        """الحجم التقريبي لبيانات الأعمدة بالبايت"""
+        return sum(column.nbytes() for column in self._columns.values()) + len(self._categories)
+
+
+def write_jsonl_store(concepts: Iterable[Tuple[str, IslamicConcept]], path: str) -> Dict[str, int]:
+    """كتابة المفاهيم في ملف JSONL وإرجاع موضع كل سجل"""
+    offsets = {}
+    with open(path, "wb") as handle:
+        for concept_id, concept in concepts:
+            offsets[concept_id] = handle.tell()
+            line = json.dumps(concept_to_dict(concept_id, concept), ensure_ascii=False)
+            handle.write(line.encode("utf-8") + b"\n")
+    return offsets
+
+
+def _sqlite_row(concept_id: str, concept: IslamicConcept) -> Tuple[List[str], List]:
+    """أسماء الأعمدة وقيمها لصف مفهوم واحد"""
+    record = concept_to_dict(concept_id, concept)
+    for column in _LIST_FIELDS:
+        record[column] = json.dumps(record[column], ensure_ascii=False)
+    columns = list(record)
+    return columns, [record[column] for column in columns]
+
+
+def write_sqlite_store(concepts: Iterable[Tuple[str, IslamicConcept]], path: str):
+    """كتابة المفاهيم في قاعدة SQLite"""
+    columns = ["id"] + [field.name for field in fields(IslamicConcept)]
+    definitions = ", ".join(
+        f"{column} TEXT PRIMARY KEY" if column == "id" else f"{column} TEXT" for column in columns
+    )
+    placeholders = ", ".join("?" for _ in columns)
+
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("DROP TABLE IF EXISTS concepts")
+        connection.execute(f"CREATE TABLE concepts ({definitions})")
+        for concept_id, concept in concepts:
+            _, values = _sqlite_row(concept_id, concept)
+            connection.execute(
+                f"INSERT INTO concepts ({', '.join(columns)}) VALUES ({placeholders})", values
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def open_concept_store(path: str, cache_size: int = 1024) -> ConceptStore:
+    """فتح مخزن المفاهيم المناسب حسب امتداد الملف"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return JSONLConceptStore(path, cache_size=cache_size)
+    if extension in (".sqlite", ".sqlite3", ".db"):
+        return SQLiteConceptStore(path, cache_size=cache_size)
+    raise ValueError(f"صيغة مخزن المفاهيم غير مدعومة: {path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from islamic_context_explainer import IslamicContextExplainer
+
+    parser = argparse.ArgumentParser(description="تصدير القاعدة المدمجة إلى مخزن خارجي")
+    parser.add_argument("output", help="مسار الملف الناتج (.jsonl أو .sqlite)")
+    args = parser.parse_args()
+
+    builtin = IslamicContextExplainer().concepts_database.iter_concepts()
+    if args.output.lower().endswith((".jsonl", ".ndjson")):
+        write_jsonl_store(builtin, args.output)
+    else:
+        write_sqlite_store(builtin, args.output)
+    print(f"تم التصدير إلى {args.output}")
@@ -0,0 +1,121 @@
+"""
+فهرس البحث التقريبي المتسامح مع الأخطاء الإملائية
+على طريقة SymSpell: تُحسب مسبقاً صيغ الحذف لكل مصطلح فيصبح البحث عن
+الكلمات القريبة عدداً محدوداً من عمليات القاموس بدلاً من مقارنة كل المصطلحات
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+
+def edit_distance(first: str, second: str, max_distance: int) -> int:
+    """مسافة Damerau-Levenshtein (المقيدة) مع التوقف المبكر
+
+    تعيد max_distance + 1 إذا تجاوزت المسافة الحد.
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+
+    previous_previous: List[int] = []
+    previous = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i] + [0] * len(second)
+        row_minimum = current[0]
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and first[i - 1] == second[j - 2]
+                    and first[i - 2] == second[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+            row_minimum = min(row_minimum, current[j])
+        if row_minimum > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymSpellIndex:
+    """فهرس صيغ الحذف للمصطلحات (أسماء المفاهيم والمفاهيم المترابطة)"""
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        # المصطلح -> المفاهيم المرتبطة به
+        self._terms: Dict[str, List[str]] = {}
+        # صيغة الحذف -> المصطلحات التي تولدها
+        self._deletes: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term.lower() in self._terms
+
+    def _generate_deletes(self, word: str, max_distance: int) -> Set[str]:
+        """جميع الصيغ الناتجة عن حذف حتى max_distance حرفاً من بادئة الكلمة"""
+        prefix = word[:self.prefix_length]
+        deletes = {prefix}
+        frontier = {prefix}
+        for _ in range(max_distance):
+            next_frontier = set()
+            for item in frontier:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    candidate = item[:i] + item[i + 1:]
+                    if candidate not in deletes:
+                        next_frontier.add(candidate)
+            deletes |= next_frontier
+            frontier = next_frontier
+        return deletes
+
+    def add_term(self, term: str, concept_id: str):
+        """إضافة مصطلح مرتبط بمفهوم"""
+        term = term.lower()
+        concept_ids = self._terms.setdefault(term, [])
+        if concept_id in concept_ids:
+            return
+        concept_ids.append(concept_id)
+        if len(concept_ids) == 1:
+            for delete in self._generate_deletes(term, self.max_distance):
+                self._deletes.setdefault(delete, set()).add(term)
+
+    def remove_term(self, term: str, concept_id: str):
+        """فك ارتباط مصطلح بمفهوم وحذفه عند خلوه"""
+        term = term.lower()
+        concept_ids = self._terms.get(term)
+        if not concept_ids or concept_id not in concept_ids:
+            return
+        concept_ids.remove(concept_id)
+        if not concept_ids:
+            del self._terms[term]
+            for delete in self._generate_deletes(term, self.max_distance):
+                terms = self._deletes.get(delete)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self._deletes[delete]
+
+    def lookup(self, word: str, max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """المصطلحات القريبة من الكلمة مرتبة حسب المسافة"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = min(max_distance, self.max_distance)
+        word = word.lower()
+
+        if word in self._terms:
+            return [(word, 0)]
+
+        matches: Dict[str, int] = {}
+        for delete in self._generate_deletes(word, max_distance):
+            for term in self._deletes.get(delete, ()):
+                if term in matches:
+                    continue
+                distance = edit_distance(word, term, max_distance)
+                if distance <= max_distance:
+                    matches[term] = distance
+
+        return sorted(matches.items(), key=lambda item: (item[1], item[0]))
+
+    def concepts_for(self, term: str) -> List[str]:
+        """المفاهيم المرتبطة بمصطلح"""
+        return list(self._terms.get(term, ()))
@@ -0,0 +1,381 @@
+"""
+لقطة فهرس البحث الثنائية المعدّة مسبقاً
+تُكتب مرة واحدة خارج التشغيل ثم تُفتح عبر mmap عند الإقلاع فتتشارك
+عمليات العمال على نفس الجهاز صفحات الذاكرة دون إعادة بناء الفهرس
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from search_index import SubstringIndex
+
+SNAPSHOT_MAGIC = b"CONIDX\x00\x00"
+SNAPSHOT_VERSION = 4  # الإصدار 4: حجم ملف JSONL الذي حُسبت منه مواضع السجلات
+
+# علامة ترتيب البايتات: المصفوفات تُكتب بالترتيب المحلي وتُقرأ دون نسخ
+_BYTE_ORDER_MARK = 0x01020304
+# الرأس: التوقيع، الإصدار، علامة الترتيب، حجم n-gram، أطول كلمة مفتاحية، عدد الأقسام، حجم ملف JSONL
+_HEADER = struct.Struct("=8sIIIIIQ")
+_SECTION = struct.Struct("=QQ")
+# موضع أو حجم غير معروف (مخزن غير JSONL)
+NO_OFFSET = 0xFFFFFFFFFFFFFFFF
+
+_SECTIONS = (
+    "keyword_blob", "keyword_offsets", "keyword_order",
+    "keyword_posting_offsets", "keyword_postings",
+    "concept_blob", "concept_offsets", "concept_order",
+    "concept_record_offsets",
+    "gram_blob", "gram_offsets", "gram_order",
+    "gram_posting_offsets", "gram_postings",
+)
+
+
+class SnapshotError(ValueError):
+    """لقطة فهرس غير صالحة أو غير متوافقة"""
+
+
+def _pack_strings(strings: Sequence[str]) -> Tuple[bytes, array, array]:
+    """ترميز قائمة نصوص: كتلة UTF-8 ومواضعها وترتيبها الأبجدي للبحث الثنائي"""
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = array("I", [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    order = array("I", sorted(range(len(encoded)), key=encoded.__getitem__))
+    return b"".join(encoded), offsets, order
+
+
+def _pack_postings(postings: Iterable[Iterable[int]]) -> Tuple[array, array]:
+    """ترميز قوائم الورود: مواضع البداية والقيم المتتالية"""
+    offsets = array("I", [0])
+    values = array("I")
+    for posting in postings:
+        values.extend(posting)
+        offsets.append(len(values))
+    return offsets, values
+
+
+class _StringTable:
+    """جدول نصوص مقروء مباشرة من اللقطة"""
+
+    def __init__(self, blob: memoryview, offsets: memoryview, order: memoryview):
+        self._blob = blob
+        self._offsets = offsets
+        self._order = order
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def raw(self, index: int) -> bytes:
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+    def __getitem__(self, index: int) -> str:
+        return self.raw(index).decode("utf-8")
+
+    def find(self, text: str) -> Optional[int]:
+        """البحث الثنائي عن نص وإرجاع موضعه"""
+        target = text.encode("utf-8")
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.raw(self._order[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._order) and self.raw(self._order[low]) == target:
+            return self._order[low]
+        return None
+
+
+class _Postings:
+    """قوائم ورود مقروءة مباشرة من اللقطة"""
+
+    def __init__(self, offsets: memoryview, values: memoryview):
+        self._offsets = offsets
+        self._values = values
+
+    def __getitem__(self, index: int) -> memoryview:
+        return self._values[self._offsets[index]:self._offsets[index + 1]]
+
+
+class MappedSubstringIndex(SubstringIndex):
+    """فهرس المطابقة الجزئية للقراءة فقط فوق لقطة mmap"""
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        self.ngram_size = snapshot.ngram_size
+        self._snapshot = snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshot.keywords)
+
+    def __contains__(self, keyword: str) -> bool:
+        return self._snapshot.keywords.find(keyword) is not None
+
+    def add_keyword(self, keyword: str) -> int:
+        raise TypeError("فهرس اللقطة للقراءة فقط")
+
+    def keyword(self, keyword_id: int) -> str:
+        return self._snapshot.keywords[keyword_id]
+
+    def keywords(self) -> List[str]:
+        table = self._snapshot.keywords
+        return [table[i] for i in range(len(table))]
+
+    @property
+    def max_keyword_length(self) -> int:
+        return self._snapshot.max_keyword_length
+
+    def iter_postings(self) -> Iterator[Tuple[str, List[int]]]:
+        grams = self._snapshot.grams
+        for gram_id in range(len(grams)):
+            yield grams[gram_id], list(self._snapshot.gram_postings[gram_id])
+
+    def _posting(self, gram: str) -> Iterable[int]:
+        gram_id = self._snapshot.grams.find(gram)
+        if gram_id is None:
+            return ()
+        return self._snapshot.gram_postings[gram_id]
+
+    def _keyword_id(self, keyword: str) -> Optional[int]:
+        return self._snapshot.keywords.find(keyword)
+
+
+class MappedKeywordIndex(Mapping):
+    """عرض للقراءة فقط لفهرس الكلمات المفتاحية (كلمة -> معرفات المفاهيم)"""
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        self._snapshot = snapshot
+
+    def __getitem__(self, keyword: str) -> List[str]:
+        keyword_id = self._snapshot.keywords.find(keyword)
+        if keyword_id is None:
+            raise KeyError(keyword)
+        concepts = self._snapshot.concepts
+        return [concepts[i] for i in self._snapshot.keyword_postings[keyword_id]]
+
+    def __contains__(self, keyword) -> bool:
+        return self._snapshot.keywords.find(keyword) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        keywords = self._snapshot.keywords
+        return (keywords[i] for i in range(len(keywords)))
+
+    def __len__(self) -> int:
+        return len(self._snapshot.keywords)
+
+
+class ConceptOffsets(Mapping):
+    """مواضع سجلات المفاهيم في ملف JSONL كما حُفظت في اللقطة"""
+
+    def __init__(self, snapshot: "IndexSnapshot"):
+        self._snapshot = snapshot
+
+    def __getitem__(self, concept_id: str) -> int:
+        index = self._snapshot.concepts.find(concept_id)
+        if index is None:
+            raise KeyError(concept_id)
+        offset = self._snapshot.concept_record_offsets[index]
+        if offset == NO_OFFSET:
+            raise KeyError(concept_id)
+        return offset
+
+    def __contains__(self, concept_id) -> bool:
+        return self._snapshot.concepts.find(concept_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        concepts = self._snapshot.concepts
+        return (concepts[i] for i in range(len(concepts)))
+
+    def __len__(self) -> int:
+        return len(self._snapshot.concepts)
+
+
+class IndexSnapshot:
+    """لقطة فهرس مفتوحة عبر mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+        self._views: List[memoryview] = [self._buffer]
+
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self):
+        if len(self._buffer) < _HEADER.size:
+            raise SnapshotError(f"لقطة الفهرس تالفة: {self.path}")
+
+        magic, version, byte_order, ngram_size, max_keyword_length, section_count, source_size = \
+            _HEADER.unpack_from(self._buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"الملف ليس لقطة فهرس: {self.path}")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"إصدار لقطة غير مدعوم: {version} (المتوقع {SNAPSHOT_VERSION})")
+        if byte_order != _BYTE_ORDER_MARK or section_count != len(_SECTIONS):
+            raise SnapshotError(f"لقطة الفهرس غير متوافقة مع هذا الجهاز: {self.path}")
+
+        self.version = version
+        self.ngram_size = ngram_size
+        self.max_keyword_length = max_keyword_length
+        # حجم ملف JSONL عند الترجمة؛ ما أُلحق بعده لا تعرفه مواضع اللقطة
+        self.source_size: Optional[int] = None if source_size == NO_OFFSET else source_size
+
+        sections: Dict[str, memoryview] = {}
+        position = _HEADER.size
+        for name in _SECTIONS:
+            offset, length = _SECTION.unpack_from(self._buffer, position)
+            position += _SECTION.size
+            if offset + length > len(self._buffer):
+                raise SnapshotError(f"لقطة الفهرس مبتورة: {self.path}")
+            view = self._buffer[offset:offset + length]
+            if name == "concept_record_offsets":
+                view = view.cast("Q")
+            elif not name.endswith("_blob"):
+                view = view.cast("I")
+            self._views.append(view)
+            sections[name] = view
+
+        self.keywords = _StringTable(
+            sections["keyword_blob"], sections["keyword_offsets"], sections["keyword_order"]
+        )
+        self.keyword_postings = _Postings(
+            sections["keyword_posting_offsets"], sections["keyword_postings"]
+        )
+        self.concepts = _StringTable(
+            sections["concept_blob"], sections["concept_offsets"], sections["concept_order"]
+        )
+        self.concept_record_offsets = sections["concept_record_offsets"]
+        self.grams = _StringTable(
+            sections["gram_blob"], sections["gram_offsets"], sections["gram_order"]
+        )
+        self.gram_postings = _Postings(
+            sections["gram_posting_offsets"], sections["gram_postings"]
+        )
+
+    def keyword_index(self) -> MappedKeywordIndex:
+        return MappedKeywordIndex(self)
+
+    def substring_index(self) -> MappedSubstringIndex:
+        return MappedSubstringIndex(self)
+
+    def concept_offsets(self) -> Optional[ConceptOffsets]:
+        """مواضع سجلات JSONL إن حُفظت في اللقطة"""
+        if NO_OFFSET in self.concept_record_offsets:
+            return None
+        return ConceptOffsets(self)
+
+    def concept_ids(self) -> List[str]:
+        return [self.concepts[i] for i in range(len(self.concepts))]
+
+    def close(self):
+        """تحرير العروض ثم إغلاق mmap"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+
+def write_index_snapshot(
+    path: str,
+    search_keywords: Dict[str, List[str]],
+    substring_index: SubstringIndex,
+    concept_ids: Sequence[str],
+    concept_record_offsets: Optional[Dict[str, int]] = None,
+    source_size: Optional[int] = None,
+):
+    """كتابة لقطة الفهرس في ملف (يُستبدل الملف القديم بشكل ذري)"""
+    keywords = substring_index.keywords()
+    if keywords != list(search_keywords):
+        raise SnapshotError("فهرس المطابقة الجزئية لا يطابق فهرس الكلمات المفتاحية")
+
+    concept_positions = {concept_id: i for i, concept_id in enumerate(concept_ids)}
+    gram_entries = list(substring_index.iter_postings())
+
+    keyword_blob, keyword_offsets, keyword_order = _pack_strings(keywords)
+    keyword_posting_offsets, keyword_postings = _pack_postings(
+        [concept_positions[concept_id] for concept_id in search_keywords[keyword]]
+        for keyword in keywords
+    )
+    concept_blob, concept_offsets, concept_order = _pack_strings(concept_ids)
+    record_offsets = array("Q", [
+        (concept_record_offsets or {}).get(concept_id, NO_OFFSET) for concept_id in concept_ids
+    ])
+    gram_blob, gram_offsets, gram_order = _pack_strings([gram for gram, _ in gram_entries])
+    gram_posting_offsets, gram_postings = _pack_postings(posting for _, posting in gram_entries)
+
+    payloads = {
+        "keyword_blob": keyword_blob,
+        "keyword_offsets": keyword_offsets.tobytes(),
+        "keyword_order": keyword_order.tobytes(),
+        "keyword_posting_offsets": keyword_posting_offsets.tobytes(),
+        "keyword_postings": keyword_postings.tobytes(),
+        "concept_blob": concept_blob,
+        "concept_offsets": concept_offsets.tobytes(),
+        "concept_order": concept_order.tobytes(),
+        "concept_record_offsets": record_offsets.tobytes(),
+        "gram_blob": gram_blob,
+        "gram_offsets": gram_offsets.tobytes(),
+        "gram_order": gram_order.tobytes(),
+        "gram_posting_offsets": gram_posting_offsets.tobytes(),
+        "gram_postings": gram_postings.tobytes(),
+    }
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as handle:
+        handle.write(_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, _BYTE_ORDER_MARK,
+            substring_index.ngram_size, substring_index.max_keyword_length, len(_SECTIONS),
+            NO_OFFSET if source_size is None else source_size,
+        ))
+        table_position = handle.tell()
+        handle.write(b"\x00" * (_SECTION.size * len(_SECTIONS)))
+
+        table = []
+        for name in _SECTIONS:
+            # محاذاة كل قسم على 8 بايت لقراءة المصفوفات مباشرة
+            handle.write(b"\x00" * (-handle.tell() % 8))
+            table.append((handle.tell(), len(payloads[name])))
+            handle.write(payloads[name])
+
+        handle.seek(table_position)
+        for offset, length in table:
+            handle.write(_SECTION.pack(offset, length))
+
+    os.replace(temp_path, path)
+
+
+def compile_index_snapshot(explainer, path: str):
+    """خطوة "ترجمة الفهرس": كتابة لقطة لفهرس شارح مبني مسبقاً"""
+    store = explainer.concepts_database
+    write_index_snapshot(
+        path,
+        explainer.search_keywords,
+        explainer.substring_index,
+        store.concept_ids(),
+        getattr(store, "offsets", None),
+        getattr(store, "size", None),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from concept_store import open_concept_store
+    from islamic_context_explainer import IslamicContextExplainer
+
+    parser = argparse.ArgumentParser(description="ترجمة فهرس البحث إلى لقطة ثنائية")
+    parser.add_argument("output", help="مسار ملف اللقطة الناتج")
+    parser.add_argument("--store", help="مخزن المفاهيم (.jsonl أو .sqlite)؛ الافتراضي القاعدة المدمجة")
+    args = parser.parse_args()
+
+    store = open_concept_store(args.store) if args.store else None
+    compile_index_snapshot(IslamicContextExplainer(store=store), args.output)
+    print(f"تمت كتابة لقطة الفهرس (الإصدار {SNAPSHOT_VERSION}) إلى {args.output}")
@@ -0,0 +1,85 @@
+"""
+موجه النوايا المحلي
+يقرر بسرعة إن كانت الرسالة سؤالاً عن مفهوم في القاعدة أم سؤالاً عاماً لـ OpenAI:
+تُحذف الكلمات الوظيفية، ثم يكفي ذكر اسم مفهوم (أو اسم بديل أو مفهوم مترابط)
+وإلا يُشترط حد أدنى للنقاط، وتُستبعد المفاهيم البعيدة عن أفضل نتيجة،
+مع حفظ الخصائص والقرارات لكل صيغة موحدة
+"""
+
+from typing import Dict, Optional, Tuple
+
+from arabic_normalizer import content_terms
+from lru_cache import LRUCache
+
+
+class IntentRouter:
+    """موجه "مفهوم محلي أم سؤال عام" فوق فهارس الشارح"""
+
+    # أقل نقاط لأفضل نتيجة عندما لا تذكر الرسالة اسم مفهوم صراحة
+    # (8 في نمط keyword = تطابقان تامان مع كلمات التعريف)
+    DEFAULT_MIN_SCORES = {"keyword": 8.0, "bm25": 3.0}
+
+    def __init__(self, explainer, min_score: Optional[float] = None, score_gap: float = 0.5,
+                 max_candidates: int = 5, cache_size: int = 4096):
+        """score_gap: تُستبعد المفاهيم التي تقل نقاطها عن (1 - score_gap) من أفضل نتيجة"""
+        self.explainer = explainer
+        self.min_score = min_score
+        self.score_gap = score_gap
+        self.max_candidates = max_candidates
+        # النص -> كلماته الدالة
+        self._features = LRUCache(cache_size)
+        # (الكلمات الدالة، نمط الترتيب) -> (المفاهيم، أفضل نقاط، بحث تقريبي)
+        self._decisions = LRUCache(cache_size)
+
+    def features(self, text: str) -> Tuple[str, ...]:
+        """الكلمات الدالة في النص بعد التوحيد وحذف الكلمات الوظيفية"""
+        terms = self._features.get(text)
+        if terms is None:
+            # الكلمات ذات الحرف الواحد تطابق جزئياً كل شيء تقريباً
+            terms = tuple(term for term in content_terms(text) if len(term) > 1)
+            self._features.put(text, terms)
+        return terms
+
+    def _min_score(self, mode: str) -> float:
+        if self.min_score is not None:
+            return self.min_score
+        return self.DEFAULT_MIN_SCORES[mode]
+
+    def route(self, text: str, mode: Optional[str] = None) -> Tuple[Tuple[str, ...], float, bool]:
+        """المفاهيم المرشحة للرسالة وأفضل نقاطها وهل جاءت من البحث التقريبي
+
+        قائمة المفاهيم الفارغة تعني أن الرسالة سؤال عام.
+        """
+        mode = mode or self.explainer.ranking_mode
+        terms = self.features(text)
+        if not terms:
+            return (), 0.0, False
+
+        decision = self._decisions.get((terms, mode))
+        if decision is None:
+            generation = self.explainer.generation
+            decision = self._decide(terms, mode)
+            # قرار حُسب قبل تعديل القاعدة لا يُحفظ بعد مسح القرارات
+            self.explainer.put_if_current(self._decisions, (terms, mode), decision, generation)
+        return decision
+
+    def _decide(self, terms: Tuple[str, ...], mode: str) -> Tuple[Tuple[str, ...], float, bool]:
+        scored = self.explainer.score_terms(list(terms), self.max_candidates, mode)
+        names_concept = " ".join(terms) in self.explainer.fuzzy_index or any(
+            term in self.explainer.fuzzy_index for term in terms
+        )
+        if not scored or not (names_concept or scored[0][1] >= self._min_score(mode)):
+            # لا تطابق كافٍ: تصحيح إملائي لأسماء المفاهيم قبل اعتبارها سؤالاً عاماً
+            fuzzy = self.explainer.fuzzy_search_terms(list(terms), limit=self.max_candidates)
+            return tuple(fuzzy), 0.0, bool(fuzzy)
+
+        best = scored[0][1]
+        cutoff = best * (1 - self.score_gap)
+        return tuple(concept_id for concept_id, score in scored if score >= cutoff), float(best), False
+
+    def clear(self):
+        """مسح القرارات المحفوظة بعد تغير القاعدة"""
+        self._decisions.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"features": self._features.stats(), "decisions": self._decisions.stats()}
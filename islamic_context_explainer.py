@@ -3,45 +3,133 @@
 نظام متقدم لشرح المفاهيم الإسلامية مع السياق الثقافي والتاريخي
 """
 
+import heapq
 import json
-import re
-from typing import Dict, List, Optional, Tuple
+import logging
+import multiprocessing
+import threading
 from dataclasses import dataclass
-from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from arabic_normalizer import is_stopword, normalize_phrase, normalize_terms, raw_phrase, raw_terms
+from concept_graph import ConceptGraph
+from concept_model import ConceptCategory, IslamicConcept
+from bm25_ranker import BM25Ranker
+from category_index import CategoryIndex, CategoryPage
+from concept_store import ConceptStore, InMemoryConceptStore
+from fuzzy_index import SymSpellIndex
+from index_snapshot import IndexSnapshot
+from intent_router import IntentRouter
+from lru_cache import LRUCache, RenderCache
+from search_index import SubstringIndex
+
+logger = logging.getLogger(__name__)
+
+# رموز التصنيفات في قوائم التصفح
+CATEGORY_ICONS = {
+    ConceptCategory.WORSHIP: "🕌",
+    ConceptCategory.BELIEFS: "🕊️",
+    ConceptCategory.JURISPRUDENCE: "⚖️",
+    ConceptCategory.HISTORY: "📜",
+    ConceptCategory.ETHICS: "❤️",
+    ConceptCategory.CULTURE: "🏛️",
+    ConceptCategory.SPIRITUALITY: "🌙",
+    ConceptCategory.TERMINOLOGY: "📖",
+}
+
+# الشارح الذي تبحث فيه العمليات المنسوخة أثناء البحث المتوازي
+_BATCH_EXPLAINER: Optional["IslamicContextExplainer"] = None
 
-class ConceptCategory(Enum):
-    """تصنيفات المفاهيم الإسلامية"""
-    WORSHIP = "عبادات"
-    BELIEFS = "عقائد"
-    JURISPRUDENCE = "فقه"
-    HISTORY = "تاريخ"
-    ETHICS = "أخلاق"
-    CULTURE = "ثقافة"
-    SPIRITUALITY = "روحانيات"
-    TERMINOLOGY = "مصطلحات"
+def _search_batch_chunk(args: Tuple[List[str], int, str]) -> List[List[Tuple[str, float]]]:
+    queries, top_k, mode = args
+    return _BATCH_EXPLAINER._search_batch(queries, top_k, mode)
 
-@dataclass
-class IslamicConcept:
-    """هيكل بيانات المفاهيم الإسلامية"""
-    name: str
-    arabic_name: str
-    category: ConceptCategory
-    definition: str
-    cultural_context: str
-    historical_background: str
-    practical_application: str
-    related_concepts: List[str]
-    sources: List[str]
-    examples: List[str]
-    common_misconceptions: List[str]
+@dataclass(frozen=True)
+class QueryPlan:
+    """نتيجة تحليل رسالة واحدة يتشاركها التوجيه والرد فلا يتكرر البحث"""
+    query: str
+    # الصيغة الموحدة للاستعلام (مفتاح الذاكرة المؤقتة)
+    key: str
+    concept_ids: Tuple[str, ...]
+    # هل جاءت النتائج من البحث التقريبي
+    fuzzy: bool = False
+    # نقاط أفضل نتيجة عند التوجيه
+    score: float = 0.0
+    
+    @property
+    def is_concept_query(self) -> bool:
+        return bool(self.concept_ids)
 
 class IslamicContextExplainer:
     """شارح السياق الثقافي الإسلامي"""
     
-    def __init__(self):
-        """تهيئة قاعدة المعرفة الإسلامية"""
-        self.concepts_database = self._initialize_concepts_database()
-        self.search_keywords = self._build_search_index()
+    # أنماط ترتيب نتائج البحث المدعومة
+    RANKING_MODES = ("keyword", "bm25")
+    
+    def __init__(self, store: Optional[ConceptStore] = None,
+                 index_snapshot: Optional[IndexSnapshot] = None,
+                 ranking_mode: str = "keyword",
+                 render_cache_size: int = 512,
+                 fuzzy_max_distance: int = 2,
+                 normalize: bool = True,
+                 query_cache_size: int = 1024):
+        """تهيئة قاعدة المعرفة الإسلامية
+        
+        يمكن تمرير مخزن خارجي (JSONL أو SQLite) لتحميل المفاهيم عند الطلب،
+        وإلا تُستخدم القاعدة المدمجة. عند تمرير لقطة فهرس معدّة مسبقاً
+        يُقرأ الفهرس منها مباشرة بدلاً من إعادة بنائه. نمط الترتيب
+        "bm25" يرتب النتائج عبر BM25 على جميع حقول المفهوم. توحيد الكتابة
+        العربية (normalize) يُطبق بنفس الطريقة على الفهارس والاستعلامات.
+        """
+        if ranking_mode not in self.RANKING_MODES:
+            raise ValueError(f"نمط ترتيب غير مدعوم: {ranking_mode}")
+        self.ranking_mode = ranking_mode
+        # تقسيم النصوص وتوحيدها للفهارس والاستعلامات
+        self._terms = normalize_terms if normalize else raw_terms
+        self._phrase = normalize_phrase if normalize else raw_phrase
+        self._is_stopword = is_stopword if normalize else (lambda term: False)
+        # يُبنى عند أول بحث بنمط bm25، ويُعاد بناؤه بعد التعديلات في الخلفية
+        self._bm25_ranker: Optional[BM25Ranker] = None
+        self._bm25_stale = False
+        self._bm25_ready = threading.Event()
+        self._bm25_ready.set()
+        # النصوص المعروضة المتكررة (الشرح والقوائم والجوانب)
+        self.render_cache = RenderCache(render_cache_size)
+        # خطط الاستعلامات حسب صيغتها الموحدة ونمط الترتيب
+        self.query_cache = LRUCache(query_cache_size)
+        # التمييز بين أسئلة المفاهيم والأسئلة العامة قبل البحث الكامل
+        self.intent_router = IntentRouter(self)
+        
+        if store is None:
+            store = InMemoryConceptStore(self._initialize_concepts_database())
+        self.concepts_database: ConceptStore = store
+        
+        # رسم العلاقات وفهرس التصنيفات
+        self._concept_graph = ConceptGraph(self._phrase)
+        self._category_index = CategoryIndex()
+        # فهرس البحث التقريبي لأسماء المفاهيم والمفاهيم المترابطة
+        self._fuzzy_index = SymSpellIndex(max_distance=fuzzy_max_distance)
+        # مع لقطة الفهرس تُبنى الفهارس الثلاثة عند أول استخدام فلا يُقرأ المخزن كاملاً عند الإقلاع
+        self._concept_indexes_ready = index_snapshot is None
+        # تسلسل تعديلات القاعدة (الإضافة والتعديل والحذف)
+        self._update_lock = threading.RLock()
+        # يزيد مع كل إبطال؛ النتيجة المحسوبة قبل تعديل لا تُحفظ بعده
+        self.generation = 0
+        
+        # تُغلق مع الشارح (قد تعتمد عليها مواضع سجلات المخزن)
+        self.index_snapshot = index_snapshot
+        if index_snapshot is not None:
+            if index_snapshot.concept_ids() != store.concept_ids():
+                raise ValueError("لقطة الفهرس لا تطابق مخزن المفاهيم، أعد ترجمة الفهرس")
+            self.search_keywords = index_snapshot.keyword_index()
+            self.substring_index = index_snapshot.substring_index()
+        else:
+            self.search_keywords: Dict[str, List[str]] = {}
+            self.substring_index = SubstringIndex()
+        
+            # بناء جميع الفهارس في مرور واحد على المفاهيم
+            for concept_id, concept in self.concepts_database.iter_concepts():
+                self._index_concept(concept_id, concept)
     
     def _initialize_concepts_database(self) -> Dict[str, IslamicConcept]:
         """إنشاء قاعدة بيانات المفاهيم الإسلامية"""
@@ -59,7 +147,8 @@ class IslamicContextExplainer:
             related_concepts=["وضوء", "قبلة", "أذان", "إمامة", "جماعة"],
             sources=["القرآن الكريم", "السنة النبوية", "إجماع العلماء"],
             examples=["صلاة الفجر قبل الشروق", "صلاة الجمعة الجماعية", "قصر الصلاة في السفر"],
-            common_misconceptions=["أن الصلاة مجرد حركات جسدية", "أن الصلاة تكفي عن العمل الصالح"]
+            common_misconceptions=["أن الصلاة مجرد حركات جسدية", "أن الصلاة تكفي عن العمل الصالح"],
+            aliases=["salah", "salat", "salaat", "namaz", "prayer", "prayers"]
         )
         
         concepts["hajj"] = IslamicConcept(
@@ -73,7 +162,8 @@ class IslamicContextExplainer:
             related_concepts=["عمرة", "طواف", "سعي", "عرفة", "إحرام"],
             sources=["القرآن الكريم", "السنة النبوية", "كتب المناسك"],
             examples=["طواف الوداع", "الوقوف بعرفة", "رمي الجمرات"],
-            common_misconceptions=["أن الحج مجرد سياحة دينية", "أن العمرة تغني عن الحج"]
+            common_misconceptions=["أن الحج مجرد سياحة دينية", "أن العمرة تغني عن الحج"],
+            aliases=["hajj", "haj", "hadj", "pilgrimage"]
         )
         
         concepts["jihad"] = IslamicConcept(
@@ -87,7 +177,8 @@ class IslamicContextExplainer:
             related_concepts=["جهاد النفس", "الأمر بالمعروف", "النهي عن المنكر", "الدفاع"],
             sources=["القرآن الكريم", "السنة النبوية", "كتب الفقه"],
             examples=["طلب العلم جهاد", "الإحسان للوالدين جهاد", "العمل الصالح جهاد"],
-            common_misconceptions=["أن الجهاد يعني القتال فقط", "أن الجهاد لا ضوابط له"]
+            common_misconceptions=["أن الجهاد يعني القتال فقط", "أن الجهاد لا ضوابط له"],
+            aliases=["jihad", "struggle", "striving"]
         )
         
         # مفاهيم العقائد
@@ -102,7 +193,8 @@ class IslamicContextExplainer:
             related_concepts=["شهادة أن لا إله إلا الله", "أسماء الله الحسنى", "صفات الله"],
             sources=["القرآن الكريم", "السنة النبوية", "كتب العقيدة"],
             examples=["لا إله إلا الله", "الدعاء لله وحده", "التوكل على الله"],
-            common_misconceptions=["أن التوحيد مجرد كلمة تقال", "الخلط بين التوحيد والتوسل"]
+            common_misconceptions=["أن التوحيد مجرد كلمة تقال", "الخلط بين التوحيد والتوسل"],
+            aliases=["tawhid", "tawheed", "tauhid", "monotheism", "oneness"]
         )
         
         # مفاهيم الأخلاق
@@ -117,163 +209,571 @@ class IslamicContextExplainer:
             related_concepts=["تقوى", "مراقبة الله", "إتقان", "تزكية"],
             sources=["حديث جبريل", "القرآن الكريم", "كتب التصوف"],
             examples=["الإحسان في العمل", "الإحسان للوالدين", "الإحسان في العبادة"],
-            common_misconceptions=["أن الإحسان مقصور على العبادة", "أن الإحسان يعني التساهل"]
+            common_misconceptions=["أن الإحسان مقصور على العبادة", "أن الإحسان يعني التساهل"],
+            aliases=["ihsan", "ehsan", "excellence", "benevolence"]
         )
         
         return concepts
     
-    def _build_search_index(self) -> Dict[str, List[str]]:
-        """بناء فهرس البحث للكلمات المفتاحية"""
-        index = {}
+    def _concept_keywords(self, concept: IslamicConcept) -> List[str]:
+        """الكلمات المفتاحية لمفهوم واحد"""
+        # إضافة الاسم والاسم العربي
+        keywords = [self._phrase(concept.name), self._phrase(concept.arabic_name)]
         
-        for concept_id, concept in self.concepts_database.items():
-            # إضافة الاسم والاسم العربي
-            keywords = [concept.name.lower(), concept.arabic_name.lower()]
-            
-            # إضافة المفاهيم المترابطة
-            keywords.extend([related.lower() for related in concept.related_concepts])
-            
-            # إضافة كلمات من التعريف
-            definition_words = re.findall(r'\b\w+\b', concept.definition.lower())
-            keywords.extend(definition_words)
-            
-            for keyword in keywords:
-                if keyword not in index:
-                    index[keyword] = []
-                if concept_id not in index[keyword]:
-                    index[keyword].append(concept_id)
+        # إضافة الأسماء البديلة (الإنجليزية والكتابات اللاتينية)
+        keywords.extend([self._phrase(alias) for alias in concept.aliases])
+        
+        # إضافة المفاهيم المترابطة
+        keywords.extend([self._phrase(related) for related in concept.related_concepts])
         
-        return index
+        # إضافة كلمات من التعريف دون الكلمات الوظيفية (في، من، هي...)
+        keywords.extend(term for term in self._terms(concept.definition) if not self._is_stopword(term))
+        
+        return [keyword for keyword in keywords if keyword]
+    
+    def _concept_terms(self, concept: IslamicConcept) -> List[str]:
+        """مصطلحات البحث التقريبي لمفهوم واحد"""
+        terms = [concept.name, concept.arabic_name, *concept.aliases, *concept.related_concepts]
+        return [phrase for phrase in map(self._phrase, terms) if phrase]
+    
+    @property
+    def concept_graph(self) -> ConceptGraph:
+        self._ensure_concept_indexes()
+        return self._concept_graph
+    
+    @property
+    def category_index(self) -> CategoryIndex:
+        self._ensure_concept_indexes()
+        return self._category_index
+    
+    @property
+    def fuzzy_index(self) -> SymSpellIndex:
+        self._ensure_concept_indexes()
+        return self._fuzzy_index
+    
+    def _ensure_concept_indexes(self):
+        """بناء رسم العلاقات والتصنيفات والبحث التقريبي من المخزن عند أول استخدام"""
+        if self._concept_indexes_ready:
+            return
+        with self._update_lock:
+            if self._concept_indexes_ready:
+                return
+            for concept_id, concept in self.concepts_database.iter_concepts():
+                self._index_relations(concept_id, concept)
+            self._concept_indexes_ready = True
     
-    def search_concepts(self, query: str) -> List[str]:
+    def _index_concept(self, concept_id: str, concept: IslamicConcept):
+        """إضافة مفهوم لفهارس البحث ورسم العلاقات وفهرس التصنيفات"""
+        for keyword in self._concept_keywords(concept):
+            if keyword not in self.search_keywords:
+                self.search_keywords[keyword] = []
+                self.substring_index.add_keyword(keyword)
+            if concept_id not in self.search_keywords[keyword]:
+                self.search_keywords[keyword].append(concept_id)
+        self._index_relations(concept_id, concept)
+    
+    def _index_relations(self, concept_id: str, concept: IslamicConcept):
+        for term in self._concept_terms(concept):
+            self._fuzzy_index.add_term(term, concept_id)
+        self._concept_graph.add_concept(concept_id, concept)
+        self._category_index.add(concept_id, concept.category)
+    
+    def _unindex_concept(self, concept_id: str, concept: IslamicConcept):
+        """حذف مفهوم من فهارس البحث ورسم العلاقات
+        
+        فهرس التصنيفات لا يُمس هنا حتى يحتفظ المفهوم المعدل بموضعه في تصنيفه.
+        الكلمات المفتاحية التي لم تعد تشير إلى أي مفهوم تبقى بقائمة فارغة
+        في فهرس المطابقة الجزئية فلا تؤثر في النقاط.
+        """
+        for keyword in self._concept_keywords(concept):
+            concept_ids = self.search_keywords.get(keyword)
+            if concept_ids and concept_id in concept_ids:
+                concept_ids.remove(concept_id)
+        
+        for term in self._concept_terms(concept):
+            self.fuzzy_index.remove_term(term, concept_id)
+        self.concept_graph.remove_concept(concept_id, concept)
+    
+    def _ensure_mutable_index(self):
+        """تحويل فهرس اللقطة (للقراءة فقط) إلى فهرس في الذاكرة قبل أول تعديل"""
+        # الفهارس المؤجلة تُبنى من القاعدة قبل تعديلها حتى لا يُضاف المفهوم مرتين
+        self._ensure_concept_indexes()
+        if isinstance(self.search_keywords, dict):
+            return
+        search_keywords = {keyword: list(concept_ids) for keyword, concept_ids in self.search_keywords.items()}
+        substring_index = SubstringIndex(self.substring_index.ngram_size)
+        for keyword in self.substring_index.keywords():
+            substring_index.add_keyword(keyword)
+        self.search_keywords, self.substring_index = search_keywords, substring_index
+    
+    def _after_update(self, concept_id: str):
+        """إبطال كل ما يعتمد على محتوى القاعدة بعد تعديلها"""
+        # IDF يعتمد على القاعدة كاملة فيُعاد بناء محرك BM25 خارج مسار الطلبات
+        if self._bm25_ranker is not None:
+            self._schedule_bm25_rebuild()
+        self.invalidate_concept(concept_id)
+    
+    def _schedule_bm25_rebuild(self):
+        """بدء إعادة البناء في الخلفية، أو تكرارها إن كانت جارية (يُستدعى مع القفل)"""
+        self._bm25_stale = True
+        if self._bm25_ready.is_set():
+            self._bm25_ready.clear()
+            threading.Thread(target=self._rebuild_bm25_ranker, name="bm25-rebuild", daemon=True).start()
+    
+    def _rebuild_bm25_ranker(self):
+        """بناء محرك جديد ثم استبداله دفعة واحدة؛ الطلبات تستخدم السابق حتى ينتهي"""
+        while True:
+            with self._update_lock:
+                if not self._bm25_stale:
+                    self._bm25_ready.set()
+                    return
+                self._bm25_stale = False
+            try:
+                ranker = BM25Ranker(self.concepts_database.iter_concepts(), tokenizer=self._terms)
+            except Exception as e:
+                logger.error(f"تعذر إعادة بناء محرك BM25، يُبنى عند البحث التالي: {e}")
+                ranker = None
+            with self._update_lock:
+                self._bm25_ranker = ranker
+                # نتائج حُسبت بالمحرك السابق لا تبقى في الذاكرات
+                self.generation += 1
+                self.query_cache.clear()
+                self.intent_router.clear()
+    
+    def wait_for_ranker(self, timeout: Optional[float] = None) -> bool:
+        """انتظار اكتمال إعادة بناء محرك BM25 الجارية"""
+        return self._bm25_ready.wait(timeout)
+    
+    def add_concept(self, concept_id: str, concept: IslamicConcept):
+        """إضافة مفهوم جديد وتحديث الفهارس تدريجياً دون إعادة بنائها"""
+        with self._update_lock:
+            if concept_id in self.concepts_database:
+                raise ValueError(f"المفهوم موجود مسبقاً: {concept_id}")
+            self._ensure_mutable_index()
+            self.concepts_database.put(concept_id, concept)
+            self._index_concept(concept_id, concept)
+            self._after_update(concept_id)
+    
+    def update_concept(self, concept_id: str, concept: IslamicConcept):
+        """استبدال بيانات مفهوم موجود وتحديث فهارسه"""
+        with self._update_lock:
+            previous = self.concepts_database[concept_id]
+            self._ensure_mutable_index()
+            self._unindex_concept(concept_id, previous)
+            self.concepts_database.put(concept_id, concept)
+            self._index_concept(concept_id, concept)
+            self._after_update(concept_id)
+    
+    def remove_concept(self, concept_id: str):
+        """حذف مفهوم من القاعدة والفهارس"""
+        with self._update_lock:
+            previous = self.concepts_database[concept_id]
+            self._ensure_mutable_index()
+            self._unindex_concept(concept_id, previous)
+            self.category_index.remove(concept_id)
+            self.concepts_database.delete(concept_id)
+            self._after_update(concept_id)
+    
+    def close(self):
+        """إغلاق مخزن المفاهيم ثم لقطة الفهرس؛ لا يُستخدم الشارح بعدها"""
+        self.concepts_database.close()
+        if self.index_snapshot is not None:
+            self.index_snapshot.close()
+    
+    def _get_bm25_ranker(self) -> BM25Ranker:
+        """محرك BM25 مبني من جميع المفاهيم عند أول استخدام"""
+        ranker = self._bm25_ranker
+        if ranker is None:
+            ranker = self._bm25_ranker = BM25Ranker(self.concepts_database.iter_concepts(), tokenizer=self._terms)
+        return ranker
+    
+    def _drop_removed(self, results: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+        """حذف المفاهيم المحذوفة من نتائج محرك سابق أثناء إعادة بنائه"""
+        return [(concept_id, score) for concept_id, score in results if concept_id in self.concepts_database]
+    
+    def search_concepts(self, query: str, mode: Optional[str] = None) -> List[str]:
         """البحث عن المفاهيم بناءً على الاستعلام"""
-        query_words = re.findall(r'\b\w+\b', query.lower())
+        return [concept_id for concept_id, score in self.search_concepts_scored(query, mode=mode)]
+    
+    def search_concepts_scored(self, query: str, top_k: int = 5,
+                               mode: Optional[str] = None) -> List[Tuple[str, float]]:
+        """البحث عن المفاهيم مع نقاط كل نتيجة"""
+        return self.score_terms(self._terms(query), top_k, mode)
+    
+    def score_terms(self, terms: List[str], top_k: int = 5,
+                    mode: Optional[str] = None) -> List[Tuple[str, float]]:
+        """ترتيب المفاهيم لكلمات موحدة مسبقاً (يستخدمها موجه النوايا)"""
+        mode = mode or self.ranking_mode
+        if mode == "bm25":
+            # يُفحص قبل أخذ المحرك: المحرك الجديد يُستبدل قبل إعلان اكتمال البناء
+            rebuilding = not self._bm25_ready.is_set()
+            results = self._get_bm25_ranker().top_k(terms, top_k)
+            return self._drop_removed(results) if rebuilding else results
+        if mode != "keyword":
+            raise ValueError(f"نمط ترتيب غير مدعوم: {mode}")
+        
+        return self._rank_keyword_scores(
+            [self._word_contributions(word) for word in terms], top_k
+        )
+    
+    def _word_contributions(self, word: str) -> List[Tuple[str, int]]:
+        """نقاط كلمة واحدة من الاستعلام لكل مفهوم بترتيب احتسابها"""
+        contributions = []
+        
+        # البحث المباشر
+        if word in self.search_keywords:
+            contributions.extend((concept_id, 3) for concept_id in self.search_keywords[word])
+        
+        # البحث الجزئي عبر فهرس n-gram
+        for keyword_id in self.substring_index.find_partial(word):
+            keyword = self.substring_index.keyword(keyword_id)
+            contributions.extend((concept_id, 1) for concept_id in self.search_keywords[keyword])
+        
+        return contributions
+    
+    @staticmethod
+    def _rank_keyword_scores(word_contributions: List[List[Tuple[str, int]]],
+                             top_k: int) -> List[Tuple[str, float]]:
         concept_scores = {}
+        for contributions in word_contributions:
+            for concept_id, points in contributions:
+                concept_scores[concept_id] = concept_scores.get(concept_id, 0) + points
         
-        for word in query_words:
-            # البحث المباشر
-            if word in self.search_keywords:
-                for concept_id in self.search_keywords[word]:
-                    concept_scores[concept_id] = concept_scores.get(concept_id, 0) + 3
-            
-            # البحث الجزئي
-            for keyword, concept_ids in self.search_keywords.items():
-                if word in keyword or keyword in word:
-                    for concept_id in concept_ids:
-                        concept_scores[concept_id] = concept_scores.get(concept_id, 0) + 1
+        # اختيار أفضل النتائج حسب النقاط دون ترتيب جميع المرشحين
+        return heapq.nlargest(top_k, concept_scores.items(), key=lambda x: x[1])
+    
+    def search_concepts_batch(self, queries: List[str], top_k: int = 5, mode: Optional[str] = None,
+                              processes: Optional[int] = None,
+                              min_parallel_batch: int = 5000) -> List[List[Tuple[str, float]]]:
+        """البحث عن مجموعة استعلامات دفعة واحدة (لإعادة تشغيل سجلات الاستعلامات)
+        
+        النتيجة لكل استعلام مطابقة لـ search_concepts_scored. الاستعلامات
+        والكلمات المكررة تُعالج مرة واحدة، ونمط bm25 يُحسب في مرور مصفوفي
+        واحد. عند تحديد processes تُوزع الدفعات الكبيرة على عمليات متعددة
+        (تتطلب منصة تدعم fork).
+        """
+        mode = mode or self.ranking_mode
+        if mode not in self.RANKING_MODES:
+            raise ValueError(f"نمط ترتيب غير مدعوم: {mode}")
+        
+        unique_queries = list(dict.fromkeys(queries))
+        if (processes and processes > 1 and len(unique_queries) >= min_parallel_batch
+                and "fork" in multiprocessing.get_all_start_methods()):
+            results = self._search_batch_parallel(unique_queries, top_k, mode, processes)
+        else:
+            results = self._search_batch(unique_queries, top_k, mode)
+        
+        by_query = dict(zip(unique_queries, results))
+        return [by_query[query] for query in queries]
+    
+    def _search_batch(self, queries: List[str], top_k: int, mode: str) -> List[List[Tuple[str, float]]]:
+        """بحث دفعة من الاستعلامات الفريدة في العملية الحالية"""
+        query_words = [self._terms(query) for query in queries]
+        if mode == "bm25":
+            rebuilding = not self._bm25_ready.is_set()
+            batch = self._get_bm25_ranker().top_k_batch(query_words, top_k)
+            return [self._drop_removed(results) for results in batch] if rebuilding else batch
+        
+        # نقاط كل كلمة فريدة تُحسب مرة واحدة للدفعة كاملة
+        contributions: Dict[str, List[Tuple[str, int]]] = {}
+        for words in query_words:
+            for word in words:
+                if word not in contributions:
+                    contributions[word] = self._word_contributions(word)
+        return [
+            self._rank_keyword_scores([contributions[word] for word in words], top_k)
+            for words in query_words
+        ]
+    
+    def _search_batch_parallel(self, queries: List[str], top_k: int, mode: str,
+                               processes: int) -> List[List[Tuple[str, float]]]:
+        """توزيع الدفعة على عمليات منسوخة (fork) تتشارك الفهارس المبنية"""
+        global _BATCH_EXPLAINER
+        if mode == "bm25":
+            # البناء قبل النسخ حتى لا تبنيه كل عملية
+            self._get_bm25_ranker()
+        chunk_size = -(-len(queries) // processes)
+        chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+        _BATCH_EXPLAINER = self
+        try:
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                chunk_results = pool.map(_search_batch_chunk, [(chunk, top_k, mode) for chunk in chunks])
+        finally:
+            _BATCH_EXPLAINER = None
+        return [result for results in chunk_results for result in results]
+    
+    def plan_query(self, query: str, mode: Optional[str] = None) -> QueryPlan:
+        """البحث عن المفاهيم مرة واحدة لكل رسالة مع البحث التقريبي عند عدم وجود نتائج
         
-        # ترتيب النتائج حسب النقاط
-        sorted_concepts = sorted(concept_scores.items(), key=lambda x: x[1], reverse=True)
-        return [concept_id for concept_id, score in sorted_concepts[:5]]
+        الخطط تُحفظ حسب الصيغة الموحدة للاستعلام، فالصيغ المختلفة لنفس
+        السؤال تشترك في نتيجة واحدة.
+        """
+        mode = mode or self.ranking_mode
+        key = self._phrase(query)
+        cached = self.query_cache.get((key, mode))
+        if cached is None:
+            generation = self.generation
+            concept_ids = tuple(self.search_concepts(query, mode=mode))
+            fuzzy = False
+            if not concept_ids:
+                # تصحيح الأخطاء الإملائية محلياً قبل اللجوء إلى OpenAI
+                concept_ids = tuple(self.fuzzy_search_concepts(query))
+                fuzzy = bool(concept_ids)
+            cached = (concept_ids, fuzzy)
+            self.put_if_current(self.query_cache, (key, mode), cached, generation)
+        return QueryPlan(query, key, *cached)
+    
+    def route_query(self, text: str) -> QueryPlan:
+        """خطة رسالة حرة عبر موجه النوايا: مفاهيم محلية واثقة أو لا شيء (سؤال عام)
+        
+        بخلاف plan_query تُحذف الكلمات الوظيفية ويُشترط حد أدنى للنقاط.
+        """
+        concept_ids, score, fuzzy = self.intent_router.route(text)
+        return QueryPlan(text, " ".join(self.intent_router.features(text)), concept_ids, fuzzy, score)
+    
+    def query_cache_info(self) -> Dict[str, int]:
+        """إحصائيات إصابة ذاكرة خطط الاستعلامات"""
+        return self.query_cache.stats()
+    
+    def invalidate_concept(self, concept_id: str):
+        """إبطال النصوص المعروضة المخزنة لمفهوم تغيرت بياناته
+        
+        نتائج البحث المخزنة قد تشير إلى المفهوم فتُمسح كلها.
+        """
+        with self._update_lock:
+            self.generation += 1
+            self.render_cache.invalidate(concept_id)
+            self.query_cache.clear()
+            self.intent_router.clear()
+    
+    def put_if_current(self, cache, key, value, generation: int):
+        """حفظ نتيجة في ذاكرة ما لم تتغير القاعدة منذ بدء حسابها (generation)
+        
+        القراءة والعرض يجريان دون القفل؛ الحفظ وحده يتسلسل مع الإبطال.
+        """
+        with self._update_lock:
+            if self.generation == generation:
+                cache.put(key, value)
+    
+    @staticmethod
+    def _fuzzy_budget(word: str) -> int:
+        """أقصى مسافة مسموحة حسب طول الكلمة حتى لا تطابق الكلمات القصيرة كل شيء"""
+        if len(word) < 4:
+            return 0
+        return 1 if len(word) < 7 else 2
+    
+    def fuzzy_search_concepts(self, query: str, max_distance: Optional[int] = None,
+                              limit: int = 5) -> List[str]:
+        """البحث التقريبي عن المفاهيم مع التسامح مع الأخطاء الإملائية
+        
+        يُستخدم عند فشل البحث العادي قبل اللجوء إلى OpenAI.
+        """
+        return self.fuzzy_search_terms(self._terms(query), max_distance, limit)
+    
+    def fuzzy_search_terms(self, terms: List[str], max_distance: Optional[int] = None,
+                           limit: int = 5) -> List[str]:
+        """البحث التقريبي لكلمات موحدة مسبقاً"""
+        if max_distance is None:
+            max_distance = self.fuzzy_index.max_distance
+        
+        words = list(terms)
+        if len(words) > 1:
+            # أسماء المفاهيم المركبة تُطابق كعبارة كاملة
+            words.insert(0, " ".join(words))
+        
+        best_distance: Dict[str, int] = {}
+        for word in words:
+            budget = min(max_distance, self._fuzzy_budget(word))
+            for term, distance in self.fuzzy_index.lookup(word, budget):
+                for concept_id in self.fuzzy_index.concepts_for(term):
+                    if distance < best_distance.get(concept_id, budget + 1):
+                        best_distance[concept_id] = distance
+        
+        ranked = sorted(best_distance, key=best_distance.get)
+        return ranked[:limit]
     
     def explain_concept(self, concept_id: str, detail_level: str = "medium") -> str:
         """شرح مفهوم إسلامي بمستوى تفصيل محدد"""
+        cache_key = (concept_id, "explain", detail_level)
+        cached = self.render_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        generation = self.generation
+        
         if concept_id not in self.concepts_database:
             return "المفهوم غير موجود في قاعدة البيانات."
         
-        concept = self.concepts_database[concept_id]
-        
-        explanation = f"🕌 **{concept.arabic_name}** ({concept.category.value})\n\n"
+        explanation = self._render_explanation(self.concepts_database[concept_id], detail_level)
+        self.put_if_current(self.render_cache, cache_key, explanation, generation)
+        return explanation
+    
+    def _render_explanation(self, concept: IslamicConcept, detail_level: str) -> str:
+        """بناء نص الشرح"""
+        parts = [f"🕌 **{concept.arabic_name}** ({concept.category.value})\n\n"]
         
         # التعريف الأساسي
-        explanation += f"📖 **التعريف:**\n{concept.definition}\n\n"
+        parts.append(f"📖 **التعريف:**\n{concept.definition}\n\n")
         
         if detail_level in ["medium", "detailed"]:
             # السياق الثقافي
-            explanation += f"🌍 **السياق الثقافي:**\n{concept.cultural_context}\n\n"
+            parts.append(f"🌍 **السياق الثقافي:**\n{concept.cultural_context}\n\n")
             
             # التطبيق العملي
-            explanation += f"⚡ **التطبيق العملي:**\n{concept.practical_application}\n\n"
+            parts.append(f"⚡ **التطبيق العملي:**\n{concept.practical_application}\n\n")
             
             # أمثلة
             if concept.examples:
-                explanation += f"📝 **أمثلة:**\n"
-                for example in concept.examples[:3]:
-                    explanation += f"• {example}\n"
-                explanation += "\n"
+                parts.append("📝 **أمثلة:**\n")
+                parts.extend(f"• {example}\n" for example in concept.examples[:3])
+                parts.append("\n")
         
         if detail_level == "detailed":
             # الخلفية التاريخية
-            explanation += f"📜 **الخلفية التاريخية:**\n{concept.historical_background}\n\n"
+            parts.append(f"📜 **الخلفية التاريخية:**\n{concept.historical_background}\n\n")
             
             # المفاهيم المترابطة
             if concept.related_concepts:
-                explanation += f"🔗 **مفاهيم مترابطة:**\n"
-                for related in concept.related_concepts[:5]:
-                    explanation += f"• {related}\n"
-                explanation += "\n"
+                parts.append("🔗 **مفاهيم مترابطة:**\n")
+                parts.extend(f"• {related}\n" for related in concept.related_concepts[:5])
+                parts.append("\n")
             
             # المفاهيم الخاطئة الشائعة
             if concept.common_misconceptions:
-                explanation += f"⚠️ **مفاهيم خاطئة شائعة:**\n"
-                for misconception in concept.common_misconceptions:
-                    explanation += f"• {misconception}\n"
-                explanation += "\n"
+                parts.append("⚠️ **مفاهيم خاطئة شائعة:**\n")
+                parts.extend(f"• {misconception}\n" for misconception in concept.common_misconceptions)
+                parts.append("\n")
             
             # المصادر
             if concept.sources:
-                explanation += f"📚 **المصادر:**\n"
-                for source in concept.sources:
-                    explanation += f"• {source}\n"
+                parts.append("📚 **المصادر:**\n")
+                parts.extend(f"• {source}\n" for source in concept.sources)
         
-        return explanation.strip()
+        return "".join(parts).strip()
     
     def get_interactive_menu(self, concept_id: str) -> str:
         """إنشاء قائمة تفاعلية لاستكشاف المفهوم"""
+        cache_key = (concept_id, "menu", None)
+        cached = self.render_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        generation = self.generation
+        
         if concept_id not in self.concepts_database:
             return "المفهوم غير موجود."
         
         concept = self.concepts_database[concept_id]
         
-        menu = f"🔍 **استكشاف مفهوم: {concept.arabic_name}**\n\n"
-        menu += "اختر ما تريد معرفته:\n\n"
-        menu += "1️⃣ التعريف الأساسي\n"
-        menu += "2️⃣ السياق الثقافي\n"
-        menu += "3️⃣ الخلفية التاريخية\n"
-        menu += "4️⃣ التطبيق العملي\n"
-        menu += "5️⃣ أمثلة من الواقع\n"
-        menu += "6️⃣ المفاهيم المترابطة\n"
-        menu += "7️⃣ المفاهيم الخاطئة الشائعة\n"
-        menu += "8️⃣ الشرح الكامل\n\n"
-        menu += "أرسل الرقم المطلوب أو اكتب سؤالك."
+        menu = (
+            f"🔍 **استكشاف مفهوم: {concept.arabic_name}**\n\n"
+            "اختر ما تريد معرفته:\n\n"
+            "1️⃣ التعريف الأساسي\n"
+            "2️⃣ السياق الثقافي\n"
+            "3️⃣ الخلفية التاريخية\n"
+            "4️⃣ التطبيق العملي\n"
+            "5️⃣ أمثلة من الواقع\n"
+            "6️⃣ المفاهيم المترابطة\n"
+            "7️⃣ المفاهيم الخاطئة الشائعة\n"
+            "8️⃣ الشرح الكامل\n\n"
+            "أرسل الرقم المطلوب أو اكتب سؤالك."
+        )
         
+        self.put_if_current(self.render_cache, cache_key, menu, generation)
         return menu
     
+    # عارض كل جانب من جوانب المفهوم؛ يُحسب الجانب المطلوب فقط
+    _ASPECT_RENDERERS = {
+        "1": lambda concept: f"📖 **التعريف:**\n{concept.definition}",
+        "2": lambda concept: f"🌍 **السياق الثقافي:**\n{concept.cultural_context}",
+        "3": lambda concept: f"📜 **الخلفية التاريخية:**\n{concept.historical_background}",
+        "4": lambda concept: f"⚡ **التطبيق العملي:**\n{concept.practical_application}",
+        "5": lambda concept: "📝 **أمثلة:**\n" + "\n".join(f"• {ex}" for ex in concept.examples),
+        "6": lambda concept: "🔗 **مفاهيم مترابطة:**\n" + "\n".join(f"• {rel}" for rel in concept.related_concepts),
+        "7": lambda concept: "⚠️ **مفاهيم خاطئة شائعة:**\n" + "\n".join(f"• {misc}" for misc in concept.common_misconceptions),
+    }
+    
     def get_concept_aspect(self, concept_id: str, aspect: str) -> str:
         """الحصول على جانب محدد من المفهوم"""
+        cache_key = (concept_id, "aspect", aspect)
+        cached = self.render_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        generation = self.generation
+        
         if concept_id not in self.concepts_database:
             return "المفهوم غير موجود."
         
-        concept = self.concepts_database[concept_id]
+        if aspect == "8":
+            # الشرح الكامل يشارك ذاكرة explain_concept
+            return self.explain_concept(concept_id, "detailed")
         
-        aspects = {
-            "1": f"📖 **التعريف:**\n{concept.definition}",
-            "2": f"🌍 **السياق الثقافي:**\n{concept.cultural_context}",
-            "3": f"📜 **الخلفية التاريخية:**\n{concept.historical_background}",
-            "4": f"⚡ **التطبيق العملي:**\n{concept.practical_application}",
-            "5": f"📝 **أمثلة:**\n" + "\n".join([f"• {ex}" for ex in concept.examples]),
-            "6": f"🔗 **مفاهيم مترابطة:**\n" + "\n".join([f"• {rel}" for rel in concept.related_concepts]),
-            "7": f"⚠️ **مفاهيم خاطئة شائعة:**\n" + "\n".join([f"• {misc}" for misc in concept.common_misconceptions]),
-            "8": self.explain_concept(concept_id, "detailed")
-        }
+        renderer = self._ASPECT_RENDERERS.get(aspect)
+        if renderer is None:
+            return "اختيار غير صحيح. يرجى اختيار رقم من 1 إلى 8."
         
-        return aspects.get(aspect, "اختيار غير صحيح. يرجى اختيار رقم من 1 إلى 8.")
+        content = renderer(self.concepts_database[concept_id])
+        self.put_if_current(self.render_cache, cache_key, content, generation)
+        return content
     
     def get_random_concept(self) -> str:
         """الحصول على مفهوم عشوائي للتعلم"""
-        import random
-        concept_id = random.choice(list(self.concepts_database.keys()))
+        concept_id = self.concepts_database.random_id()
+        if concept_id is None:
+            return "لا توجد مفاهيم في قاعدة البيانات."
         concept = self.concepts_database[concept_id]
         
         return f"💡 **مفهوم اليوم: {concept.arabic_name}**\n\n{concept.definition}\n\nهل تريد معرفة المزيد؟ اكتب 'شرح {concept.arabic_name}'"
     
     def get_category_concepts(self, category: ConceptCategory) -> List[str]:
         """الحصول على المفاهيم حسب التصنيف"""
-        concepts = []
-        for concept_id, concept in self.concepts_database.items():
-            if concept.category == category:
-                concepts.append(f"• {concept.arabic_name}")
-        return concepts
+        return [
+            f"• {self.concepts_database[concept_id].arabic_name}"
+            for concept_id in self.category_index.concept_ids(category)
+        ]
+    
+    def browse_category(self, category: ConceptCategory, cursor: Optional[str] = None,
+                        page_size: int = 10) -> CategoryPage:
+        """تصفح مفاهيم التصنيف على صفحات بمؤشر متابعة"""
+        return self.category_index.page(category, cursor, page_size)
+    
+    def find_category(self, text: str) -> Optional[ConceptCategory]:
+        """التعرف على التصنيف من اسمه العربي (مع "ال" أو بدونها) أو الإنجليزي"""
+        text = text.strip()
+        for category in ConceptCategory:
+            if text in (category.value, "ال" + category.value) or text.upper() == category.name:
+                return category
+        return None
+    
+    def _format_category_entry(self, concept_id: str) -> str:
+        concept = self.concepts_database[concept_id]
+        return f"• {concept.arabic_name} - {concept.definition[:40]}..."
+    
+    def get_categories_overview(self, preview_size: int = 3) -> str:
+        """نص التصنيفات المتاحة مع عينة من مفاهيم كل تصنيف"""
+        sections = ["📚 **تصنيفات المفاهيم الإسلامية**"]
+        
+        for category in self.category_index.categories():
+            page = self.browse_category(category, page_size=preview_size)
+            lines = [f"{CATEGORY_ICONS[category]} **{category.value}** ({page.total}):"]
+            lines.extend(self._format_category_entry(concept_id) for concept_id in page.concept_ids)
+            if page.next_cursor:
+                lines.append(f"➡️ المزيد: /categories {category.value}")
+            sections.append("\n".join(lines))
+        
+        sections.append("اكتب اسم أي مفهوم للحصول على شرح تفاعلي مفصل.")
+        return "\n\n".join(sections)
+    
+    def get_category_page(self, category: ConceptCategory, cursor: Optional[str] = None,
+                          page_size: int = 10) -> str:
+        """نص صفحة واحدة من مفاهيم التصنيف"""
+        page = self.browse_category(category, cursor, page_size)
+        if not page.concept_ids:
+            return f"لا توجد مفاهيم أخرى في تصنيف {category.value}."
+        
+        lines = [f"{CATEGORY_ICONS[category]} **{category.value}** ({page.total} مفهوم)", ""]
+        lines.extend(self._format_category_entry(concept_id) for concept_id in page.concept_ids)
+        if page.next_cursor:
+            lines.extend(["", f"➡️ الصفحة التالية: /categories {category.value} {page.next_cursor}"])
+        return "\n".join(lines)
     
     def suggest_related_concepts(self, current_concept_id: str) -> str:
         """اقتراح مفاهيم مترابطة"""
@@ -284,15 +784,21 @@ class IslamicContextExplainer:
         suggestions = []
         
         for related_name in concept.related_concepts[:3]:
-            # البحث عن المفهوم المترابط في قاعدة البيانات
-            for concept_id, other_concept in self.concepts_database.items():
-                if other_concept.arabic_name.lower() == related_name.lower():
-                    suggestions.append(f"• {related_name} - {other_concept.definition[:50]}...")
-                    break
+            # البحث عن المفهوم المترابط عبر فهرس الأسماء
+            related_id = self.concept_graph.resolve_name(related_name)
+            if related_id is not None:
+                other_concept = self.concepts_database[related_id]
+                suggestions.append(f"• {related_name} - {other_concept.definition[:50]}...")
             else:
                 suggestions.append(f"• {related_name}")
         
         if suggestions:
             return f"🔗 **مفاهيم قد تهمك:**\n\n" + "\n".join(suggestions)
         else:
-            return "لا توجد مفاهيم مترابطة متاحة حالياً."
\ No newline at end of file
+            return "لا توجد مفاهيم مترابطة متاحة حالياً."
+    
+    def recommend_concepts(self, concept_id: str, max_hops: int = 3, limit: int = 5) -> List[Tuple[str, int]]:
+        """توصيات "مفاهيم قد تعجبك": المفاهيم على بعد 1 إلى 3 قفزات مع عدد القفزات"""
+        if concept_id not in self.concepts_database:
+            return []
+        return self.concept_graph.recommendations(concept_id, max_hops)[:limit]
@@ -0,0 +1,109 @@
+"""
+ذاكرة مؤقتة محدودة الحجم بسياسة LRU
+تُستخدم لتخزين النصوص المعروضة للمفاهيم مع إمكانية إبطالها عند تغير المفهوم
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Set, Tuple
+
+
+class LRUCache:
+    """ذاكرة مؤقتة آمنة للخيوط تحذف الأقدم استخداماً عند امتلائها"""
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """قراءة قيمة وتحديث ترتيب استخدامها"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """تخزين قيمة وحذف الأقدم عند تجاوز الحد"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._on_evict(evicted_key)
+            self._on_put(key)
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """قراءة القيمة أو إنشاؤها وتخزينها عند غيابها"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._on_evict(key)
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._on_clear()
+
+    def stats(self) -> Dict[str, int]:
+        """إحصائيات الإصابة والإخفاق"""
+        return {"size": len(self._entries), "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses}
+
+    def _on_put(self, key: Hashable):
+        pass
+
+    def _on_evict(self, key: Hashable):
+        pass
+
+    def _on_clear(self):
+        pass
+
+
+class RenderCache(LRUCache):
+    """ذاكرة النصوص المعروضة بمفاتيح (معرف المفهوم، نوع العرض، المعامل)"""
+
+    def __init__(self, max_size: int = 512):
+        super().__init__(max_size)
+        # مفاتيح كل مفهوم لإبطالها معاً عند تغيره
+        self._keys_by_concept: Dict[str, Set[Tuple]] = {}
+
+    def _on_put(self, key: Tuple):
+        self._keys_by_concept.setdefault(key[0], set()).add(key)
+
+    def _on_evict(self, key: Tuple):
+        keys = self._keys_by_concept.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_concept[key[0]]
+
+    def _on_clear(self):
+        self._keys_by_concept.clear()
+
+    def invalidate(self, concept_id: str):
+        """حذف جميع النصوص المخزنة لمفهوم تغيرت بياناته"""
+        with self._lock:
+            for key in self._keys_by_concept.pop(concept_id, ()):
+                self._entries.pop(key, None)
@@ -6,6 +6,8 @@
 import os
 import sys
 import logging
+import signal
+import threading
 import time
 import re
 from typing import Optional, Dict, Any
@@ -14,8 +16,18 @@ from openai import OpenAI
 from datetime import datetime
 import json
 
-from islamic_context_explainer import IslamicContextExplainer, ConceptCategory
+from answer_cache import AnswerCache
+from islamic_context_explainer import IslamicContextExplainer, ConceptCategory, QueryPlan
+from concept_store import JSONLConceptStore, open_concept_store
+from index_snapshot import IndexSnapshot
+from outbound_queue import OutboundQueue, RateLimitedBot
+from run_poller import RunDeadlineExceeded, RunPoller
 from session_manager import SessionManager, SessionState
+from webhook_server import WebhookServer
+from streaming_reply import STREAM_PLACEHOLDER, StreamingReply
+from thread_pool import AssistantThreadPool
+from thread_store import ThreadStore
+from user_dispatcher import UserDispatcher
 
 # إعداد نظام السجلات
 logging.basicConfig(
@@ -37,16 +49,50 @@ class EnhancedIslamicBot:
         self.telegram_token = os.getenv('TELEGRAM_TOKEN')
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.assistant_id = os.getenv('ASSISTANT_ID')
+        # مسار مخزن المفاهيم الخارجي (اختياري): ملف JSONL أو SQLite
+        self.concepts_store_path = os.getenv('CONCEPTS_STORE_PATH')
+        # لقطة فهرس معدّة مسبقاً عبر index_snapshot.py (اختيارية)
+        self.index_snapshot_path = os.getenv('INDEX_SNAPSHOT_PATH')
+        # نمط ترتيب نتائج البحث: keyword (الافتراضي) أو bm25
+        self.search_ranking_mode = os.getenv('SEARCH_RANKING_MODE', 'keyword')
+        # أقصى مسافة تحرير للبحث التقريبي عن المفاهيم
+        self.fuzzy_max_distance = int(os.getenv('FUZZY_MAX_DISTANCE', '2'))
+        # فترة فحص تغير ملفات المخزن واللقطة بالثواني لإعادة التحميل (0 للتعطيل)
+        self.concepts_reload_interval = float(os.getenv('CONCEPTS_RELOAD_INTERVAL', '0'))
+        # مهلة إكمال الطلبات الجارية بالشارح السابق قبل إغلاق مخزنه ولقطته
+        self.concepts_close_delay = float(os.getenv('CONCEPTS_CLOSE_DELAY', '60'))
+        self._reload_lock = threading.Lock()
+        # عنوان webhook العام؛ عند تعيينه تُستقبل التحديثات عبر خادم HTTP محلي بدلاً من الاستطلاع
+        self.webhook_url = os.getenv('TELEGRAM_WEBHOOK_URL')
+        # عرض رد المساعد أثناء توليده بتعديل رسالة مؤقتة
+        self.openai_streaming = os.getenv('OPENAI_STREAMING', '0').lower() in ('1', 'true', 'yes')
+        # أقل فترة بين تعديلين للرسالة المتدفقة بالثواني
+        self.stream_edit_interval = float(os.getenv('STREAM_EDIT_INTERVAL', '1.0'))
+        # استطلاع التشغيلات: فترة أولى قصيرة ثم تراجع أسي حتى الحد، ومهلة لكل طلب
+        # وحد لعدد التشغيلات المتزامنة في العملية
+        self.run_poller = RunPoller(
+            initial_interval=float(os.getenv('OPENAI_POLL_INITIAL_INTERVAL', '0.2')),
+            max_interval=float(os.getenv('OPENAI_POLL_MAX_INTERVAL', '0.75')),
+            deadline=float(os.getenv('OPENAI_RUN_DEADLINE', '60')),
+            max_concurrent_runs=int(os.getenv('OPENAI_MAX_CONCURRENT_RUNS', '32'))
+        )
         
         # التحقق من وجود المتغيرات المطلوبة
         self._validate_environment()
         
         # تهيئة العملاء والمكونات
         try:
-            self.bot = telebot.TeleBot(self.telegram_token)
-            self.openai_client = OpenAI(api_key=self.openai_api_key)
-            self.islamic_explainer = IslamicContextExplainer()
+            self._create_clients()
+            self.islamic_explainer = self._create_explainer()
             self.session_manager = SessionManager()
+            # حذف الجلسات المنتهية دورياً (SESSION_SWEEP_INTERVAL=0 لتركه لـ /stats)
+            sweep_interval = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))
+            if sweep_interval > 0:
+                self.session_manager.start_sweeper(sweep_interval)
+            self.answer_cache = self._create_answer_cache()
+            self.thread_pool = self._create_thread_pool()
+            # ربط المستخدمين بـ threads OpenAI: ذاكرة محدودة أمام SQLite تبقى بعد إعادة التشغيل
+            self.active_threads = self._create_thread_store()
             logger.info("تم تهيئة جميع مكونات البوت بنجاح")
         except Exception as e:
             logger.error(f"خطأ في تهيئة البوت: {e}")
@@ -55,8 +101,8 @@ class EnhancedIslamicBot:
         # إعداد معالجات الرسائل
         self.setup_handlers()
         
-        # تخزين الجلسات النشطة مع OpenAI
-        self.active_threads: Dict[int, str] = {}
+        # إعادة تحميل المفاهيم دون إعادة التشغيل
+        self._setup_hot_reload()
         
         # إحصائيات الاستخدام
         self.usage_stats = {
@@ -84,44 +130,204 @@ class EnhancedIslamicBot:
             logger.error(error_msg)
             sys.exit(1)
     
-    def setup_handlers(self):
-        """إعداد معالجات الرسائل"""
-        
-        @self.bot.message_handler(commands=['start'])
-        def start_command(message):
-            self.handle_start(message)
+    def _create_explainer(self) -> IslamicContextExplainer:
+        """إنشاء شارح المفاهيم من المخزن الخارجي ولقطة الفهرس إن وُجدا"""
+        snapshot = None
+        if self.index_snapshot_path:
+            snapshot = IndexSnapshot(self.index_snapshot_path)
+            logger.info(f"تحميل لقطة الفهرس: {self.index_snapshot_path}")
         
-        @self.bot.message_handler(commands=['help'])
-        def help_command(message):
-            self.handle_help(message)
+        store = None
+        try:
+            if self.concepts_store_path:
+                cache_size = int(os.getenv('CONCEPTS_CACHE_SIZE', '1024'))
+                offsets = snapshot.concept_offsets() if snapshot else None
+                if offsets is not None and self.concepts_store_path.lower().endswith(('.jsonl', '.ndjson')):
+                    # مواضع السجلات مقروءة من اللقطة فلا حاجة لمسح الملف إلا ما أُلحق بعدها
+                    store = JSONLConceptStore(self.concepts_store_path, cache_size=cache_size, offsets=offsets,
+                                              offsets_size=snapshot.source_size)
+                    if store.size != snapshot.source_size:
+                        # تعديلات بعد الترجمة: فهرس اللقطة لا يعرفها فيُبنى من المخزن
+                        logger.warning("مخزن المفاهيم تغير بعد ترجمة لقطة الفهرس، يُعاد بناء الفهرس؛ أعد ترجمة اللقطة")
+                        snapshot.close()
+                        snapshot = None
+                else:
+                    store = open_concept_store(self.concepts_store_path, cache_size=cache_size)
+                logger.info(f"تحميل المفاهيم من المخزن: {self.concepts_store_path}")
+            
+            return IslamicContextExplainer(
+                store=store,
+                index_snapshot=snapshot,
+                ranking_mode=self.search_ranking_mode,
+                fuzzy_max_distance=self.fuzzy_max_distance
+            )
+        except Exception:
+            # إعادة تحميل فاشلة لا تترك الملفات مفتوحة
+            if store is not None:
+                store.close()
+            if snapshot is not None:
+                snapshot.close()
+            raise
+    
+    def _create_answer_cache(self) -> Optional[AnswerCache]:
+        """ذاكرة ردود المساعد الدائمة (ANSWER_CACHE_TTL=0 للتعطيل)"""
+        ttl = float(os.getenv('ANSWER_CACHE_TTL', '86400'))
+        if ttl <= 0:
+            return None
+        return AnswerCache(
+            os.getenv('ANSWER_CACHE_PATH', 'answer_cache.sqlite'),
+            ttl=ttl,
+            max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '10000')),
+            namespace=self.assistant_id
+        )
+    
+    def _create_thread_pool(self) -> Optional[AssistantThreadPool]:
+        """مجمع threads المساعد المنشأة مسبقاً (OPENAI_THREAD_POOL_SIZE=0 للتعطيل)"""
+        size = int(os.getenv('OPENAI_THREAD_POOL_SIZE', '8'))
+        if size <= 0:
+            return None
+        return AssistantThreadPool(size=size, refill_rate=float(os.getenv('OPENAI_THREAD_POOL_REFILL_RATE', '2')))
+    
+    def _create_thread_store(self) -> ThreadStore:
+        """مخزن روابط threads المشترك بين العمليات (THREAD_STORE_PATH)"""
+        return ThreadStore(
+            os.getenv('THREAD_STORE_PATH', 'threads.sqlite'),
+            max_entries=int(os.getenv('THREAD_STORE_MAX_ENTRIES', '10000')),
+            idle_ttl=float(os.getenv('THREAD_STORE_IDLE_TTL', str(30 * 86400))),
+            flush_interval=float(os.getenv('THREAD_STORE_FLUSH_INTERVAL', '1')),
+            revalidate_interval=float(os.getenv('THREAD_STORE_REVALIDATE_INTERVAL', '5'))
+        )
+    
+    def reload_concepts(self) -> bool:
+        """بناء شارح جديد من المخزن واللقطة الحاليين واستبداله دفعة واحدة
         
-        @self.bot.message_handler(commands=['islamic'])
-        def islamic_command(message):
-            self.handle_islamic_menu(message)
+        الطلبات الجارية تكمل بالشارح السابق والجلسات لا تتأثر.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            logger.info("إعادة تحميل المفاهيم جارية بالفعل")
+            return False
+        try:
+            started = time.perf_counter()
+            explainer = self._create_explainer()
+            previous, self.islamic_explainer = self.islamic_explainer, explainer
+            self._retire_explainer(previous)
+            logger.info(f"أعيد تحميل {len(explainer.concepts_database)} مفهوماً "
+                        f"في {time.perf_counter() - started:.2f} ثانية")
+            return True
+        except Exception as e:
+            logger.error(f"فشل إعادة تحميل المفاهيم، يستمر العمل بالنسخة السابقة: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
+    
+    def _retire_explainer(self, explainer: IslamicContextExplainer):
+        """إغلاق الشارح المستبدل بعد concepts_close_delay حتى تكمل الطلبات التي بدأت به"""
+        def close():
+            try:
+                explainer.close()
+            except Exception as e:
+                logger.error(f"تعذر إغلاق مخزن المفاهيم السابق: {e}")
         
-        @self.bot.message_handler(commands=['concept'])
-        def concept_command(message):
-            self.handle_concept_search(message)
+        timer = threading.Timer(self.concepts_close_delay, close)
+        timer.daemon = True
+        timer.start()
+    
+    def _setup_hot_reload(self):
+        """إعادة التحميل عند إشارة SIGHUP أو عند تغير ملفات المخزن واللقطة"""
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(
+                signal.SIGHUP,
+                lambda signum, frame: threading.Thread(target=self.reload_concepts, daemon=True).start()
+            )
         
-        @self.bot.message_handler(commands=['random'])
-        def random_command(message):
-            self.handle_random_concept(message)
+        watched = [path for path in (self.concepts_store_path, self.index_snapshot_path) if path]
+        if self.concepts_reload_interval > 0 and watched:
+            threading.Thread(target=self._watch_corpus, args=(watched,), daemon=True).start()
+    
+    def _corpus_version(self, paths: list) -> tuple:
+        versions = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                versions.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                versions.append(None)
+        return tuple(versions)
+    
+    def _watch_corpus(self, paths: list):
+        """فحص دوري لتغير الملفات؛ يُعاد التحميل بعد استقرارها فترة فحص كاملة"""
+        current = self._corpus_version(paths)
+        pending = None
+        while True:
+            time.sleep(self.concepts_reload_interval)
+            version = self._corpus_version(paths)
+            if version == current:
+                pending = None
+            elif version == pending:
+                # لم تتغير منذ الفحص السابق: الكتابة اكتملت
+                if self.reload_concepts():
+                    current = version
+                pending = None
+            else:
+                pending = version
+    
+    def _create_clients(self):
+        """إنشاء عميلي تيليجرام و OpenAI"""
+        # موزع حسب المستخدم بدلاً من مجمع خيوط telebot (DISPATCH_FAST_WORKERS=0 للتعطيل)
+        self.dispatcher = None
+        fast_workers = int(os.getenv('DISPATCH_FAST_WORKERS', '4'))
+        if fast_workers > 0:
+            self.dispatcher = UserDispatcher(
+                fast_workers=fast_workers,
+                slow_workers=int(os.getenv('DISPATCH_SLOW_WORKERS', '16'))
+            )
         
-        @self.bot.message_handler(commands=['categories'])
-        def categories_command(message):
-            self.handle_categories(message)
+        # المعالجات تُسلم التحديثات للموزع، وفي وضع webhook تعالجها خيوط الخادم مباشرة،
+        # فلا حاجة لمجمع خيوط telebot إلا دونهما
+        self.bot = telebot.TeleBot(self.telegram_token, threaded=not self.webhook_url and self.dispatcher is None)
+        self.openai_client = OpenAI(api_key=self.openai_api_key)
         
-        @self.bot.message_handler(commands=['stats'])
-        def stats_command(message):
-            self.handle_stats(message)
+        # الرسائل الصادرة عبر طابور يحترم حدود تيليجرام (OUTBOUND_GLOBAL_RATE=0 للتعطيل)
+        self.outbound_queue = None
+        global_rate = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+        if global_rate > 0:
+            self.outbound_queue = OutboundQueue(
+                self.bot,
+                global_rate=global_rate,
+                chat_rate=float(os.getenv('OUTBOUND_CHAT_RATE', '1')),
+                chat_burst=float(os.getenv('OUTBOUND_CHAT_BURST', '3')),
+                senders=int(os.getenv('OUTBOUND_SENDERS', '8'))
+            )
+            self.bot = RateLimitedBot(self.bot, self.outbound_queue)
+    
+    # الأوامر ومعالجاتها (يتشاركها التشغيل المتزامن وغير المتزامن)
+    COMMAND_HANDLERS = {
+        'start': 'handle_start',
+        'help': 'handle_help',
+        'islamic': 'handle_islamic_menu',
+        'concept': 'handle_concept_search',
+        'random': 'handle_random_concept',
+        'categories': 'handle_categories',
+        'stats': 'handle_stats',
+        'reset': 'handle_reset',
+    }
+    
+    def setup_handlers(self):
+        """إعداد معالجات الرسائل"""
+        for command, handler_name in self.COMMAND_HANDLERS.items():
+            self.bot.message_handler(commands=[command])(self._dispatched(getattr(self, handler_name)))
         
-        @self.bot.message_handler(commands=['reset'])
-        def reset_command(message):
-            self.handle_reset(message)
+        self.bot.message_handler(func=lambda message: True)(self._dispatched(self.handle_message))
+    
+    def _dispatched(self, handler):
+        """تسليم الرسالة لموزع المستخدمين بدلاً من معالجتها في خيط الاستقبال"""
+        if self.dispatcher is None:
+            return handler
         
-        @self.bot.message_handler(func=lambda message: True)
-        def handle_all_messages(message):
-            self.handle_message(message)
+        def dispatch(message):
+            self.dispatcher.submit(message.from_user.id, handler, message)
+        dispatch.__name__ = handler.__name__
+        return dispatch
     
     def handle_start(self, message):
         """معالجة أمر /start"""
@@ -235,29 +441,28 @@ class EnhancedIslamicBot:
             logger.error(f"خطأ في إرسال المفهوم العشوائي: {e}")
     
     def handle_categories(self, message):
-        """معالجة أمر /categories لعرض التصنيفات"""
-        categories_text = """
-📚 **تصنيفات المفاهيم الإسلامية**
-
-🕌 **العبادات:**
-• الصلاة - الركن الثاني من الإسلام
-• الحج - الركن الخامس والرحلة الروحية
-
-🕊️ **العقائد:**
-• التوحيد - أساس العقيدة الإسلامية
-
-⚖️ **الفقه:**
-• الجهاد - المفهوم الشامل للجهد في سبيل الله
-
-❤️ **الأخلاق:**
-• الإحسان - أعلى مراتب الدين
-
-اكتب اسم أي مفهوم للحصول على شرح تفاعلي مفصل.
+        """معالجة أمر /categories لعرض التصنيفات
+        
+        /categories - نظرة عامة على جميع التصنيفات
+        /categories [تصنيف] [مؤشر] - تصفح تصنيف واحد على صفحات
         """
         try:
-            self.bot.reply_to(message, categories_text.strip())
+            args = message.text.split()[1:]
+            category = self.islamic_explainer.find_category(args[0]) if args else None
+            
+            if args and category is None:
+                categories_text = "تصنيف غير معروف. أرسل /categories لعرض التصنيفات المتاحة."
+            elif category is not None:
+                cursor = args[1] if len(args) > 1 else None
+                categories_text = self.islamic_explainer.get_category_page(category, cursor)
+            else:
+                categories_text = self.islamic_explainer.get_categories_overview()
+            
+            self.bot.reply_to(message, categories_text)
             session = self.session_manager.get_session(message.from_user.id)
             session.add_to_history("command", "/categories")
+        except ValueError:
+            self.bot.reply_to(message, "مؤشر الصفحة غير صالح. أرسل /categories للبدء من جديد.")
         except Exception as e:
             logger.error(f"خطأ في إرسال التصنيفات: {e}")
     
@@ -305,6 +510,14 @@ class EnhancedIslamicBot:
         try:
             uptime = datetime.now() - self.usage_stats['start_time']
             session_stats = self.session_manager.get_session_stats()
+            query_cache = self.islamic_explainer.query_cache_info()
+            router = self.islamic_explainer.intent_router.stats()
+            runs = self.run_poller.stats()
+            answers = self.answer_cache.stats() if self.answer_cache is not None else None
+            outbound = self.outbound_queue.stats() if self.outbound_queue is not None else None
+            dispatch = self.dispatcher.stats() if self.dispatcher is not None else None
+            threads_pool = self.thread_pool.stats() if self.thread_pool is not None else None
+            threads_store = self.active_threads.stats()
             
             stats_text = f"""
 📊 **إحصائيات البوت الإسلامي**
@@ -320,6 +533,23 @@ class EnhancedIslamicBot:
 • الجلسات النشطة: {session_stats['total_active']}
 • متوسط طول المحادثة: {session_stats['average_history_length']:.1f}
 
+🔎 **ذاكرة البحث:**
+{self._router_stats_line(router)}
+• خطط /concept: الإصابات {query_cache['hits']} | الإخفاقات {query_cache['misses']}
+{self._answer_cache_stats_line(answers)}
+{self._thread_pool_stats_line(threads_pool)}
+{self._thread_store_stats_line(threads_store)}
+
+🤖 **تشغيلات المساعد:**
+• المكتملة: {runs['runs']} | انتهت مهلتها: {runs['timeouts']}
+• تأخر اكتشاف الاكتمال: p50 {runs['detection_p50_ms']:.0f}ms | p99 {runs['detection_p99_ms']:.0f}ms
+
+📤 **الإرسال:**
+{self._outbound_stats_line(outbound)}
+
+🧵 **المعالجة:**
+{self._dispatch_stats_line(dispatch)}
+
 ⏰ **معلومات التشغيل:**
 • مدة التشغيل: {str(uptime).split('.')[0]}
 • حالة النظام: ✅ يعمل بشكل طبيعي
@@ -335,6 +565,48 @@ class EnhancedIslamicBot:
             logger.error(f"خطأ في إرسال الإحصائيات: {e}")
             self.bot.reply_to(message, "حدث خطأ في عرض الإحصائيات")
     
+    @staticmethod
+    def _answer_cache_stats_line(answers: Optional[Dict[str, int]]) -> str:
+        if answers is None:
+            return "• ذاكرة الردود: معطلة"
+        return (f"• ذاكرة الردود: {answers['size']} رد | الإصابات: {answers['hits']}"
+                f" | الإخفاقات: {answers['misses']}")
+    
+    @staticmethod
+    def _thread_pool_stats_line(threads_pool: Optional[Dict[str, int]]) -> str:
+        if threads_pool is None:
+            return "• threads المنشأة مسبقاً: معطلة"
+        return (f"• threads المنشأة مسبقاً: {threads_pool['ready']} جاهزة | الإصابات: {threads_pool['hits']}"
+                f" | الإخفاقات: {threads_pool['misses']}")
+    
+    @staticmethod
+    def _thread_store_stats_line(threads_store: Dict[str, int]) -> str:
+        return (f"• روابط threads في الذاكرة: {threads_store['size']} | من القاعدة: {threads_store['loads']}"
+                f" | كتابات معلقة: {threads_store['pending_writes']}")
+    
+    @staticmethod
+    def _router_stats_line(router: Dict[str, Dict[str, int]]) -> str:
+        decisions, features = router['decisions'], router['features']
+        return (f"• قرارات موجه النوايا: الإصابات {decisions['hits']} | الإخفاقات {decisions['misses']}"
+                f" | الخصائص: {features['hits']}/{features['hits'] + features['misses']}")
+    
+    @staticmethod
+    def _outbound_stats_line(outbound: Optional[Dict[str, int]]) -> str:
+        if outbound is None:
+            return "• الرسائل الصادرة: دون طابور"
+        return (f"• الرسائل الصادرة: {outbound['sent']} | المعلقة: {outbound['pending']}"
+                f" | أُعيدت بعد 429: {outbound['retried']} | إشعارات مدمجة: {outbound['coalesced']}")
+    
+    @staticmethod
+    def _dispatch_stats_line(dispatch: Optional[Dict[str, float]]) -> str:
+        if dispatch is None:
+            return "• الموزع: مجمع خيوط telebot"
+        return (f"• المعلقة: {dispatch['pending']} | مستخدمون نشطون: {dispatch['active_users']}\n"
+                f"• انتظار المسار السريع: p50 {dispatch['fast_wait_p50_ms']:.0f}ms"
+                f" | p99 {dispatch['fast_wait_p99_ms']:.0f}ms\n"
+                f"• انتظار مسار OpenAI: p50 {dispatch['slow_wait_p50_ms']:.0f}ms"
+                f" | p99 {dispatch['slow_wait_p99_ms']:.0f}ms")
+    
     def handle_reset(self, message):
         """معالجة أمر /reset"""
         try:
@@ -344,8 +616,7 @@ class EnhancedIslamicBot:
             self.session_manager.clear_session(user_id)
             
             # إعادة تعيين thread OpenAI
-            if user_id in self.active_threads:
-                del self.active_threads[user_id]
+            del self.active_threads[user_id]
             
             self.bot.reply_to(message, "✅ تم إعادة تعيين المحادثة بنجاح! يمكنك البدء من جديد.")
             logger.info(f"تم إعادة تعيين المحادثة للمستخدم {user_id}")
@@ -372,32 +643,35 @@ class EnhancedIslamicBot:
             # فحص حالة الجلسة
             if session.state == SessionState.EXPLORING_CONCEPT:
                 self._handle_concept_interaction(message, session)
-            elif self._is_islamic_concept_query(user_text):
-                self._handle_islamic_concept_query(message, user_text)
+                return
+            
+            # توجيه محلي سريع وبحث واحد للرسالة يتشاركه التوجيه والرد
+            plan = self.islamic_explainer.route_query(user_text)
+            if plan.is_concept_query:
+                self._handle_islamic_concept_query(message, user_text, plan)
             else:
                 # الاستعانة بـ OpenAI للردود العامة
-                self._handle_openai_query(message, session)
+                self._query_openai(message, session)
                 
         except Exception as e:
             logger.error(f"خطأ في معالجة الرسالة من المستخدم {user_id}: {e}")
             self.bot.reply_to(message, "حدث خطأ تقني. يرجى المحاولة لاحقاً.")
             self.usage_stats['errors'] += 1
     
-    def _is_islamic_concept_query(self, text: str) -> bool:
-        """فحص ما إذا كان النص استفساراً عن مفهوم إسلامي"""
-        # البحث عن المفاهيم المتاحة
-        search_results = self.islamic_explainer.search_concepts(text)
-        return len(search_results) > 0
-    
-    def _handle_islamic_concept_query(self, message, query: str):
-        """معالجة استفسار عن مفهوم إسلامي"""
+    def _handle_islamic_concept_query(self, message, query: str, plan: Optional[QueryPlan] = None):
+        """معالجة استفسار عن مفهوم إسلامي
+        
+        تُمرر خطة الاستعلام المحسوبة عند التوجيه لتجنب تكرار البحث.
+        """
         try:
-            search_results = self.islamic_explainer.search_concepts(query)
+            if plan is None:
+                plan = self.islamic_explainer.plan_query(query)
+            search_results = list(plan.concept_ids)
             session = self.session_manager.get_session(message.from_user.id)
             
             if not search_results:
                 # لا توجد نتائج - الاستعانة بـ OpenAI
-                self._handle_openai_query(message, session)
+                self._query_openai(message, session)
                 return
             
             # عرض النتيجة الأولى
@@ -483,19 +757,38 @@ class EnhancedIslamicBot:
             
             self.bot.reply_to(message, "يرجى اختيار رقم صحيح من القائمة.")
     
+    def _query_openai(self, message, session):
+        """استفسار OpenAI في المسار البطيء للموزع بعد إنهاء الجزء المحلي من المعالجة"""
+        if self.dispatcher is None:
+            self._handle_openai_query(message, session)
+        else:
+            self.dispatcher.continue_slow(self._handle_openai_query, message, session)
+    
     def _handle_openai_query(self, message, session):
         """معالجة الاستفسارات العامة باستخدام OpenAI"""
         try:
             user_id = message.from_user.id
             
+            # الأسئلة المتكررة تُجاب من الذاكرة دون تشغيل المساعد
+            cached = self._cached_answer(message.text)
+            if cached is not None:
+                self.bot.reply_to(message, cached)
+                self._record_cached_answer(session, user_id)
+                thread_id = self.active_threads.get(user_id)
+                if thread_id is not None:
+                    # إبقاء السؤال والرد في thread المستخدم لأسئلة المتابعة
+                    self._remember_exchange(thread_id, message.text, cached)
+                return
+            
             # إنشاء أو استخدام thread موجود
-            if user_id not in self.active_threads:
-                thread = self.openai_client.beta.threads.create()
-                self.active_threads[user_id] = thread.id
+            thread_id = self.active_threads.get(user_id)
+            # الرد في thread بلا أدوار سابقة وحده يصلح لذاكرة الردود المشتركة
+            fresh_thread = thread_id is None
+            if fresh_thread:
+                thread_id = self._new_thread_id()
+                self.active_threads[user_id] = thread_id
                 logger.info(f"thread جديد تم إنشاؤه للمستخدم {user_id}")
             
-            thread_id = self.active_threads[user_id]
-            
             # إضافة رسالة المستخدم
             self.openai_client.beta.threads.messages.create(
                 thread_id=thread_id,
@@ -503,31 +796,26 @@ class EnhancedIslamicBot:
                 content=message.text
             )
             
-            # تشغيل المساعد
-            run = self.openai_client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id
-            )
-            
-            # انتظار اكتمال التشغيل
-            max_attempts = 30
-            for _ in range(max_attempts):
-                run_status = self.openai_client.beta.threads.runs.retrieve(
+            with self.run_poller.slot():
+                if self.openai_streaming:
+                    self._stream_openai_reply(message, session, thread_id, fresh_thread)
+                    return
+                
+                # تشغيل المساعد
+                run = self.openai_client.beta.threads.runs.create(
                     thread_id=thread_id,
-                    run_id=run.id
+                    assistant_id=self.assistant_id
                 )
                 
-                if run_status.status == 'completed':
-                    break
-                elif run_status.status in ['failed', 'cancelled', 'expired']:
-                    logger.error(f"فشل في تشغيل المساعد: {run_status.status}")
-                    self.bot.reply_to(message, "حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.")
-                    return
-                
-                time.sleep(1)
-            else:
-                logger.error("انتهت مهلة انتظار رد المساعد")
-                self.bot.reply_to(message, "الطلب يستغرق وقتاً أطول من المعتاد. يرجى المحاولة مرة أخرى.")
+                # انتظار اكتمال التشغيل بتراجع أسي حتى المهلة
+                run_status = self.run_poller.wait(
+                    lambda: self.openai_client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id),
+                    lambda: self.openai_client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                )
+            
+            if run_status.status != 'completed':
+                logger.error(f"فشل في تشغيل المساعد: {run_status.status}")
+                self.bot.reply_to(message, "حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.")
                 return
             
             # الحصول على الرد
@@ -537,29 +825,157 @@ class EnhancedIslamicBot:
                 limit=1
             )
             
-            if messages.data:
-                assistant_message = messages.data[0]
-                if hasattr(assistant_message.content[0], 'text'):
-                    response_text = assistant_message.content[0].text.value
-                    self.bot.reply_to(message, response_text)
-                    
-                    session.add_to_history("bot_response", "openai_response")
-                    self.usage_stats['openai_queries'] += 1
-                    self.usage_stats['successful_responses'] += 1
-                    logger.info(f"رد OpenAI ناجح للمستخدم {user_id}")
-                    return
+            response_text = self._assistant_reply_text(messages)
+            if response_text is not None:
+                self.bot.reply_to(message, response_text)
+                self._record_openai_success(session, user_id)
+                self._cache_answer(message.text, response_text, fresh_thread)
+                return
             
             self.bot.reply_to(message, "لم أتمكن من الحصول على رد مناسب. يرجى إعادة صياغة سؤالك.")
             
+        except RunDeadlineExceeded as e:
+            logger.error(f"انتهت مهلة انتظار رد المساعد: {e}")
+            self.bot.reply_to(message, "الطلب يستغرق وقتاً أطول من المعتاد. يرجى المحاولة مرة أخرى.")
         except Exception as e:
             logger.error(f"خطأ في معالجة استفسار OpenAI: {e}")
             self.bot.reply_to(message, "حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.")
             self.usage_stats['errors'] += 1
     
+    def _new_thread_id(self) -> str:
+        """thread من المجمع المنشأ مسبقاً، أو إنشاؤه الآن إن كان فارغاً"""
+        thread_id = self.thread_pool.acquire() if self.thread_pool is not None else None
+        if thread_id is None:
+            thread_id = self.openai_client.beta.threads.create().id
+        return thread_id
+    
+    def _stream_openai_reply(self, message, session, thread_id: str, fresh_thread: bool):
+        """تشغيل المساعد متدفقاً وتعديل رسالة مؤقتة بالنص المتراكم"""
+        chat_id = message.chat.id
+        reply = StreamingReply(min_interval=self.stream_edit_interval)
+        message_id = self.bot.reply_to(message, STREAM_PLACEHOLDER).message_id
+        
+        def apply(actions):
+            nonlocal message_id
+            for action, text in actions:
+                if action == "edit":
+                    self.bot.edit_message_text(text, chat_id, message_id)
+                else:
+                    message_id = self.bot.send_message(chat_id, text).message_id
+        
+        try:
+            with self.openai_client.beta.threads.runs.stream(
+                thread_id=thread_id,
+                assistant_id=self.assistant_id
+            ) as stream:
+                for delta in stream.text_deltas:
+                    apply(reply.feed(delta))
+                run = stream.get_final_run()
+            apply(reply.finish())
+        except Exception as e:
+            logger.error(f"خطأ في الرد المتدفق: {e}")
+            self.bot.edit_message_text("حدث خطأ في معالجة طلبك. يرجى المحاولة مرة أخرى.", chat_id, message_id)
+            self.usage_stats['errors'] += 1
+            return
+        
+        if run.status != 'completed' or not reply.text.strip():
+            logger.error(f"فشل في تشغيل المساعد: {run.status}")
+            self.bot.edit_message_text(self._stream_failure_text(reply), chat_id, message_id)
+            return
+        self._record_openai_success(session, message.from_user.id)
+        self._cache_answer(message.text, reply.text, fresh_thread)
+    
+    @staticmethod
+    def _stream_failure_text(reply: StreamingReply) -> str:
+        if reply.text.strip():
+            # الإبقاء على ما وصل في الرسالة الحالية مع التنبيه إلى انقطاعه
+            notice = "\n\n⚠️ انقطع الرد قبل اكتماله. يرجى المحاولة مرة أخرى."
+            return (reply.current_text[:reply.max_length - len(notice)] + notice).strip()
+        return "لم أتمكن من الحصول على رد مناسب. يرجى إعادة صياغة سؤالك."
+    
+    @staticmethod
+    def _assistant_reply_text(messages) -> Optional[str]:
+        """نص آخر رسالة للمساعد إن كانت نصية"""
+        if messages.data:
+            assistant_message = messages.data[0]
+            if hasattr(assistant_message.content[0], 'text'):
+                return assistant_message.content[0].text.value
+        return None
+    
+    def _record_openai_success(self, session, user_id: int):
+        session.add_to_history("bot_response", "openai_response")
+        self.usage_stats['openai_queries'] += 1
+        self.usage_stats['successful_responses'] += 1
+        logger.info(f"رد OpenAI ناجح للمستخدم {user_id}")
+    
+    def _cache_answer(self, question: str, answer: str, fresh_thread: bool):
+        """حفظ الرد لغير صاحبه فقط إن وُلد في thread جديد
+        
+        الرد في thread له أدوار سابقة قد يعتمد على ما ذكره المستخدم عن نفسه.
+        """
+        if self.answer_cache is not None and fresh_thread:
+            self.answer_cache.put(question, answer)
+    
+    def _cached_answer(self, question: str) -> Optional[str]:
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.get(question)
+    
+    def _record_cached_answer(self, session, user_id: int):
+        session.add_to_history("bot_response", "cached_answer")
+        self.usage_stats['successful_responses'] += 1
+        logger.info(f"رد من ذاكرة الردود للمستخدم {user_id}")
+    
+    def _remember_exchange(self, thread_id: str, question: str, answer: str):
+        """إضافة سؤال ورد من الذاكرة إلى thread المستخدم دون تشغيل المساعد"""
+        try:
+            for role, content in (("user", question), ("assistant", answer)):
+                self.openai_client.beta.threads.messages.create(thread_id=thread_id, role=role, content=content)
+        except Exception as e:
+            logger.error(f"تعذر إضافة الرد المحفوظ إلى thread: {e}")
+    
+    def _create_webhook_server(self) -> WebhookServer:
+        """خادم webhook يمرر التحديثات إلى معالجات telebot"""
+        def process_update(update: Dict[str, Any]):
+            self.bot.process_new_updates([telebot.types.Update.de_json(update)])
+        
+        return WebhookServer(
+            process_update,
+            secret_token=os.getenv('WEBHOOK_SECRET_TOKEN'),
+            host=os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+            port=int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8443'))),
+            path=os.getenv('WEBHOOK_PATH', '/webhook'),
+            # مع الموزع يكفي خيط واحد يسلم التحديثات بترتيب وصولها
+            workers=int(os.getenv('WEBHOOK_WORKERS', '8' if self.dispatcher is None else '1')),
+            queue_size=int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+        )
+    
+    def run_webhook(self):
+        """استقبال التحديثات عبر webhook حتى الإيقاف"""
+        self.webhook_server = self._create_webhook_server()
+        self.webhook_server.start()
+        self.bot.set_webhook(
+            url=self.webhook_url,
+            secret_token=self.webhook_server.secret_token,
+            max_connections=int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+        )
+        logger.info(f"استقبال التحديثات عبر webhook على المنفذ {self.webhook_server.port}")
+        try:
+            threading.Event().wait()
+        finally:
+            self.webhook_server.stop()
+    
     def run(self):
         """تشغيل البوت"""
         logger.info("🚀 بدء تشغيل البوت الإسلامي المحسن...")
+        if self.thread_pool is not None:
+            self.thread_pool.start(self.openai_client.beta.threads.create)
         try:
+            if self.webhook_url:
+                self.run_webhook()
+                return
+            # الاستطلاع لا يعمل ما دام webhook سابق مسجلاً
+            self.bot.remove_webhook()
             self.bot.infinity_polling(
                 timeout=10,
                 long_polling_timeout=5,
@@ -571,11 +987,25 @@ class EnhancedIslamicBot:
         except Exception as e:
             logger.error(f"خطأ في تشغيل البوت: {e}")
             sys.exit(1)
+        finally:
+            if self.dispatcher is not None:
+                self.dispatcher.close()
+            if self.outbound_queue is not None:
+                self.outbound_queue.close()
+            if self.thread_pool is not None:
+                self.thread_pool.close()
+            self.active_threads.close()
+            self.session_manager.stop_sweeper()
 
 def main():
     """الدالة الرئيسية"""
     try:
-        bot = EnhancedIslamicBot()
+        # BOT_RUNTIME=async لتشغيل asyncio (AsyncTeleBot و AsyncOpenAI)
+        if os.getenv('BOT_RUNTIME', 'sync') == 'async':
+            from async_bot import AsyncIslamicBot
+            bot = AsyncIslamicBot()
+        else:
+            bot = EnhancedIslamicBot()
         bot.run()
     except Exception as e:
         logger.error(f"خطأ في الدالة الرئيسية: {e}")
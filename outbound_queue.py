@@ -0,0 +1,421 @@
+"""
+طابور الرسائل الصادرة إلى تيليجرام
+يحترم حدود تيليجرام (نحو 30 رسالة في الثانية للبوت ونحو رسالة في الثانية لكل
+محادثة) بدلاً من استدعاء reply_to و send_message مباشرة من المعالجات:
+- دلو رموز عام ودلو لكل محادثة
+- أولوية للردود التفاعلية على التعديلات والإرسال الجماعي، مع الحفاظ على ترتيب
+  الرسائل داخل المحادثة الواحدة
+- دمج إشعارات الكتابة المكررة لنفس المحادثة
+- إعادة المحاولة تلقائياً بعد retry_after عند رد 429 بدلاً من إظهار خطأ للمستخدم
+وللتشغيل غير المتزامن (AsyncTeleBot) AsyncRateLimiter بنفس الحدود وإعادة
+المحاولة ودمج إشعارات الكتابة، دون طابور أولويات (كل معالج يرسل بالترتيب).
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# الأولويات: الأصغر يُرسل أولاً
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """مدة الانتظار من خطأ 429 لتيليجرام (ApiTelegramException)، أو None لغيره"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result = getattr(error, "result_json", None) or {}
+    return float(result.get("parameters", {}).get("retry_after", 1))
+
+
+def _action_key(action: str, kwargs: dict) -> Hashable:
+    """مفتاح دمج إشعار الكتابة: النوع ومعاملاته (مثل message_thread_id)"""
+    return (action, tuple(sorted(kwargs.items()))) if kwargs else action
+
+
+class TokenBucket:
+    """دلو رموز: rate رمزاً في الثانية بحد أقصى capacity"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """الزمن حتى توفر رمز"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Outgoing:
+    """طلب صادر واحد ونتيجته"""
+
+    __slots__ = ("priority", "seq", "method", "args", "kwargs", "future", "attempts", "action")
+
+    def __init__(self, priority: int, seq: int, method: str, args: tuple, kwargs: dict,
+                 action: Optional[Hashable] = None):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.attempts = 0
+        self.action = action
+
+
+class _ChatState:
+    """الطلبات المعلقة لمحادثة ودلوها"""
+
+    __slots__ = ("items", "bucket", "blocked_until", "in_flight", "pending_actions", "last_action")
+
+    def __init__(self, bucket: TokenBucket):
+        self.items: Deque[_Outgoing] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.in_flight = False
+        # إشعار الكتابة المعلق لكل نوع، وآخر إشعار أُرسل (النوع، الزمن)
+        self.pending_actions: Dict[Hashable, _Outgoing] = {}
+        self.last_action: Optional[Tuple[Hashable, float]] = None
+
+
+class OutboundQueue:
+    """جدولة الطلبات الصادرة حسب الأولوية وحدود المعدل"""
+
+    def __init__(self, bot, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 senders: int = 8, max_retries: int = 5, chat_action_ttl: float = 4.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """bot: كائن TeleBot (أو بديل له) تُستدعى عليه الطرق المرسلة
+        chat_action_ttl: إشعار الكتابة يبقى ظاهراً نحو 5 ثوانٍ فلا يُعاد قبل هذه المدة
+        """
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.chat_action_ttl = chat_action_ttl
+        self.clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._chats: Dict[Any, _ChatState] = {}
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="outbound")
+        self.counters = {"sent": 0, "failed": 0, "retried": 0, "coalesced": 0}
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="outbound-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _chat(self, chat_id) -> _ChatState:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatState(TokenBucket(self.chat_rate, self.chat_burst, self.clock()))
+        return chat
+
+    def submit(self, method: str, chat_id, *args, priority: int = NORMAL, **kwargs) -> Future:
+        """إضافة طلب (اسم طريقة TeleBot ومعاملاتها) وإرجاع Future بنتيجته"""
+        item = _Outgoing(priority, next(self._seq), method, args, kwargs)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("طابور الرسائل الصادرة مغلق")
+            self._chat(chat_id).items.append(item)
+            self._condition.notify()
+        return item.future
+
+    def send_chat_action(self, chat_id, action: str, **kwargs) -> Future:
+        """إشعار كتابة مع دمج المكرر منه (نفس النوع والمعاملات)"""
+        key = _action_key(action, kwargs)
+        with self._condition:
+            chat = self._chat(chat_id)
+            pending = chat.pending_actions.get(key)
+            recent = (chat.last_action is not None and chat.last_action[0] == key
+                      and self.clock() - chat.last_action[1] < self.chat_action_ttl)
+            if pending is not None or recent:
+                self.counters["coalesced"] += 1
+                if pending is not None:
+                    return pending.future
+                future: Future = Future()
+                future.set_result(True)
+                return future
+
+            item = _Outgoing(INTERACTIVE, next(self._seq), "send_chat_action", (chat_id, action), kwargs,
+                             action=key)
+            chat.pending_actions[key] = item
+            chat.items.append(item)
+            self._condition.notify()
+        return item.future
+
+    def _next_chat(self, now: float) -> Tuple[Optional[Any], float]:
+        """المحادثة الجاهزة ذات الطلب الأعلى أولوية، أو زمن أقرب محادثة ستجهز"""
+        best_id, best_key = None, None
+        next_ready = float("inf")
+        idle = []
+        for chat_id, chat in self._chats.items():
+            if chat.in_flight:
+                continue
+            if not chat.items:
+                if (chat.bucket.is_full(now) and not chat.pending_actions
+                        and (chat.last_action is None or now - chat.last_action[1] >= self.chat_action_ttl)):
+                    idle.append(chat_id)
+                continue
+            ready = max(chat.blocked_until, now + chat.bucket.wait_time(now))
+            if ready > now:
+                next_ready = min(next_ready, ready)
+                continue
+            head = chat.items[0]
+            key = (head.priority, head.seq)
+            if best_key is None or key < best_key:
+                best_id, best_key = chat_id, key
+        # حالة المحادثات الخاملة لا تلزم فتبقى الذاكرة محدودة
+        for chat_id in idle:
+            del self._chats[chat_id]
+        return best_id, next_ready
+
+    def _dispatch_loop(self):
+        with self._condition:
+            while not self._closed:
+                now = self.clock()
+                chat_id, next_ready = self._next_chat(now)
+                if chat_id is None:
+                    self._condition.wait(None if next_ready == float("inf") else next_ready - now)
+                    continue
+                global_wait = self._global.wait_time(now)
+                if global_wait > 0:
+                    self._condition.wait(global_wait)
+                    continue
+
+                chat = self._chats[chat_id]
+                self._global.take(now)
+                chat.bucket.take(now)
+                chat.in_flight = True
+                self._executor.submit(self._send, chat_id, chat, chat.items.popleft())
+
+    def _send(self, chat_id, chat: _ChatState, item: _Outgoing):
+        item.attempts += 1
+        try:
+            result = getattr(self.bot, item.method)(*item.args, **item.kwargs)
+        except Exception as e:
+            wait = retry_after(e)
+            with self._condition:
+                if wait is not None and item.attempts <= self.max_retries:
+                    # يُعاد في رأس طابور المحادثة فيبقى الترتيب محفوظاً
+                    chat.items.appendleft(item)
+                    chat.blocked_until = self.clock() + wait
+                    self.counters["retried"] += 1
+                    logger.warning(f"حد معدل تيليجرام للمحادثة {chat_id}: إعادة بعد {wait} ثانية")
+                else:
+                    self.counters["failed"] += 1
+                    self._finish(chat, item)
+                    item.future.set_exception(e)
+                chat.in_flight = False
+                self._condition.notify()
+            return
+
+        with self._condition:
+            self.counters["sent"] += 1
+            if item.action is not None:
+                chat.last_action = (item.action, self.clock())
+            self._finish(chat, item)
+            chat.in_flight = False
+            self._condition.notify()
+        item.future.set_result(result)
+
+    @staticmethod
+    def _finish(chat: _ChatState, item: _Outgoing):
+        if item.action is not None and chat.pending_actions.get(item.action) is item:
+            del chat.pending_actions[item.action]
+
+    def pending(self) -> int:
+        with self._condition:
+            return sum(len(chat.items) for chat in self._chats.values())
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            stats = dict(self.counters)
+            stats["pending"] = sum(len(chat.items) for chat in self._chats.values())
+            stats["chats"] = len(self._chats)
+        return stats
+
+    def close(self, timeout: float = 10.0):
+        """إرسال ما تبقى ثم إيقاف الخيوط"""
+        deadline = self.clock() + timeout
+        while self.pending() and self.clock() < deadline:
+            time.sleep(0.05)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+
+class RateLimitedBot:
+    """واجهة TeleBot للمعالجات تمر طلبات الإرسال فيها عبر OutboundQueue
+
+    reply_to و send_message و edit_message_text تنتظر الإرسال وتعيد نتيجته
+    (الرد المتدفق يحتاج معرف الرسالة)، وإشعار الكتابة لا ينتظر.
+    باقي الطرق (تسجيل المعالجات، الاستطلاع، webhook) تُمرر إلى البوت مباشرة.
+    """
+
+    def __init__(self, bot, queue: OutboundQueue, timeout: float = 120.0):
+        self.bot = bot
+        self.queue = queue
+        self.timeout = timeout
+
+    def reply_to(self, message, text: str, **kwargs):
+        return self.queue.submit("reply_to", message.chat.id, message, text,
+                                 priority=INTERACTIVE, **kwargs).result(self.timeout)
+
+    def send_message(self, chat_id, text: str, priority: int = NORMAL, **kwargs):
+        return self.queue.submit("send_message", chat_id, chat_id, text,
+                                 priority=priority, **kwargs).result(self.timeout)
+
+    def edit_message_text(self, text: str, chat_id, message_id, **kwargs):
+        return self.queue.submit("edit_message_text", chat_id, text, chat_id, message_id,
+                                 priority=NORMAL, **kwargs).result(self.timeout)
+
+    def send_chat_action(self, chat_id, action: str, **kwargs):
+        self.queue.send_chat_action(chat_id, action, **kwargs)
+        return True
+
+    def __getattr__(self, name: str):
+        return getattr(self.bot, name)
+
+
+class AsyncRateLimiter:
+    """حدود المعدل وإعادة المحاولة بعد 429 لطلبات AsyncTeleBot
+
+    الطلبات لنفس المحادثة تُرسل واحداً تلو الآخر بترتيب وصولها.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 max_retries: int = 5, chat_action_ttl: float = 4.0, max_idle_chats: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.chat_action_ttl = chat_action_ttl
+        self.max_idle_chats = max_idle_chats
+        self.clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        # المحادثة -> (دلوها، قفل ترتيب إرسالها)
+        self._chats: Dict[Any, Tuple[TokenBucket, asyncio.Lock]] = {}
+        self._last_action: Dict[Any, Tuple[Hashable, float]] = {}
+        self._waiting = 0
+        self.counters = {"sent": 0, "failed": 0, "retried": 0, "coalesced": 0}
+
+    def _chat(self, chat_id) -> Tuple[TokenBucket, asyncio.Lock]:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= self.max_idle_chats:
+                self._prune()
+            chat = self._chats[chat_id] = (TokenBucket(self.chat_rate, self.chat_burst, self.clock()),
+                                           asyncio.Lock())
+        return chat
+
+    def _prune(self):
+        """حذف المحادثات الخاملة (دلو ممتلئ ولا إرسال جارٍ) لتبقى الذاكرة محدودة"""
+        now = self.clock()
+        for chat_id in [chat_id for chat_id, (bucket, lock) in self._chats.items()
+                        if not lock.locked() and bucket.is_full(now)]:
+            del self._chats[chat_id]
+            self._last_action.pop(chat_id, None)
+
+    async def _acquire(self, bucket: TokenBucket):
+        while True:
+            now = self.clock()
+            wait = max(self._global.wait_time(now), bucket.wait_time(now))
+            if wait <= 0:
+                self._global.take(now)
+                bucket.take(now)
+                return
+            await asyncio.sleep(wait)
+
+    async def call(self, chat_id, send: Callable[[], Awaitable[Any]]) -> Any:
+        """تنفيذ send ضمن حدود المحادثة والحد العام مع إعادتها بعد retry_after"""
+        bucket, lock = self._chat(chat_id)
+        self._waiting += 1
+        try:
+            async with lock:
+                attempts = 0
+                while True:
+                    await self._acquire(bucket)
+                    attempts += 1
+                    try:
+                        result = await send()
+                    except Exception as e:
+                        wait = retry_after(e)
+                        if wait is None or attempts > self.max_retries:
+                            self.counters["failed"] += 1
+                            raise
+                        self.counters["retried"] += 1
+                        logger.warning(f"حد معدل تيليجرام للمحادثة {chat_id}: إعادة بعد {wait} ثانية")
+                        await asyncio.sleep(wait)
+                        continue
+                    self.counters["sent"] += 1
+                    return result
+        finally:
+            self._waiting -= 1
+
+    async def send_chat_action(self, chat_id, action: str, send: Callable[[], Awaitable[Any]],
+                               **kwargs) -> Any:
+        """إشعار كتابة لا يُعاد ما دام السابق المماثل ظاهراً"""
+        key = _action_key(action, kwargs)
+        last = self._last_action.get(chat_id)
+        if last is not None and last[0] == key and self.clock() - last[1] < self.chat_action_ttl:
+            self.counters["coalesced"] += 1
+            return True
+        self._last_action[chat_id] = (key, self.clock())
+        return await self.call(chat_id, send)
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self.counters)
+        stats["pending"] = self._waiting
+        stats["chats"] = len(self._chats)
+        return stats
+
+
+class AsyncRateLimitedBot:
+    """واجهة AsyncTeleBot تمر طلبات الإرسال فيها عبر AsyncRateLimiter
+
+    باقي الطرق (تسجيل المعالجات، الاستطلاع، إغلاق الجلسة) تُمرر إلى البوت مباشرة.
+    """
+
+    def __init__(self, bot, limiter: AsyncRateLimiter):
+        self.bot = bot
+        self.limiter = limiter
+
+    async def reply_to(self, message, text: str, **kwargs):
+        return await self.limiter.call(message.chat.id, lambda: self.bot.reply_to(message, text, **kwargs))
+
+    async def send_message(self, chat_id, text: str, **kwargs):
+        return await self.limiter.call(chat_id, lambda: self.bot.send_message(chat_id, text, **kwargs))
+
+    async def edit_message_text(self, text: str, chat_id, message_id, **kwargs):
+        return await self.limiter.call(
+            chat_id, lambda: self.bot.edit_message_text(text, chat_id, message_id, **kwargs))
+
+    async def send_chat_action(self, chat_id, action: str, **kwargs):
+        return await self.limiter.send_chat_action(
+            chat_id, action, lambda: self.bot.send_chat_action(chat_id, action, **kwargs), **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self.bot, name)
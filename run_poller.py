@@ -0,0 +1,189 @@
+"""
+جدولة استطلاع تشغيلات المساعد
+بديل الحلقة الثابتة (ثانية × 30 محاولة) عندما لا يُستخدم التدفق: فترة أولى قصيرة
+ثم تراجع أسي مع تشويش عشوائي حتى لا تتزامن الاستطلاعات، ومهلة لكل طلب يُلغى
+بعدها التشغيل عبر runs.cancel، وأول استطلاع عند أسرع التشغيلات الأخيرة، وحد على مستوى العملية لعدد التشغيلات المتزامنة،
+وإحصاءات p50/p99 لتأخر اكتشاف الاكتمال.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# حالات التشغيل النهائية
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled", "expired", "incomplete"})
+
+
+class RunDeadlineExceeded(Exception):
+    """انتهت مهلة الطلب قبل اكتمال التشغيل أو قبل توفر مكان لبدئه"""
+
+
+def percentile(values, fraction: float) -> float:
+    """القيمة عند النسبة المطلوبة من قيم مرتبة (أقرب رتبة)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+class RunPoller:
+    """استطلاع تشغيلات المساعد بتراجع أسي ومهلة وحد للتزامن"""
+
+    def __init__(self, initial_interval: float = 0.2, max_interval: float = 0.75, multiplier: float = 1.6,
+                 jitter: float = 0.25, deadline: float = 60.0, max_concurrent_runs: int = 32,
+                 first_poll_quantile: float = 0.01, history_size: int = 1024, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Any] = time.sleep, rng: Callable[[], float] = random.random):
+        """jitter: نسبة التشويش حول كل فترة (0.25 = ±25%)
+        first_poll_quantile: أول استطلاع ينتظر هذا المئين من أزمنة التشغيلات الأخيرة (0 للتعطيل)
+        """
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.max_concurrent_runs = max_concurrent_runs
+        self.first_poll_quantile = first_poll_quantile
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self._semaphore = threading.BoundedSemaphore(max_concurrent_runs)
+        # يُنشأ عند أول استخدام داخل حلقة asyncio
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        # أقصى تأخر ممكن لاكتشاف الاكتمال: الزمن منذ آخر استطلاع رأى التشغيل جارياً
+        self._detection_delays = deque(maxlen=history_size)
+        # أزمنة اكتمال التشغيلات الأخيرة مقدرة بمنتصف آخر فترة استطلاع، فلا يدفع
+        # تأخير أول استطلاع هذه الأزمنة إلى الأعلى
+        self._durations = deque(maxlen=history_size)
+        self.counters = {"runs": 0, "polls": 0, "timeouts": 0, "cancelled": 0, "slot_timeouts": 0}
+
+    # أقل عدد من التشغيلات المكتملة قبل تأخير أول استطلاع
+    MIN_DURATION_SAMPLES = 20
+
+    def first_poll_delay(self) -> float:
+        """الانتظار قبل أول استطلاع: لا فائدة من الاستطلاع قبل أسرع التشغيلات المعتادة"""
+        if not self.first_poll_quantile or len(self._durations) < self.MIN_DURATION_SAMPLES:
+            return 0.0
+        with self._lock:
+            durations = list(self._durations)
+        return min(percentile(durations, self.first_poll_quantile), self.deadline)
+
+    def intervals(self) -> Iterator[float]:
+        """فترات الانتظار المتتالية بين الاستطلاعات"""
+        interval = self.initial_interval
+        while True:
+            # التشويش لا يتجاوز الحد الأقصى للفترة
+            yield min(self.max_interval, max(0.0, interval * (1 + self.jitter * (2 * self.rng() - 1))))
+            interval = min(self.max_interval, interval * self.multiplier)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _record_detection(self, delay: float, duration: float, polls: int):
+        with self._lock:
+            self.counters["runs"] += 1
+            self.counters["polls"] += polls
+            self._detection_delays.append(delay)
+            self._durations.append(duration)
+
+    @contextmanager
+    def slot(self):
+        """مكان لتشغيل واحد ضمن حد التشغيلات المتزامنة في العملية"""
+        if not self._semaphore.acquire(timeout=self.deadline):
+            self._count("slot_timeouts")
+            raise RunDeadlineExceeded("لا يوجد مكان لتشغيل جديد")
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot_async(self):
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrent_runs)
+        try:
+            await asyncio.wait_for(self._async_semaphore.acquire(), self.deadline)
+        except asyncio.TimeoutError:
+            self._count("slot_timeouts")
+            raise RunDeadlineExceeded("لا يوجد مكان لتشغيل جديد")
+        try:
+            yield
+        finally:
+            self._async_semaphore.release()
+
+    def wait(self, retrieve: Callable[[], Any], cancel: Callable[[], Any]) -> Any:
+        """استطلاع التشغيل حتى حالة نهائية وإرجاعه
+
+        عند انتهاء المهلة يُلغى التشغيل وتُرفع RunDeadlineExceeded.
+        """
+        started = self.clock()
+        last_running = started
+        polls = 0
+        self.sleep(self.first_poll_delay())
+        for interval in self.intervals():
+            run = retrieve()
+            polls += 1
+            now = self.clock()
+            if run.status in TERMINAL_STATUSES:
+                self._record_detection(now - last_running, (last_running + now) / 2 - started, polls)
+                return run
+            last_running = now
+
+            remaining = started + self.deadline - now
+            if remaining <= 0:
+                self._count("polls", polls)
+                self._cancel(cancel)
+                raise RunDeadlineExceeded(f"التشغيل لم يكتمل خلال {self.deadline} ثانية")
+            self.sleep(min(interval, remaining))
+
+    async def wait_async(self, retrieve: Callable[[], Awaitable[Any]],
+                         cancel: Callable[[], Awaitable[Any]]) -> Any:
+        started = self.clock()
+        last_running = started
+        polls = 0
+        await asyncio.sleep(self.first_poll_delay())
+        for interval in self.intervals():
+            run = await retrieve()
+            polls += 1
+            now = self.clock()
+            if run.status in TERMINAL_STATUSES:
+                self._record_detection(now - last_running, (last_running + now) / 2 - started, polls)
+                return run
+            last_running = now
+
+            remaining = started + self.deadline - now
+            if remaining <= 0:
+                self._count("polls", polls)
+                try:
+                    await cancel()
+                    self._count("cancelled")
+                except Exception as e:
+                    logger.error(f"تعذر إلغاء التشغيل بعد انتهاء المهلة: {e}")
+                self._count("timeouts")
+                raise RunDeadlineExceeded(f"التشغيل لم يكتمل خلال {self.deadline} ثانية")
+            await asyncio.sleep(min(interval, remaining))
+
+    def _cancel(self, cancel: Callable[[], Any]):
+        try:
+            cancel()
+            self._count("cancelled")
+        except Exception as e:
+            logger.error(f"تعذر إلغاء التشغيل بعد انتهاء المهلة: {e}")
+        self._count("timeouts")
+
+    def stats(self) -> Dict[str, float]:
+        """العدادات وp50/p99 لتأخر اكتشاف الاكتمال بالمللي ثانية"""
+        with self._lock:
+            delays = list(self._detection_delays)
+            stats: Dict[str, float] = dict(self.counters)
+        stats["detection_p50_ms"] = percentile(delays, 0.50) * 1000
+        stats["detection_p99_ms"] = percentile(delays, 0.99) * 1000
+        return stats
@@ -0,0 +1,114 @@
+"""
+فهرس البحث الجزئي للكلمات المفتاحية
+فهرس n-gram يجيب عن استعلامات "الكلمة جزء من المفتاح" و"المفتاح جزء من الكلمة"
+دون المرور على جميع الكلمات المفتاحية
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class SubstringIndex:
+    """فهرس n-gram للمطابقة الجزئية بين كلمات الاستعلام والكلمات المفتاحية"""
+
+    def __init__(self, ngram_size: int = 3):
+        self.ngram_size = ngram_size
+        # معرف رقمي لكل كلمة مفتاحية بترتيب الإضافة
+        self._keyword_ids: Dict[str, int] = {}
+        self._keywords: List[str] = []
+        # قوائم الورود: المقطع -> معرفات الكلمات المفتاحية التي تحتويه
+        self._postings: Dict[str, Set[int]] = {}
+        self._max_keyword_length = 0
+
+    def __len__(self) -> int:
+        return len(self._keyword_ids)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._keyword_ids
+
+    def _grams(self, text: str, size: int) -> Set[str]:
+        """المقاطع الفريدة ذات الطول المحدد"""
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def add_keyword(self, keyword: str) -> int:
+        """إضافة كلمة مفتاحية للفهرس وإرجاع معرفها"""
+        if keyword in self._keyword_ids:
+            return self._keyword_ids[keyword]
+
+        keyword_id = len(self._keywords)
+        self._keyword_ids[keyword] = keyword_id
+        self._keywords.append(keyword)
+        self._max_keyword_length = max(self._max_keyword_length, len(keyword))
+
+        # فهرسة جميع المقاطع حتى الطول n حتى تُخدم الكلمات القصيرة مباشرة
+        for size in range(1, self.ngram_size + 1):
+            for gram in self._grams(keyword, size):
+                self._postings.setdefault(gram, set()).add(keyword_id)
+
+        return keyword_id
+
+    def keyword(self, keyword_id: int) -> str:
+        """الكلمة المفتاحية المقابلة للمعرف"""
+        return self._keywords[keyword_id]
+
+    def keywords(self) -> List[str]:
+        """جميع الكلمات المفتاحية بترتيب معرفاتها"""
+        return list(self._keywords)
+
+    @property
+    def max_keyword_length(self) -> int:
+        return self._max_keyword_length
+
+    def iter_postings(self) -> Iterator[Tuple[str, List[int]]]:
+        """المرور على المقاطع وقوائم ورودها مرتبة (لكتابة اللقطات)"""
+        for gram in sorted(self._postings):
+            yield gram, sorted(self._postings[gram])
+
+    def _posting(self, gram: str) -> Iterable[int]:
+        """قائمة ورود مقطع واحد"""
+        return self._postings.get(gram, ())
+
+    def _keyword_id(self, keyword: str) -> Optional[int]:
+        """معرف الكلمة المفتاحية إن وجدت"""
+        return self._keyword_ids.get(keyword)
+
+    def _keywords_containing(self, word: str) -> Set[int]:
+        """الكلمات المفتاحية التي تحتوي الكلمة"""
+        if len(word) <= self.ngram_size:
+            # المقطع القصير مفهرس بذاته فقائمة وروده هي الجواب الدقيق
+            return set(self._posting(word))
+
+        postings = []
+        for gram in self._grams(word, self.ngram_size):
+            posting = self._posting(gram)
+            if not len(posting):
+                return set()
+            postings.append(posting)
+
+        # التقاطع بدءاً من أقصر قائمة ثم التحقق من المرشحين
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return candidates
+
+        return {kid for kid in candidates if word in self.keyword(kid)}
+
+    def _keywords_contained_in(self, word: str) -> Set[int]:
+        """الكلمات المفتاحية التي هي جزء من الكلمة"""
+        found = set()
+        max_length = min(len(word), self.max_keyword_length)
+        for start in range(len(word)):
+            for end in range(start + 1, min(len(word), start + max_length) + 1):
+                keyword_id = self._keyword_id(word[start:end])
+                if keyword_id is not None:
+                    found.add(keyword_id)
+        return found
+
+    def find_partial(self, word: str) -> List[int]:
+        """معرفات الكلمات المفتاحية المطابقة جزئياً مرتبة حسب ترتيب الإضافة"""
+        if not word:
+            return list(range(len(self)))
+
+        matches = self._keywords_containing(word) | self._keywords_contained_in(word)
+        return sorted(matches)
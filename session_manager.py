@@ -1,12 +1,17 @@
 """
 مدير الجلسات التفاعلية للبوت
 إدارة حالة المحادثات والتفاعلات المخصصة
+انتهاء الجلسات عبر كومة صغرى لمواعيد الانتهاء بدلاً من المرور على كل الجلسات،
+وإحصاءات الحالات تُحدّث عند تغيرها فلا يمر /stats على الجلسات
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from enum import Enum
+import heapq
+import itertools
 import json
+import threading
 
 class SessionState(Enum):
     """حالات الجلسة"""
@@ -20,7 +25,9 @@ class UserSession:
     
     def __init__(self, user_id: int):
         self.user_id = user_id
-        self.state = SessionState.NORMAL
+        # مدير الجلسات الذي يتابع تغير الحالة وطول التاريخ لإحصاءاته
+        self._observer: Optional["SessionManager"] = None
+        self._state = SessionState.NORMAL
         self.context = {}
         self.last_activity = datetime.now()
         self.conversation_history = []
@@ -30,6 +37,16 @@ class UserSession:
             "learning_pace": "normal"
         }
     
+    @property
+    def state(self) -> SessionState:
+        return self._state
+    
+    @state.setter
+    def state(self, state: SessionState):
+        if self._observer is not None:
+            self._observer._state_changed(self._state, state)
+        self._state = state
+    
     def update_activity(self):
         """تحديث وقت آخر نشاط"""
         self.last_activity = datetime.now()
@@ -51,6 +68,7 @@ class UserSession:
     
     def add_to_history(self, message_type: str, content: str):
         """إضافة رسالة للتاريخ"""
+        length = len(self.conversation_history)
         self.conversation_history.append({
             "timestamp": datetime.now().isoformat(),
             "type": message_type,
@@ -59,6 +77,8 @@ class UserSession:
         # الاحتفاظ بآخر 50 رسالة فقط
         if len(self.conversation_history) > 50:
             self.conversation_history = self.conversation_history[-50:]
+        if self._observer is not None:
+            self._observer._history_changed(len(self.conversation_history) - length)
     
     def is_expired(self, timeout_minutes: int = 30) -> bool:
         """فحص انتهاء صلاحية الجلسة"""
@@ -70,32 +90,105 @@ class SessionManager:
     def __init__(self):
         self.sessions: Dict[int, UserSession] = {}
         self.session_timeout = 30  # دقيقة
+        # (موعد الانتهاء، ترتيب، الجلسة): الموعد يُتحقق منه عند خروجه من الكومة،
+        # فالجلسة التي نشطت بعد إضافتها تُعاد بموعدها الجديد بدلاً من تحديث الكومة عند كل رسالة
+        self._expiry: List[Tuple[datetime, int, UserSession]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+        self._states_count: Dict[str, int] = {}
+        self._history_total = 0
+        self.expired_total = 0
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
     
     def get_session(self, user_id: int) -> UserSession:
         """الحصول على جلسة المستخدم أو إنشاء جديدة"""
-        if user_id not in self.sessions:
-            self.sessions[user_id] = UserSession(user_id)
-        elif self.sessions[user_id].is_expired(self.session_timeout):
-            # إنشاء جلسة جديدة للجلسات المنتهية الصلاحية
-            self.sessions[user_id] = UserSession(user_id)
+        with self._lock:
+            session = self.sessions.get(user_id)
+            if session is not None and session.is_expired(self.session_timeout):
+                # إنشاء جلسة جديدة للجلسات المنتهية الصلاحية
+                self._remove(session)
+                session = None
+            if session is None:
+                session = self._add(UserSession(user_id))
         
-        self.sessions[user_id].update_activity()
-        return self.sessions[user_id]
+        session.update_activity()
+        return session
+    
+    def _add(self, session: UserSession) -> UserSession:
+        self.sessions[session.user_id] = session
+        session._observer = self
+        self._state_changed(None, session.state)
+        self._history_total += len(session.conversation_history)
+        self._schedule(session)
+        return session
+    
+    def _remove(self, session: UserSession):
+        del self.sessions[session.user_id]
+        session._observer = None
+        self._state_changed(session.state, None)
+        self._history_total -= len(session.conversation_history)
+    
+    def _schedule(self, session: UserSession):
+        deadline = session.last_activity + timedelta(minutes=self.session_timeout)
+        heapq.heappush(self._expiry, (deadline, next(self._sequence), session))
+    
+    def _state_changed(self, old: Optional[SessionState], new: Optional[SessionState]):
+        with self._lock:
+            if old is not None:
+                self._states_count[old.value] -= 1
+            if new is not None:
+                self._states_count[new.value] = self._states_count.get(new.value, 0) + 1
+    
+    def _history_changed(self, delta: int):
+        with self._lock:
+            self._history_total += delta
     
     def clear_session(self, user_id: int):
         """مسح جلسة المستخدم"""
         if user_id in self.sessions:
             self.sessions[user_id].clear_context()
     
-    def cleanup_expired_sessions(self):
-        """تنظيف الجلسات المنتهية الصلاحية"""
-        expired_users = []
-        for user_id, session in self.sessions.items():
-            if session.is_expired(self.session_timeout):
-                expired_users.append(user_id)
+    def cleanup_expired_sessions(self) -> int:
+        """حذف الجلسات المنتهية الصلاحية وإرجاع عددها
         
-        for user_id in expired_users:
-            del self.sessions[user_id]
+        لا يمر إلا على مواعيد الانتهاء التي حلّت؛ الجلسة التي نشطت بعد موعدها
+        المسجل تُعاد إلى الكومة بموعدها الجديد.
+        """
+        now = datetime.now()
+        timeout = timedelta(minutes=self.session_timeout)
+        expired = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] < now:
+                _, _, session = heapq.heappop(self._expiry)
+                if self.sessions.get(session.user_id) is not session:
+                    # جلسة حُذفت أو استُبدلت بعد إضافتها
+                    continue
+                if now - session.last_activity > timeout:
+                    self._remove(session)
+                    expired += 1
+                else:
+                    self._schedule(session)
+            self.expired_total += expired
+        return expired
+    
+    def start_sweeper(self, interval: float = 60.0):
+        """حذف الجلسات المنتهية دورياً في خيط خلفي بدلاً من انتظار /stats"""
+        if self._sweeper is not None:
+            return
+        self._stop_sweeper.clear()
+        self._sweeper = threading.Thread(target=self._sweep, args=(interval,), name="session-sweeper", daemon=True)
+        self._sweeper.start()
+    
+    def _sweep(self, interval: float):
+        while not self._stop_sweeper.wait(interval):
+            self.cleanup_expired_sessions()
+    
+    def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._stop_sweeper.set()
+            self._sweeper.join()
+            self._sweeper = None
     
     def get_active_sessions_count(self) -> int:
         """عدد الجلسات النشطة"""
@@ -106,13 +199,13 @@ class SessionManager:
         """إحصائيات الجلسات"""
         self.cleanup_expired_sessions()
         
-        states_count = {}
-        for session in self.sessions.values():
-            state = session.state.value
-            states_count[state] = states_count.get(state, 0) + 1
+        with self._lock:
+            states_count = {state: count for state, count in self._states_count.items() if count}
+            total = len(self.sessions)
+            history_total = self._history_total
         
         return {
-            "total_active": len(self.sessions),
+            "total_active": total,
             "states_distribution": states_count,
-            "average_history_length": sum(len(s.conversation_history) for s in self.sessions.values()) / max(1, len(self.sessions))
+            "average_history_length": history_total / max(1, total)
         }
\ No newline at end of file
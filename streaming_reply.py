@@ -0,0 +1,93 @@
+"""
+عرض رد المساعد أثناء توليده
+يجمع أجزاء النص المتدفقة من تشغيل المساعد ويقرر متى تُعدّل رسالة تيليجرام:
+تعديل فوري لأول جزء ثم تعديل واحد على الأكثر كل فترة محددة (حدود تيليجرام
+نحو رسالة في الثانية لكل محادثة)، وتقسيم الرد الطويل على عدة رسائل.
+لا يرسل شيئاً بنفسه فيستخدمه التشغيل المتزامن وغير المتزامن بنفس الطريقة.
+"""
+
+import time
+from typing import Callable, List, Optional, Tuple
+
+# نص الرسالة المؤقتة قبل وصول أول جزء من الرد
+STREAM_PLACEHOLDER = "⏳ جارٍ كتابة الرد..."
+
+# أقصى طول لرسالة تيليجرام
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+# إجراء على تيليجرام: ("edit", النص) لتعديل الرسالة الحالية أو ("send", النص) لرسالة جديدة
+StreamAction = Tuple[str, str]
+
+
+class StreamingReply:
+    """حالة رد متدفق واحد وقرارات تعديله"""
+
+    # علامة تُلحق بالنص ما دام التوليد جارياً
+    CURSOR = " ▌"
+
+    def __init__(self, min_interval: float = 1.0, max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH,
+                 clock: Callable[[], float] = time.monotonic):
+        """min_interval: أقل فترة بين تعديلين بالثواني"""
+        self.min_interval = min_interval
+        self.max_length = max_length
+        self.clock = clock
+        # النص الكامل المستلم حتى الآن
+        self.text = ""
+        # نص الرسالة الحالية (ما بعد الرسائل المكتملة)
+        self._current = ""
+        # آخر نص معروض في الرسالة الحالية
+        self._shown = STREAM_PLACEHOLDER
+        # الرسالة الحالية موجودة (الرسالة المؤقتة أولاً) أم يجب إرسال رسالة جديدة
+        self._message_open = True
+        self._last_edit: Optional[float] = None
+        self.edits = 0
+
+    @property
+    def current_text(self) -> str:
+        """نص الرسالة الحالية"""
+        return self._current.rstrip()
+
+    def _show(self, text: str) -> StreamAction:
+        action = ("edit" if self._message_open else "send", text)
+        self._message_open = True
+        self._shown = text
+        self.edits += 1
+        return action
+
+    def _split_point(self, limit: int) -> int:
+        """موضع تقسيم النص الحالي: آخر سطر أو مسافة قبل الحد إن وُجدا"""
+        for separator in ("\n", " "):
+            position = self._current.rfind(separator, 0, limit)
+            if position > limit // 2:
+                return position + 1
+        return limit
+
+    def feed(self, delta: str) -> List[StreamAction]:
+        """إضافة جزء جديد وإرجاع الإجراءات المطلوبة الآن"""
+        self.text += delta
+        self._current += delta
+        actions: List[StreamAction] = []
+
+        # الرسائل التي امتلأت تُكتب كاملة دون انتظار
+        limit = self.max_length - len(self.CURSOR)
+        while len(self._current) > limit:
+            split = self._split_point(limit)
+            head, self._current = self._current[:split].rstrip(), self._current[split:]
+            actions.append(self._show(head))
+            self._message_open = False
+            self._shown = ""
+
+        now = self.clock()
+        due = self._last_edit is None or now - self._last_edit >= self.min_interval
+        if actions or (due and self._current.strip()):
+            if self._current.strip():
+                actions.append(self._show(self._current + self.CURSOR))
+            self._last_edit = now
+        return actions
+
+    def finish(self) -> List[StreamAction]:
+        """الإجراء الأخير: النص الكامل للرسالة الحالية دون علامة الكتابة"""
+        final = self._current.rstrip()
+        if final and final != self._shown:
+            return [self._show(final)]
+        return []
@@ -5,12 +5,41 @@
 
 import sys
 import os
+import tempfile
 
 # إضافة المسار الحالي لاستيراد الوحدات
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from islamic_context_explainer import IslamicContextExplainer, ConceptCategory
+from answer_cache import AnswerCache, is_follow_up
+from concept_model import IslamicConcept
+from concept_store import ColumnarConceptStore, InMemoryConceptStore, JSONLConceptStore, open_concept_store, write_jsonl_store, write_sqlite_store
+from index_snapshot import IndexSnapshot, compile_index_snapshot
+from intent_router import IntentRouter
+from outbound_queue import BULK, INTERACTIVE, AsyncRateLimitedBot, AsyncRateLimiter, OutboundQueue, RateLimitedBot
+from run_poller import RunDeadlineExceeded, RunPoller
 from session_manager import SessionManager, SessionState
+from thread_pool import AssistantThreadPool
+from thread_store import ThreadStore
+from user_dispatcher import UserDispatcher
+from webhook_server import SECRET_TOKEN_HEADER, WebhookServer, send_fake_update
+from streaming_reply import StreamingReply
+
+def make_concept(arabic_name, category=ConceptCategory.TERMINOLOGY, related=(), definition=None):
+    """إنشاء مفهوم مبسط للاختبارات"""
+    return IslamicConcept(
+        name=arabic_name,
+        arabic_name=arabic_name,
+        category=category,
+        definition=definition or f"{arabic_name} مفهوم للاختبار",
+        cultural_context="سياق",
+        historical_background="خلفية",
+        practical_application="تطبيق",
+        related_concepts=list(related),
+        sources=["القرآن الكريم"],
+        examples=["مثال"],
+        common_misconceptions=["خطأ شائع"]
+    )
 
 def test_islamic_explainer():
     """اختبار أساسي لشارح المفاهيم الإسلامية"""
@@ -60,6 +89,989 @@ def test_islamic_explainer():
     
     print("\n✅ انتهى اختبار شارح المفاهيم الإسلامية بنجاح")
 
+def test_substring_index():
+    """اختبار تطابق فهرس n-gram مع المسح الخطي للمطابقة الجزئية"""
+    print("\n🧪 بدء اختبار فهرس المطابقة الجزئية")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer()
+    keywords = list(explainer.search_keywords.keys())
+    
+    queries = ["الصلاة", "صلا", "في", "ا", "الحجاج", "التوحيدية", "جهاد النفس", "prayer", "xyz"]
+    for word in queries:
+        expected = [i for i, keyword in enumerate(keywords) if word in keyword or keyword in word]
+        found = explainer.substring_index.find_partial(word)
+        print(f"'{word}': {len(found)} كلمة مطابقة")
+        assert found == expected
+    
+    print("\n✅ انتهى اختبار فهرس المطابقة الجزئية بنجاح")
+
+def test_concept_stores():
+    """اختبار مخازن المفاهيم الخارجية (JSONL و SQLite)"""
+    print("\n🧪 بدء اختبار مخازن المفاهيم")
+    print("=" * 50)
+    
+    builtin = IslamicContextExplainer()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file_name, writer in [("concepts.jsonl", write_jsonl_store), ("concepts.sqlite", write_sqlite_store)]:
+            path = os.path.join(temp_dir, file_name)
+            writer(builtin.concepts_database.iter_concepts(), path)
+            
+            store = open_concept_store(path, cache_size=2)
+            explainer = IslamicContextExplainer(store=store)
+            print(f"{file_name}: {len(store)} مفهوم")
+            
+            assert list(store) == list(builtin.concepts_database)
+            assert store["salah"] == builtin.concepts_database["salah"]
+            assert explainer.search_keywords == builtin.search_keywords
+            assert explainer.explain_concept("hajj", "detailed") == builtin.explain_concept("hajj", "detailed")
+            
+            # الذاكرة المؤقتة لا تتجاوز الحد المحدد
+            for concept_id in store:
+                store[concept_id]
+            assert store.cache_info()["cached"] == 2
+            
+            # الاختيار العشوائي يغطي كل المفاهيم ويتبع الحذف
+            import random
+            rng = random.Random(7)
+            assert {store.random_id(rng) for _ in range(200)} == set(store)
+            store.delete("hajj")
+            assert "hajj" not in {store.random_id(rng) for _ in range(200)}
+            assert explainer.get_random_concept().startswith("💡")
+            store.close()
+    
+    # المخزن العمودي يعيد نفس المفاهيم بحقول مضغوطة
+    columnar = ColumnarConceptStore(builtin.concepts_database.iter_concepts())
+    print(f"المخزن العمودي: {columnar.nbytes()} بايت لـ {len(columnar)} مفاهيم")
+    for concept_id, concept in builtin.concepts_database.iter_concepts():
+        assert columnar[concept_id] == concept
+    assert isinstance(columnar["salah"].sources, tuple)
+    assert columnar["salah"].sources[0] is builtin.concepts_database["hajj"].sources[0]
+    
+    print("\n✅ انتهى اختبار مخازن المفاهيم بنجاح")
+
+def test_index_snapshot():
+    """اختبار لقطة الفهرس المعدّة مسبقاً وقراءتها عبر mmap"""
+    print("\n🧪 بدء اختبار لقطة الفهرس")
+    print("=" * 50)
+    
+    builtin = IslamicContextExplainer()
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store_path = os.path.join(temp_dir, "concepts.jsonl")
+        snapshot_path = os.path.join(temp_dir, "index.snap")
+        write_jsonl_store(builtin.concepts_database.iter_concepts(), store_path)
+        compile_index_snapshot(IslamicContextExplainer(store=open_concept_store(store_path)), snapshot_path)
+        
+        snapshot = IndexSnapshot(snapshot_path)
+        store = JSONLConceptStore(store_path, offsets=snapshot.concept_offsets())
+        explainer = IslamicContextExplainer(store=store, index_snapshot=snapshot)
+        print(f"حجم اللقطة: {os.path.getsize(snapshot_path)} بايت")
+        
+        assert dict(explainer.search_keywords) == builtin.search_keywords
+        for query in ["الصلاة", "توحيد", "في", "الجهاد في سبيل الله", "prayer"]:
+            assert explainer.search_concepts(query) == builtin.search_concepts(query)
+        # رسم العلاقات والتصنيفات والبحث التقريبي لا تُبنى عند الإقلاع مع اللقطة
+        assert not explainer._concept_indexes_ready
+        assert explainer.recommend_concepts("salah") == builtin.recommend_concepts("salah")
+        assert explainer._concept_indexes_ready
+        assert explainer.fuzzy_search_concepts("الصلاه") == builtin.fuzzy_search_concepts("الصلاه")
+        assert explainer.get_categories_overview() == builtin.get_categories_overview()
+        assert store["ihsan"] == builtin.concepts_database["ihsan"]
+        assert snapshot.source_size == os.path.getsize(store_path) == store.size
+        # إغلاق الشارح (بعد إعادة التحميل) يغلق مخزنه ولقطته
+        explainer.close()
+        assert store._file.closed and snapshot._mmap.closed
+        
+        # تعديلات أُلحقت بالملف بعد الترجمة تُقرأ بمسح ما بعد الحجم المسجل فقط
+        writer = JSONLConceptStore(store_path)
+        updated = make_concept("الإحسان", ConceptCategory.ETHICS, definition="تعريف معدل")
+        writer.put("ihsan", updated)
+        writer.put("zakat", make_concept("الزكاة", ConceptCategory.WORSHIP))
+        writer.delete("hajj")
+        writer.close()
+        snapshot = IndexSnapshot(snapshot_path)
+        store = JSONLConceptStore(store_path, offsets=snapshot.concept_offsets(), offsets_size=snapshot.source_size)
+        assert store["ihsan"] == updated and "zakat" in store and "hajj" not in store
+        assert store.size == os.path.getsize(store_path) and store.offsets == JSONLConceptStore(store_path).offsets
+        store.close()
+        snapshot.close()
+    
+    print("\n✅ انتهى اختبار لقطة الفهرس بنجاح")
+
+def test_bm25_ranking():
+    """اختبار ترتيب BM25 عبر نقطة الدخول search_concepts"""
+    print("\n🧪 بدء اختبار ترتيب BM25")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer(ranking_mode="bm25")
+    ranker = explainer._get_bm25_ranker()
+    
+    for query in ["الصلاة", "ما هي الصلاة في الإسلام", "الجهاد في سبيل الله", "مكة", "xyz"]:
+        words = ranker.tokenizer(query)
+        scores = ranker.score(words)
+        expected = sorted(
+            (i for i in range(len(scores)) if scores[i] > 0), key=lambda i: (-scores[i], i)
+        )[:3]
+        results = explainer.search_concepts_scored(query, top_k=3)
+        print(f"'{query}': {results}")
+        assert [concept_id for concept_id, _ in results] == [ranker.concept_ids[i] for i in expected]
+    
+    # مصطلح يظهر في السياق الثقافي فقط يُعثر عليه بنمط BM25
+    assert explainer.search_concepts("العرقية") == ["hajj"]
+    assert explainer.search_concepts("العرقية", mode="keyword") == []
+    
+    print("\n✅ انتهى اختبار ترتيب BM25 بنجاح")
+
+def test_render_cache():
+    """اختبار ذاكرة النصوص المعروضة وإبطالها"""
+    print("\n🧪 بدء اختبار ذاكرة العرض")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer(render_cache_size=4)
+    
+    # الجانب المطلوب فقط يُحسب دون بناء الشرح الكامل
+    explainer.get_concept_aspect("salah", "1")
+    assert ("salah", "explain", "detailed") not in explainer.render_cache
+    
+    first = explainer.explain_concept("salah", "detailed")
+    hits = explainer.render_cache.hits
+    assert explainer.get_concept_aspect("salah", "8") == first
+    assert explainer.render_cache.hits == hits + 1
+    
+    # تغيير المفهوم ثم إبطال نصوصه
+    explainer.concepts_database["salah"].definition = "تعريف محدث"
+    assert explainer.get_concept_aspect("salah", "1") != "📖 **التعريف:**\nتعريف محدث"
+    explainer.invalidate_concept("salah")
+    assert explainer.get_concept_aspect("salah", "1") == "📖 **التعريف:**\nتعريف محدث"
+    
+    # الحجم لا يتجاوز الحد
+    for concept_id in explainer.concepts_database:
+        explainer.get_interactive_menu(concept_id)
+    print(f"إحصائيات الذاكرة: {explainer.render_cache.stats()}")
+    assert len(explainer.render_cache) == 4
+    
+    # تعديل يقع بين قراءة المفهوم وحفظ نصه لا يترك النص القديم في الذاكرة
+    explainer = IslamicContextExplainer()
+    render = explainer._render_explanation
+    edited = make_concept("الصلاة", ConceptCategory.WORSHIP, definition="تعريف أثناء العرض")
+    
+    def render_during_edit(concept, detail_level):
+        text = render(concept, detail_level)
+        explainer.update_concept("salah", edited)
+        return text
+    explainer._render_explanation = render_during_edit
+    stale = explainer.explain_concept("salah")
+    explainer._render_explanation = render
+    assert "تعريف أثناء العرض" not in stale
+    assert "تعريف أثناء العرض" in explainer.explain_concept("salah")
+    
+    # وكذلك قرار موجه النوايا المحسوب قبل حذف مفهوم
+    decide = explainer.intent_router._decide
+    
+    def decide_during_edit(terms, mode):
+        decision = decide(terms, mode)
+        explainer.remove_concept("hajj")
+        return decision
+    explainer.intent_router._decide = decide_during_edit
+    assert explainer.route_query("الحج").concept_ids == ("hajj",)
+    explainer.intent_router._decide = decide
+    assert "hajj" not in explainer.route_query("الحج").concept_ids
+    
+    print("\n✅ انتهى اختبار ذاكرة العرض بنجاح")
+
+def test_concept_graph():
+    """اختبار رسم العلاقات والتوصيات متعددة القفزات"""
+    print("\n🧪 بدء اختبار رسم العلاقات")
+    print("=" * 50)
+    
+    store = InMemoryConceptStore({
+        "a": make_concept("أ", related=["ب", "ج"]),
+        "b": make_concept("ب", related=["د"]),
+        "c": make_concept("ج", related=["د"]),
+        "d": make_concept("د", related=["هـ"]),
+        "e": make_concept("هـ"),
+        "f": make_concept("و"),
+    })
+    explainer = IslamicContextExplainer(store=store)
+    
+    recommendations = explainer.recommend_concepts("a")
+    print(f"توصيات 'a': {recommendations}")
+    assert recommendations == [("b", 1), ("c", 1), ("d", 2), ("e", 3)]
+    assert explainer.recommend_concepts("a", max_hops=1) == [("b", 1), ("c", 1)]
+    # الأضلاع تُتبع في الاتجاهين وأكثر المسارات أقرب
+    assert explainer.recommend_concepts("e")[:2] == [("d", 1), ("b", 2)]
+    assert explainer.recommend_concepts("f") == []
+    assert "ب - " in explainer.suggest_related_concepts("a")
+    
+    print("\n✅ انتهى اختبار رسم العلاقات بنجاح")
+
+def test_category_browsing():
+    """اختبار فهرس التصنيفات والتصفح بالمؤشر"""
+    print("\n🧪 بدء اختبار تصفح التصنيفات")
+    print("=" * 50)
+    
+    store = InMemoryConceptStore({
+        f"c{i}": make_concept(f"مفهوم{i}", ConceptCategory.HISTORY if i % 2 else ConceptCategory.CULTURE)
+        for i in range(25)
+    })
+    explainer = IslamicContextExplainer(store=store)
+    index = explainer.category_index
+    
+    # المرور على جميع الصفحات بالمؤشر
+    seen, cursor = [], None
+    while True:
+        page = explainer.browse_category(ConceptCategory.HISTORY, cursor, page_size=5)
+        seen.extend(page.concept_ids)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == [f"c{i}" for i in range(1, 25, 2)]
+    
+    # المؤشر يبقى صالحاً بعد الحذف والإضافة
+    page = explainer.browse_category(ConceptCategory.HISTORY, page_size=3)
+    index.remove("c7")
+    index.add("c4", ConceptCategory.HISTORY)
+    next_page = explainer.browse_category(ConceptCategory.HISTORY, page.next_cursor, page_size=3)
+    print(f"الصفحة التالية بعد التعديل: {next_page.concept_ids}")
+    assert next_page.concept_ids == ["c9", "c11", "c13"]
+    assert index.count(ConceptCategory.CULTURE) == 12
+    assert len(explainer.get_category_concepts(ConceptCategory.HISTORY)) == 12
+    
+    overview = IslamicContextExplainer().get_categories_overview()
+    assert "الصلاة" in overview and "الإحسان" in overview
+    
+    print("\n✅ انتهى اختبار تصفح التصنيفات بنجاح")
+
+def test_fuzzy_lookup():
+    """اختبار البحث التقريبي عن أسماء المفاهيم مع الأخطاء الإملائية"""
+    print("\n🧪 بدء اختبار البحث التقريبي")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer()
+    cases = {"الصلاه": "salah", "التوحبد": "tawhid", "الحح": "hajj", "الاحسان": "ihsan", "جهاد النفص": "jihad"}
+    for query, expected in cases.items():
+        results = explainer.fuzzy_search_concepts(query)
+        print(f"'{query}' -> {results}")
+        assert results[:1] == [expected]
+    
+    # الكلمات القصيرة والبعيدة لا تطابق
+    assert explainer.fuzzy_search_concepts("في") == []
+    assert explainer.fuzzy_search_concepts("xyz") == []
+    assert explainer.fuzzy_search_concepts("التوحبد", max_distance=0) == []
+    
+    from fuzzy_index import edit_distance
+    assert edit_distance("الصلاه", "الصلاة", 2) == 1
+    assert edit_distance("abcd", "abdc", 2) == 1
+    assert edit_distance("abc", "xyz", 1) == 2
+    
+    print("\n✅ انتهى اختبار البحث التقريبي بنجاح")
+
+def test_arabic_normalization():
+    """اختبار توحيد الكتابة العربية عند البناء والاستعلام"""
+    print("\n🧪 بدء اختبار توحيد الكتابة")
+    print("=" * 50)
+    
+    from arabic_normalizer import light_stem, normalize_arabic, normalize_terms
+    assert normalize_arabic("إِحْسَانٌ") == "احسان"
+    assert normalize_arabic("الصـــلاة") == "الصلاه"
+    assert normalize_arabic("مُصطفى") == "مصطفي"
+    assert light_stem("والصلاه") == "صلاه"
+    assert light_stem("الله") == "الله"
+    assert normalize_terms("بالإحسان والتوحيد") == ["احسان", "توحيد"]
+    
+    explainer = IslamicContextExplainer()
+    raw = IslamicContextExplainer(normalize=False)
+    cases = {"الصلاه": "salah", "الصَّلَاة": "salah", "والتوحيد": "tawhid", "احسان": "ihsan", "بالحج": "hajj"}
+    for query, expected in cases.items():
+        results = explainer.search_concepts(query)
+        print(f"'{query}' -> {results}")
+        assert results[:1] == [expected]
+    # دون التوحيد يقسم التشكيل الكلمة إلى أجزاء فلا تتصدر الصلاة النتائج
+    assert raw.search_concepts("الصَّلَاة")[:1] != ["salah"]
+    
+    # الأسماء المترابطة تُوحد في رسم العلاقات أيضاً
+    assert explainer.concept_graph.resolve_name("التَّوحيد") == "tawhid"
+    
+    print("\n✅ انتهى اختبار توحيد الكتابة بنجاح")
+
+def test_alias_lookup():
+    """اختبار البحث بالأسماء الإنجليزية والكتابات اللاتينية"""
+    print("\n🧪 بدء اختبار الأسماء البديلة")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer()
+    cases = {"prayer": "salah", "salat": "salah", "Namaz": "salah", "hajj": "hajj",
+             "tawheed": "tawhid", "what is ihsan": "ihsan"}
+    for query, expected in cases.items():
+        for mode in explainer.RANKING_MODES:
+            results = explainer.search_concepts(query, mode=mode)
+            print(f"'{query}' ({mode}) -> {results}")
+            assert results[:1] == [expected]
+    
+    # الأخطاء الإملائية في الكتابة اللاتينية عبر البحث التقريبي
+    assert explainer.fuzzy_search_concepts("tawhed")[:1] == ["tawhid"]
+    
+    # الأسماء البديلة تُحفظ مع المفهوم في المخازن الخارجية
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "concepts.sqlite")
+        write_sqlite_store(explainer.concepts_database.iter_concepts(), path)
+        store = open_concept_store(path)
+        assert store["salah"].aliases == explainer.concepts_database["salah"].aliases
+        store.close()
+        
+        # قاعدة قديمة دون عمود aliases تُقرأ ثم تقبل التعديل بعد إضافة العمود
+        import sqlite3
+        connection = sqlite3.connect(path)
+        connection.execute("ALTER TABLE concepts DROP COLUMN aliases")
+        connection.commit()
+        connection.close()
+        legacy = IslamicContextExplainer(store=open_concept_store(path))
+        assert not legacy.concepts_database["salah"].aliases
+        salah = explainer.concepts_database["salah"]
+        legacy.update_concept("salah", salah)
+        assert legacy.concepts_database["salah"].aliases == salah.aliases
+        assert not legacy.concepts_database["hajj"].aliases
+        legacy.close()
+    
+    print("\n✅ انتهى اختبار الأسماء البديلة بنجاح")
+
+def test_query_plan():
+    """اختبار خطة الاستعلام وذاكرة نتائج البحث"""
+    print("\n🧪 بدء اختبار خطة الاستعلام")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer()
+    calls = []
+    search = explainer.search_concepts
+    explainer.search_concepts = lambda query, mode=None: calls.append(query) or search(query, mode)
+    
+    plan = explainer.plan_query("الصلاة")
+    assert plan.is_concept_query and plan.concept_ids[0] == "salah" and not plan.fuzzy
+    # الصيغ المختلفة لنفس السؤال تصيب الذاكرة دون بحث جديد
+    assert explainer.plan_query("الصَّلاة").concept_ids == plan.concept_ids
+    assert explainer.plan_query("الصلاه").concept_ids == plan.concept_ids
+    assert calls == ["الصلاة"]
+    assert explainer.query_cache_info()["hits"] == 2
+    assert explainer.query_cache_info()["misses"] == 1
+    
+    # البحث التقريبي عند عدم وجود نتائج، ولا نتائج لما ليس مفهوماً
+    assert explainer.plan_query("التوحبد").fuzzy
+    assert not explainer.plan_query("xyz").is_concept_query
+    
+    explainer.invalidate_concept("salah")
+    assert len(explainer.query_cache) == 0
+    
+    print("\n✅ انتهى اختبار خطة الاستعلام بنجاح")
+
+def test_incremental_updates():
+    """اختبار إضافة المفاهيم وتعديلها وحذفها دون إعادة بناء الفهارس"""
+    print("\n🧪 بدء اختبار التحديث التدريجي")
+    print("=" * 50)
+    
+    queries = ["الصلاة", "الزكاة", "صدقة", "zakat", "الحج", "الزكاه", "مال"]
+    zakat = make_concept("الزكاة", ConceptCategory.WORSHIP, related=["الصلاة", "صدقة"],
+                         definition="الزكاة حق واجب في المال")
+    zakat_updated = make_concept("الزكاة", ConceptCategory.WORSHIP, related=["صدقة"],
+                                 definition="الزكاة ركن من أركان الإسلام")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store_path = os.path.join(temp_dir, "concepts.jsonl")
+        snapshot_path = os.path.join(temp_dir, "index.snap")
+        write_jsonl_store(IslamicContextExplainer().concepts_database.iter_concepts(), store_path)
+        compile_index_snapshot(IslamicContextExplainer(store=open_concept_store(store_path)), snapshot_path)
+        snapshot = IndexSnapshot(snapshot_path)
+        store = JSONLConceptStore(store_path, offsets=snapshot.concept_offsets())
+        
+        for explainer in (IslamicContextExplainer(), IslamicContextExplainer(store=store, index_snapshot=snapshot)):
+            explainer.search_concepts("الزكاة")
+            explainer.explain_concept("salah")
+            
+            explainer.add_concept("zakat", zakat)
+            assert explainer.search_concepts("الزكاة")[0] == "zakat"
+            assert explainer.search_concepts("الزكاة", mode="bm25")[0] == "zakat"
+            assert ("zakat", 1) in explainer.recommend_concepts("salah")
+            try:
+                explainer.add_concept("zakat", zakat)
+                assert False, "يجب رفض المعرف المكرر"
+            except ValueError:
+                pass
+            
+            explainer.update_concept("zakat", zakat_updated)
+            explainer.update_concept("salah", explainer.concepts_database["salah"])
+            explainer.remove_concept("hajj")
+            # محرك BM25 يُعاد بناؤه في الخلفية، والمحذوف لا يظهر من المحرك السابق أثناء ذلك
+            assert "hajj" not in explainer.search_concepts("الحج", mode="bm25")
+            assert explainer.wait_for_ranker(5)
+            
+            # الفهارس المعدلة تدريجياً تطابق فهارس مبنية من الصفر
+            rebuilt = IslamicContextExplainer(store=InMemoryConceptStore(dict(explainer.concepts_database.iter_concepts())))
+            for query in queries:
+                for mode in explainer.RANKING_MODES:
+                    assert (sorted(explainer.search_concepts_scored(query, mode=mode))
+                            == sorted(rebuilt.search_concepts_scored(query, mode=mode))), (query, mode)
+                assert explainer.fuzzy_search_concepts(query) == rebuilt.fuzzy_search_concepts(query)
+            assert explainer.recommend_concepts("zakat") == rebuilt.recommend_concepts("zakat")
+            assert explainer.get_category_concepts(ConceptCategory.WORSHIP) == ["• الصلاة", "• الزكاة"]
+            assert "hajj" not in explainer.concepts_database
+            assert explainer.explain_concept("hajj") == "المفهوم غير موجود في قاعدة البيانات."
+        
+        # التعديلات محفوظة في ملف JSONL وتظهر عند إعادة فتحه
+        reopened = JSONLConceptStore(store_path)
+        assert reopened.concept_ids() == ["salah", "jihad", "tawhid", "ihsan", "zakat"]
+        assert reopened["zakat"] == zakat_updated
+        assert [concept_id for concept_id, _ in reopened.iter_concepts()] == ["jihad", "tawhid", "ihsan", "zakat", "salah"]
+        reopened.close()
+        store.close()
+        snapshot.close()
+    
+    print("\n✅ انتهى اختبار التحديث التدريجي بنجاح")
+
+def test_batch_search():
+    """اختبار البحث بالدفعات ومطابقته للبحث المفرد"""
+    print("\n🧪 بدء اختبار البحث بالدفعات")
+    print("=" * 50)
+    
+    explainer = IslamicContextExplainer()
+    queries = ["الصلاة", "prayer", "ما هي الصلاة في الإسلام", "", "xyz", "الصلاة",
+               "الجهاد في سبيل الله", "العرقية", "التَّوحيد والإحسان", "في"]
+    for mode in explainer.RANKING_MODES:
+        expected = [explainer.search_concepts_scored(query, top_k=3, mode=mode) for query in queries]
+        assert explainer.search_concepts_batch(queries, top_k=3, mode=mode) == expected
+        parallel = explainer.search_concepts_batch(queries, top_k=3, mode=mode,
+                                                   processes=2, min_parallel_batch=1)
+        assert parallel == expected
+        print(f"{mode}: {len(queries)} استعلام ✓")
+    assert explainer.search_concepts_batch([]) == []
+    
+    print("\n✅ انتهى اختبار البحث بالدفعات بنجاح")
+
+def test_intent_router():
+    """اختبار موجه النوايا المحلي"""
+    print("\n🧪 بدء اختبار موجه النوايا")
+    print("=" * 50)
+    
+    from arabic_normalizer import content_terms
+    assert content_terms("ما هو الجهاد في الإسلام") == ["جهاد", "اسلام"]
+    
+    explainer = IslamicContextExplainer()
+    # الكلمات الوظيفية لم تعد كلمات مفتاحية
+    assert "في" not in explainer.search_keywords and "هي" not in explainer.search_keywords
+    
+    local = {"ما هو الجهاد": ("jihad",), "what is prayer": ("salah",), "التوحبد": ("tawhid",),
+             "ما حكم الصلاة في السفر": ("salah",), "عبادة بدنية وروحية": ("salah",)}
+    general = ["كيف حالك اليوم", "tell me a joke", "من هو النبي محمد", "hi", "في", ""]
+    for text, expected in local.items():
+        plan = explainer.route_query(text)
+        print(f"'{text}' -> {plan.concept_ids} ({plan.score})")
+        assert plan.concept_ids == expected
+    for text in general:
+        assert not explainer.route_query(text).is_concept_query, text
+    
+    # القرارات محفوظة حسب الكلمات الدالة فتتشاركها الصيغ المختلفة
+    router = explainer.intent_router
+    before = router.stats()["decisions"]["hits"]
+    explainer.route_query("ما هو الجِهاد؟")
+    assert router.stats()["decisions"]["hits"] == before + 1
+    explainer.invalidate_concept("jihad")
+    assert router.stats()["decisions"]["size"] == 0
+    
+    # المفاهيم البعيدة عن أفضل نتيجة تُستبعد
+    strict = IntentRouter(explainer, score_gap=0.0)
+    assert strict.route("أركان الإسلام")[0] == ("salah", "hajj")
+    
+    print("\n✅ انتهى اختبار موجه النوايا بنجاح")
+
+def test_streaming_reply():
+    """اختبار تعديلات الرد المتدفق"""
+    print("\n🧪 بدء اختبار الرد المتدفق")
+    print("=" * 50)
+    
+    now = [0.0]
+    reply = StreamingReply(min_interval=1.0, max_length=40, clock=lambda: now[0])
+    # أول جزء يظهر فوراً في الرسالة المؤقتة
+    assert reply.feed("الصلاة") == [("edit", "الصلاة" + reply.CURSOR)]
+    # الأجزاء التالية قبل انقضاء الفترة لا تعدّل الرسالة
+    now[0] = 0.5
+    assert reply.feed(" عماد") == []
+    now[0] = 1.2
+    assert reply.feed(" الدين") == [("edit", "الصلاة عماد الدين" + reply.CURSOR)]
+    
+    # تجاوز الحد يكمل الرسالة الحالية ويبدأ رسالة جديدة
+    now[0] = 1.3
+    actions = reply.feed(" وهي الركن الثاني من أركان الإسلام")
+    assert [action for action, _ in actions] == ["edit", "send"]
+    assert all(len(text) <= 40 for _, text in actions)
+    now[0] = 1.4
+    assert reply.finish() == [("edit", reply.current_text)]
+    assert reply.finish() == []
+    assert " ".join(reply.text.split()) == "الصلاة عماد الدين وهي الركن الثاني من أركان الإسلام"
+    
+    # رد فارغ لا يغيّر الرسالة المؤقتة
+    empty = StreamingReply()
+    assert empty.feed("") == [] and empty.finish() == []
+    
+    print("\n✅ انتهى اختبار الرد المتدفق بنجاح")
+
+def test_run_poller():
+    """اختبار جدولة استطلاع تشغيلات المساعد"""
+    print("\n🧪 بدء اختبار استطلاع التشغيلات")
+    print("=" * 50)
+    
+    import asyncio
+    import itertools
+    from types import SimpleNamespace
+    
+    now = [0.0]
+    def sleep(seconds):
+        now[0] += seconds
+    poller = RunPoller(initial_interval=0.2, max_interval=1.0, multiplier=2, jitter=0, deadline=5,
+                       clock=lambda: now[0], sleep=sleep)
+    assert list(itertools.islice(poller.intervals(), 5)) == [0.2, 0.4, 0.8, 1.0, 1.0]
+    jittered = RunPoller(initial_interval=1.0, max_interval=2.0, jitter=0.25, rng=lambda: 1.0)
+    assert next(jittered.intervals()) == 1.25
+    
+    # التشغيل يكتمل عند الثانية 1: الاستطلاعات عند 0 و 0.2 و 0.6 و 1.4
+    run = poller.wait(lambda: SimpleNamespace(status="completed" if now[0] >= 1.0 else "in_progress"),
+                      lambda: None)
+    assert run.status == "completed" and abs(now[0] - 1.4) < 1e-9
+    stats = poller.stats()
+    assert stats["runs"] == 1 and stats["polls"] == 4
+    assert abs(stats["detection_p50_ms"] - 800) < 1e-6
+    
+    # بعد المهلة يُلغى التشغيل
+    cancelled = []
+    now[0] = 0.0
+    try:
+        poller.wait(lambda: SimpleNamespace(status="in_progress"), lambda: cancelled.append(True))
+        assert False, "المهلة لم تنته"
+    except RunDeadlineExceeded:
+        pass
+    assert cancelled == [True] and now[0] == 5
+    assert poller.stats()["timeouts"] == 1 and poller.stats()["cancelled"] == 1
+    
+    # بعد عدد كافٍ من التشغيلات ينتظر أول استطلاع أسرعها
+    # (زمن الاكتمال مقدر بمنتصف آخر فترة: التشغيل الأول بين 0.6 و 1.4)
+    assert poller.first_poll_delay() == 0.0
+    for _ in range(RunPoller.MIN_DURATION_SAMPLES):
+        now[0] = 0.0
+        poller.wait(lambda: SimpleNamespace(status="completed" if now[0] >= 3.0 else "queued"), lambda: None)
+    assert abs(poller.first_poll_delay() - 1.0) < 1e-9
+    
+    # حد التشغيلات المتزامنة
+    limited = RunPoller(max_concurrent_runs=1, deadline=0.01)
+    with limited.slot():
+        try:
+            with limited.slot():
+                assert False, "تجاوز الحد"
+        except RunDeadlineExceeded:
+            pass
+    with limited.slot():
+        pass
+    
+    async def poll_async():
+        statuses = iter(["queued", "in_progress", "failed"])
+        async def retrieve():
+            return SimpleNamespace(status=next(statuses))
+        async def cancel():
+            pass
+        fast = RunPoller(initial_interval=0.001, max_interval=0.002)
+        async with fast.slot_async():
+            return await fast.wait_async(retrieve, cancel)
+    assert asyncio.run(poll_async()).status == "failed"
+    
+    print("\n✅ انتهى اختبار استطلاع التشغيلات بنجاح")
+
+def test_answer_cache():
+    """اختبار ذاكرة ردود المساعد"""
+    print("\n🧪 بدء اختبار ذاكرة الردود")
+    print("=" * 50)
+    
+    assert not is_follow_up("ما هي أركان الإسلام؟")
+    for text in ("وضح هذا أكثر", "لماذا؟", "tell me more", "وماذا عن ذلك"):
+        assert is_follow_up(text), text
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "answers.sqlite")
+        now = [1000.0]
+        cache = AnswerCache(path, ttl=60, max_entries=10, namespace="asst", clock=lambda: now[0])
+        cache.put("ما هي أركان الإسلام؟", "خمسة أركان")
+        # نفس السؤال بكتابة مختلفة
+        assert cache.get("ما هي اركانُ الاسلام") == "خمسة أركان"
+        assert cache.get("ما هي أركان الإيمان؟") is None
+        # أسئلة المتابعة لا تُخزن ولا تُقرأ
+        cache.put("وضح هذا أكثر", "رد يعتمد على السياق")
+        assert cache.get("وضح هذا أكثر") is None and len(cache) == 1
+        assert cache.stats()["bypassed"] == 1
+        
+        # الذاكرة دائمة ومفصولة حسب المساعد
+        cache.close()
+        cache = AnswerCache(path, ttl=60, max_entries=10, namespace="asst", clock=lambda: now[0])
+        assert cache.get("ما هي أركان الإسلام") == "خمسة أركان"
+        other = AnswerCache(path, namespace="other")
+        assert other.get("ما هي أركان الإسلام") is None
+        other.close()
+        
+        # انتهاء الصلاحية
+        now[0] += 61
+        assert cache.get("ما هي أركان الإسلام") is None and len(cache) == 0
+        
+        # حذف الأقدم استخداماً عند تجاوز الحد
+        for i in range(10):
+            now[0] += 1
+            cache.put(f"سؤال رقم {i}", f"رد {i}")
+        now[0] += 1
+        assert cache.get("سؤال رقم 0") == "رد 0"
+        cache.put("سؤال جديد", "رد")
+        assert len(cache) == 9
+        assert cache.get("سؤال رقم 0") == "رد 0" and cache.get("سؤال جديد") == "رد"
+        assert cache.get("سؤال رقم 1") is None
+        cache.close()
+    
+    print("\n✅ انتهى اختبار ذاكرة الردود بنجاح")
+
+def test_webhook_server():
+    """اختبار استقبال التحديثات عبر webhook"""
+    print("\n🧪 بدء اختبار خادم webhook")
+    print("=" * 50)
+    
+    import threading
+    
+    processed = []
+    done = threading.Event()
+    def process_update(update):
+        processed.append(update["update_id"])
+        if len(processed) == 3:
+            done.set()
+    
+    server = WebhookServer(process_update, secret_token="s3cret", host="127.0.0.1", port=0, workers=2)
+    server.start()
+    url = f"http://127.0.0.1:{server.port}/webhook"
+    try:
+        for update_id in range(3):
+            assert send_fake_update(url, {"update_id": update_id}, "s3cret") == 200
+        assert send_fake_update(url, {"update_id": 99}, "wrong") == 403
+        assert send_fake_update(url, {"update_id": 99}) == 403
+        assert send_fake_update(url.replace("/webhook", "/other"), {"update_id": 99}, "s3cret") == 404
+        assert done.wait(5)
+    finally:
+        server.stop()
+    assert sorted(processed) == [0, 1, 2]
+    # ترويسة طول غير رقمية ترد بـ 400 بدلاً من خطأ في الخادم
+    headers = {SECRET_TOKEN_HEADER: "s3cret", "Content-Length": "abc"}
+    assert server.accept("/webhook", headers, None) == 400
+    assert server.stats()["received"] == 3 and server.stats()["rejected"] == 2
+    
+    # الطابور الممتلئ يرد بـ 503 فيعيد تيليجرام الإرسال لاحقاً
+    # دون رمز سري مُعطى يُولَّد رمز عشوائي فلا يُقبل تحديث بلا رمز
+    blocked = WebhookServer(lambda update: None, host="127.0.0.1", port=0, workers=0, queue_size=1)
+    assert len(blocked.secret_token) >= 32
+    blocked.start()
+    url = f"http://127.0.0.1:{blocked.port}/webhook"
+    try:
+        assert send_fake_update(url, {"update_id": 1}) == 403
+        assert send_fake_update(url, {"update_id": 1}, blocked.secret_token) == 200
+        assert send_fake_update(url, {"update_id": 2}, blocked.secret_token) == 503
+        assert blocked.stats() == {"received": 1, "rejected": 1, "dropped": 1, "processed": 0,
+                                   "errors": 0, "queue_depth": 1}
+    finally:
+        blocked.stop()
+    
+    print("\n✅ انتهى اختبار خادم webhook بنجاح")
+
+def test_outbound_queue():
+    """اختبار طابور الرسائل الصادرة"""
+    print("\n🧪 بدء اختبار طابور الرسائل الصادرة")
+    print("=" * 50)
+    
+    import time
+    from types import SimpleNamespace
+    
+    class RateLimited(Exception):
+        error_code = 429
+        result_json = {"parameters": {"retry_after": 0.05}}
+    
+    class FakeBot:
+        def __init__(self):
+            self.calls = []
+            self.limited = set()
+        def send_message(self, chat_id, text, **kwargs):
+            if (chat_id, text) in self.limited:
+                self.limited.discard((chat_id, text))
+                raise RateLimited()
+            self.calls.append((chat_id, text))
+            return SimpleNamespace(message_id=len(self.calls))
+        def reply_to(self, message, text, **kwargs):
+            return self.send_message(message.chat.id, text)
+        def send_chat_action(self, chat_id, action, **kwargs):
+            self.calls.append((chat_id, action, *kwargs.values()))
+    
+    bot = FakeBot()
+    queue = OutboundQueue(bot, global_rate=1000, chat_rate=1000, chat_burst=1000, senders=1)
+    # الطلبات تُضاف دفعة واحدة قبل أن يختار المرسل: التفاعلية أولاً وترتيب كل محادثة محفوظ
+    # (المحادثة التي لها طلب قيد الإرسال لا تمنع غيرها)
+    with queue._condition:
+        bulk = [queue.submit("send_message", "a", "a", f"a{i}", priority=BULK) for i in range(3)]
+        actions = [queue.send_chat_action("b", "typing") for _ in range(3)]
+        reply = queue.submit("reply_to", "b", SimpleNamespace(chat=SimpleNamespace(id="b")), "b1",
+                             priority=INTERACTIVE)
+    assert reply.result(5).message_id
+    for future in bulk + actions:
+        future.result(5)
+    assert bot.calls[0] == ("b", "typing"), bot.calls
+    assert [call for call in bot.calls if call[0] == "a"] == [("a", "a0"), ("a", "a1"), ("a", "a2")]
+    assert bot.calls.index(("b", "b1")) < bot.calls.index(("a", "a2"))
+    # إشعار الكتابة المكرر خلال مدة ظهوره لا يُرسل
+    queue.send_chat_action("b", "typing").result(5)
+    assert bot.calls.count(("b", "typing")) == 1
+    assert queue.stats()["coalesced"] == 3
+    
+    # رد 429 يُعاد بعد retry_after دون ظهور خطأ
+    bot.limited.add(("c", "c1"))
+    limited_bot = RateLimitedBot(bot, queue)
+    assert limited_bot.send_message("c", "c1").message_id
+    assert limited_bot.send_message("c", "c2").message_id
+    assert bot.calls[-2:] == [("c", "c1"), ("c", "c2")]
+    assert queue.stats()["retried"] == 1 and queue.stats()["failed"] == 0
+    queue.close()
+    
+    # حد المعدل لكل محادثة
+    slow = OutboundQueue(FakeBot(), global_rate=1000, chat_rate=20, chat_burst=1)
+    started = time.perf_counter()
+    for future in [slow.submit("send_message", "d", "d", str(i)) for i in range(4)]:
+        future.result(5)
+    assert time.perf_counter() - started >= 0.14
+    slow.close()
+    
+    # معاملات إشعار الكتابة تُمرر، ولا يُدمج إشعاران بمعاملات مختلفة
+    kwargs_bot = FakeBot()
+    kwargs_queue = OutboundQueue(kwargs_bot, global_rate=1000, chat_rate=1000, chat_burst=1000)
+    limited = RateLimitedBot(kwargs_bot, kwargs_queue)
+    limited.send_chat_action("e", "typing", message_thread_id=7)
+    limited.send_chat_action("e", "typing", message_thread_id=8)
+    limited.send_chat_action("e", "typing", message_thread_id=8)
+    kwargs_queue.close()
+    assert sorted(kwargs_bot.calls) == [("e", "typing", 7), ("e", "typing", 8)]
+    
+    # التشغيل غير المتزامن: نفس الحدود وإعادة المحاولة بعد 429
+    import asyncio
+    
+    class AsyncFakeBot:
+        def __init__(self):
+            self.bot = FakeBot()
+        async def send_message(self, chat_id, text, **kwargs):
+            return self.bot.send_message(chat_id, text)
+        async def send_chat_action(self, chat_id, action, **kwargs):
+            return self.bot.send_chat_action(chat_id, action, **kwargs)
+    
+    async def send_async():
+        fake = AsyncFakeBot()
+        fake.bot.limited.add(("f", "f1"))
+        limiter = AsyncRateLimiter(global_rate=1000, chat_rate=20, chat_burst=1)
+        bot = AsyncRateLimitedBot(fake, limiter)
+        started = time.perf_counter()
+        await asyncio.gather(*(bot.send_message("f", f"f{i}") for i in range(4)))
+        elapsed = time.perf_counter() - started
+        for _ in range(3):
+            await bot.send_chat_action("f", "typing")
+        return fake.bot.calls, elapsed, limiter.stats()
+    calls, elapsed, stats = asyncio.run(send_async())
+    # الترتيب محفوظ رغم إعادة الرسالة الأولى، ومعدل المحادثة محترم
+    assert calls == [("f", "f1"), ("f", "f0"), ("f", "f2"), ("f", "f3"), ("f", "typing")] or \
+        calls == [("f", "f0"), ("f", "f1"), ("f", "f2"), ("f", "f3"), ("f", "typing")], calls
+    assert elapsed >= 0.14
+    assert stats["retried"] == 1 and stats["failed"] == 0 and stats["coalesced"] == 2 and stats["pending"] == 0
+    
+    print("\n✅ انتهى اختبار طابور الرسائل الصادرة بنجاح")
+
+def test_user_dispatcher():
+    """اختبار موزع التحديثات حسب المستخدم"""
+    print("\n🧪 بدء اختبار موزع المستخدمين")
+    print("=" * 50)
+    
+    import threading
+    
+    dispatcher = UserDispatcher(fast_workers=2, slow_workers=2)
+    events = []
+    release = threading.Event()
+    fast_done = threading.Event()
+    
+    def slow_reply(user, text):
+        release.wait(5)
+        events.append((user, text, "slow"))
+    
+    def handle(user, text):
+        events.append((user, text, "fast"))
+        if text.startswith("?"):
+            dispatcher.continue_slow(slow_reply, user, text)
+        if user == 2:
+            fast_done.set()
+    
+    # المستخدم 1 ينتظر رد المساعد ورسالته التالية تنتظر خلفه
+    dispatcher.submit(1, handle, 1, "?a")
+    dispatcher.submit(1, handle, 1, "b")
+    dispatcher.submit(2, handle, 2, "c")
+    # الرسالة المحلية لمستخدم آخر لا تنتظر استفسار المساعد
+    assert fast_done.wait(5)
+    assert (1, "b", "fast") not in events
+    release.set()
+    dispatcher.close(5)
+    assert [event for event in events if event[0] == 1] == [(1, "?a", "fast"), (1, "?a", "slow"), (1, "b", "fast")]
+    
+    stats = dispatcher.stats()
+    assert stats["submitted"] == 3 and stats["completed"] == 3 and stats["handoffs"] == 1
+    assert stats["pending"] == 0 and stats["active_users"] == 0
+    assert stats["slow_wait_p99_ms"] >= 0
+    
+    # الاستدعاء خارج المسار السريع يُنفذ مباشرة، والخطأ لا يوقف طابور المستخدم
+    inline = []
+    dispatcher = UserDispatcher(fast_workers=1, slow_workers=1)
+    dispatcher.continue_slow(inline.append, "x")
+    assert inline == ["x"]
+    dispatcher.submit(3, lambda: 1 / 0)
+    dispatcher.submit(3, inline.append, "y")
+    dispatcher.close(5)
+    assert inline == ["x", "y"] and dispatcher.stats()["errors"] == 1
+    
+    # دون خيوط بطيئة يُكمل العمل في المسار السريع فلا يتوقف طابور المستخدم
+    dispatcher = UserDispatcher(fast_workers=1, slow_workers=0)
+    dispatcher.submit(4, lambda: dispatcher.continue_slow(inline.append, "z"))
+    dispatcher.submit(4, inline.append, "w")
+    dispatcher.close(5)
+    assert inline[-2:] == ["z", "w"] and dispatcher.stats()["handoffs"] == 0
+    
+    print("\n✅ انتهى اختبار موزع المستخدمين بنجاح")
+
+def test_thread_pool():
+    """اختبار مجمع threads المساعد المنشأة مسبقاً"""
+    print("\n🧪 بدء اختبار مجمع threads المساعد")
+    print("=" * 50)
+    
+    import asyncio
+    import itertools
+    import time
+    from types import SimpleNamespace
+    
+    counter = itertools.count()
+    def create():
+        return SimpleNamespace(id=f"thread_{next(counter)}")
+    
+    def wait_ready(pool, count):
+        deadline = time.monotonic() + 5
+        while pool.stats()["ready"] < count:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    
+    pool = AssistantThreadPool(size=3, refill_rate=1000)
+    assert pool.acquire() is None
+    pool.start(create)
+    wait_ready(pool, 3)
+    # لا يتجاوز المجمع حجمه، ويُعوض ما يُسحب منه
+    time.sleep(0.05)
+    assert pool.stats()["created"] == 3
+    assert pool.acquire() == "thread_0" and pool.acquire() == "thread_1"
+    wait_ready(pool, 3)
+    pool.close()
+    stats = pool.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["created"] == 5
+    
+    # معدل إعادة الملء محدود
+    slow = AssistantThreadPool(size=10, refill_rate=20)
+    slow.start(create)
+    time.sleep(0.2)
+    slow.close()
+    assert 2 <= slow.stats()["created"] <= 6
+    
+    async def fill_async():
+        async def create_async():
+            return create()
+        async_pool = AssistantThreadPool(size=2, refill_rate=1000)
+        filler = asyncio.create_task(async_pool.fill_async(create_async))
+        while async_pool.stats()["ready"] < 2:
+            await asyncio.sleep(0.01)
+        assert async_pool.acquire() is not None
+        while async_pool.stats()["ready"] < 2:
+            await asyncio.sleep(0.01)
+        async_pool.close()
+        await asyncio.wait_for(filler, 5)
+        return async_pool.stats()
+    stats = asyncio.run(fill_async())
+    assert stats["hits"] == 1 and stats["created"] == 3
+    
+    print("\n✅ انتهى اختبار مجمع threads المساعد بنجاح")
+
+def test_thread_store():
+    """اختبار مخزن روابط threads المساعد"""
+    print("\n🧪 بدء اختبار مخزن روابط threads")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "threads.sqlite")
+        now = [1000.0]
+        store = ThreadStore(path, max_entries=2, idle_ttl=100, flush_interval=60, clock=lambda: now[0])
+        for user_id in (1, 2, 3):
+            store[user_id] = f"thread_{user_id}"
+        # الذاكرة محدودة والرابط المحذوف منها يبقى في التعديلات المؤجلة
+        assert len(store) == 2 and store.stats()["evicted"] == 1
+        assert store.get(1) == "thread_1"
+        assert store.stats()["pending_writes"] == 3
+        store.flush()
+        assert store.stats()["pending_writes"] == 0
+        
+        # عملية أخرى تقرأ نفس الملف
+        other = ThreadStore(path, max_entries=2, idle_ttl=100, clock=lambda: now[0])
+        assert other.get(2) == "thread_2" and other.stats()["loads"] == 1
+        assert other.setdefault(2, "thread_new") == "thread_2"
+        assert other.setdefault(4, "thread_4") == "thread_4"
+        del store[1]
+        assert 1 not in store
+        store.close()
+        
+        # الروابط تبقى بعد إعادة التشغيل، والخامل منها يُحذف
+        restarted = ThreadStore(path, idle_ttl=100, clock=lambda: now[0])
+        assert restarted.get(1) is None and restarted.get(3) == "thread_3"
+        now[0] += 150
+        assert restarted.get(3) is None and restarted.stats()["expired"] == 1
+        restarted.close()
+        other.close()
+        reopened = ThreadStore(path, idle_ttl=100, clock=lambda: now[0])
+        # thread_4 كُتب عند إغلاق العملية الأخرى ثم انتهت مدته
+        assert reopened.get(4) is None and reopened.get(2) is None
+        reopened.close()
+        
+        # /reset في عملية لا تلغيه لمسة رابط مخزن في ذاكرة عملية أخرى
+        first = ThreadStore(path, idle_ttl=100, revalidate_interval=10, flush_interval=60, clock=lambda: now[0])
+        second = ThreadStore(path, idle_ttl=100, revalidate_interval=10, flush_interval=60, clock=lambda: now[0])
+        first[5] = "thread_5"
+        first.flush()
+        assert second.get(5) == "thread_5"
+        del first[5]
+        first.flush()
+        assert second.get(5) == "thread_5"
+        second.flush()
+        assert ThreadStore(path, idle_ttl=100, clock=lambda: now[0]).get(5) is None
+        # بعد مدة التحقق تُقارن الذاكرة بالقاعدة
+        now[0] += 10
+        assert second.get(5) is None and second.stats()["invalidated"] == 1
+        
+        # القراءة لا تنتظر عملية أخرى تحجز قفل الكتابة
+        first[6] = "thread_6"
+        first.flush()
+        import sqlite3
+        import time
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+        started = time.perf_counter()
+        assert second.get(6) == "thread_6"
+        assert time.perf_counter() - started < 1
+        blocker.execute("ROLLBACK")
+        blocker.close()
+        first.close()
+        second.close()
+    
+    print("\n✅ انتهى اختبار مخزن روابط threads بنجاح")
+
 def test_session_manager():
     """اختبار مدير الجلسات"""
     print("\n🧪 بدء اختبار مدير الجلسات")
@@ -101,6 +1113,39 @@ def test_session_manager():
     print(f"حالة الجلسة بعد المسح: {cleared_session.state.value}")
     print(f"السياق بعد المسح: {len(cleared_session.context)}")
     
+    # اختبار انتهاء الجلسات في الخلفية
+    print("\n5. اختبار انتهاء الجلسات:")
+    import time
+    from datetime import datetime, timedelta
+    manager = SessionManager()
+    manager.session_timeout = 0.005  # 0.3 ثانية
+    for user_id in range(5):
+        manager.get_session(user_id).add_to_history("user_message", "مرحبا")
+    active = manager.get_session(0)
+    active.state = SessionState.AWAITING_CHOICE
+    manager.start_sweeper(0.02)
+    deadline = time.monotonic() + 5
+    try:
+        # الجلسة النشطة يحل موعدها المسجل فتُعاد بموعدها الجديد، والخاملة تُحذف
+        while len(manager.sessions) > 1:
+            assert time.monotonic() < deadline
+            assert manager.get_session(0) is active
+            time.sleep(0.02)
+    finally:
+        manager.stop_sweeper()
+    assert list(manager.sessions) == [0] and manager.expired_total == 4
+    assert manager.get_session_stats() == {"total_active": 1, "states_distribution": {"awaiting_choice": 1},
+                                           "average_history_length": 1}
+    
+    # الجلسة المنتهية المستبدلة في get_session لا تُحسب مرتين
+    manager = SessionManager()
+    for user_id in range(3):
+        manager.get_session(user_id).add_to_history("user_message", "مرحبا")
+    manager.sessions[2].last_activity = datetime.now() - timedelta(minutes=manager.session_timeout + 1)
+    assert manager.get_session(2).conversation_history == []
+    stats = manager.get_session_stats()
+    assert stats["total_active"] == 3 and stats["average_history_length"] == 2 / 3
+    
     print("\n✅ انتهى اختبار مدير الجلسات بنجاح")
 
 def test_integration():
@@ -153,6 +1198,28 @@ def test_integration():
 if __name__ == "__main__":
     try:
         test_islamic_explainer()
+        test_substring_index()
+        test_concept_stores()
+        test_index_snapshot()
+        test_bm25_ranking()
+        test_render_cache()
+        test_concept_graph()
+        test_category_browsing()
+        test_fuzzy_lookup()
+        test_arabic_normalization()
+        test_alias_lookup()
+        test_query_plan()
+        test_incremental_updates()
+        test_batch_search()
+        test_intent_router()
+        test_streaming_reply()
+        test_run_poller()
+        test_answer_cache()
+        test_webhook_server()
+        test_outbound_queue()
+        test_user_dispatcher()
+        test_thread_pool()
+        test_thread_store()
         test_session_manager()
         test_integration()
         print("\n🎉 جميع الاختبارات اكتملت بنجاح!")
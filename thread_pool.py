@@ -0,0 +1,118 @@
+"""
+مجمع threads المساعد المنشأة مسبقاً
+أول سؤال لكل مستخدم (وبعد /reset أو إعادة التشغيل) كان ينتظر
+beta.threads.create قبل إرسال رسالته. المجمع يحتفظ في الخلفية بعدد محدد من
+threads الجاهزة ويعيد ملأه بمعدل محدود، فيحصل الطلب على thread فوراً ولا
+يُنشأ thread على المسار الحرج إلا عند فراغ المجمع.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AssistantThreadPool:
+    """معرفات threads جاهزة تُسلم فوراً وتُعوض في الخلفية"""
+
+    def __init__(self, size: int = 8, refill_rate: float = 2.0, error_backoff: float = 5.0):
+        """refill_rate: أقصى عدد من threads المنشأة في الثانية لإعادة الملء"""
+        self.size = size
+        self.refill_rate = refill_rate
+        self.error_backoff = error_backoff
+        self._ids: Deque[str] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._filler: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.counters = {"hits": 0, "misses": 0, "created": 0, "errors": 0}
+
+    def acquire(self) -> Optional[str]:
+        """thread جاهز أو None إن كان المجمع فارغاً (ينشئه الطلب بنفسه)"""
+        with self._condition:
+            if self._ids:
+                self.counters["hits"] += 1
+                thread_id = self._ids.popleft()
+            else:
+                self.counters["misses"] += 1
+                thread_id = None
+            self._condition.notify()
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return thread_id
+
+    def _add(self, thread_id: str):
+        with self._condition:
+            self._ids.append(thread_id)
+            self.counters["created"] += 1
+
+    def _needs_refill(self) -> bool:
+        return not self._closed and len(self._ids) < self.size
+
+    def start(self, create: Callable[[], Any]):
+        """ملء المجمع في خيط خلفي؛ create تعيد thread جديداً (له id)"""
+        self._filler = threading.Thread(target=self._fill, args=(create,), name="thread-pool-filler",
+                                        daemon=True)
+        self._filler.start()
+
+    def _fill(self, create: Callable[[], Any]):
+        while True:
+            with self._condition:
+                while not self._closed and not self._needs_refill():
+                    self._condition.wait()
+                if self._closed:
+                    return
+            started = time.monotonic()
+            try:
+                self._add(create().id)
+            except Exception as e:
+                logger.error(f"تعذر إنشاء thread مسبقاً: {e}")
+                self.counters["errors"] += 1
+                self._sleep(self.error_backoff)
+                continue
+            self._sleep(1 / self.refill_rate - (time.monotonic() - started))
+
+    def _sleep(self, seconds: float):
+        if seconds > 0:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed, seconds)
+
+    async def fill_async(self, create: Callable[[], Awaitable[Any]]):
+        """ملء المجمع كمهمة asyncio (تشغيل AsyncOpenAI) حتى الإغلاق أو الإلغاء"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while not self._closed:
+            if not self._needs_refill():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            started = time.monotonic()
+            try:
+                self._add((await create()).id)
+            except Exception as e:
+                logger.error(f"تعذر إنشاء thread مسبقاً: {e}")
+                self.counters["errors"] += 1
+                await asyncio.sleep(self.error_backoff)
+                continue
+            await asyncio.sleep(max(0.0, 1 / self.refill_rate - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            stats = dict(self.counters)
+            stats["ready"] = len(self._ids)
+        return stats
+
+    def close(self):
+        """إيقاف إعادة الملء؛ threads الجاهزة تبقى دون استخدام"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        if self._filler is not None:
+            self._filler.join()
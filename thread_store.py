@@ -0,0 +1,271 @@
+"""
+مخزن ربط المستخدمين بـ threads المساعد
+بديل القاموس active_threads الذي يكبر مع كل مستخدم ويضيع عند إعادة التشغيل:
+ذاكرة LRU محدودة أمام قاعدة SQLite محلية (WAL)، فتبقى الذاكرة ثابتة في
+التشغيل الطويل ويستعيد المستخدم thread بعد إعادة التشغيل دون threads.create.
+- الكتابة مؤجلة: التعديلات تُجمع وتُكتب دفعة واحدة في الخلفية
+- الربط الخامل أكثر من idle_ttl يُحذف من الذاكرة والقاعدة
+- عدة عمليات تتشارك نفس الملف؛ ذاكرة كل عملية تُملأ من القاعدة عند الحاجة،
+  ويُعاد التحقق من الرابط فيها بعد revalidate_interval فيظهر حذف عملية أخرى
+  (مثل /reset)، وتحديث آخر استخدام يُكتب UPDATE فقط فلا يعيد رابطاً محذوفاً
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# علامة الحذف في التعديلات المؤجلة
+_DELETED = None
+
+
+class ThreadStore:
+    """ربط معرف المستخدم بمعرف thread مع ذاكرة LRU وكتابة مؤجلة إلى SQLite"""
+
+    def __init__(self, path: str, max_entries: int = 10000, idle_ttl: float = 30 * 86400.0,
+                 flush_interval: float = 1.0, batch_size: int = 256, sweep_interval: float = 600.0,
+                 revalidate_interval: float = 5.0, clock: Callable[[], float] = time.time):
+        """max_entries: أقصى عدد من الروابط في الذاكرة (القاعدة تحتفظ بالباقي)
+        flush_interval: أقصى مدة تبقى فيها التعديلات في الذاكرة قبل كتابتها
+        revalidate_interval: مدة الوثوق برابط في الذاكرة قبل مقارنته بالقاعدة
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.revalidate_interval = revalidate_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._flush_needed = threading.Condition(self._lock)
+        # المستخدم -> (thread، آخر استخدام، آخر تحقق من القاعدة)
+        self._entries: "OrderedDict[Hashable, Tuple[str, float, float]]" = OrderedDict()
+        # تعديلات لم تُكتب بعد؛ تبقى حتى تصل إلى القاعدة فتُقرأ منها عند غياب الرابط من الذاكرة
+        self._dirty: Dict[Hashable, Optional[Tuple[str, float]]] = {}
+        # تحديثات آخر استخدام لروابط موجودة في القاعدة؛ لا تُدرج صفاً إن حُذف
+        self._touched: Dict[Hashable, Tuple[str, float]] = {}
+        # اتصالان منفصلان: القراءة (WAL) لا تنتظر معاملة كتابة جارية في هذه العملية أو غيرها
+        self._write_lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            "user_id TEXT PRIMARY KEY, thread_id TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS threads_last_used ON threads (last_used)")
+        self._connection.commit()
+        self._db_lock = threading.Lock()
+        self._reader = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._last_sweep = 0.0
+        self._closed = False
+        self.counters = {"hits": 0, "loads": 0, "misses": 0, "evicted": 0, "expired": 0, "invalidated": 0,
+                         "flushes": 0}
+        self._writer = threading.Thread(target=self._write_behind, name="thread-store-writer", daemon=True)
+        self._writer.start()
+
+    def _expired(self, last_used: float, now: float) -> bool:
+        return self.idle_ttl > 0 and now - last_used > self.idle_ttl
+
+    def get(self, user_id: Hashable, default: Optional[str] = None) -> Optional[str]:
+        """thread المستخدم وتحديث آخر استخدام له"""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            pending = user_id in self._dirty
+            if entry is None and pending:
+                entry = self._dirty[user_id]
+                if entry is _DELETED:
+                    self.counters["misses"] += 1
+                    return default
+            elif entry is not None and not pending and now - entry[2] >= self.revalidate_interval:
+                # قد تكون عملية أخرى حذفته أو غيرته؛ القاعدة هي المرجع
+                entry = None
+            if entry is not None:
+                self.counters["hits"] += 1
+        loaded = entry is None
+        if loaded:
+            entry = self._load(user_id)
+            if entry is None:
+                with self._lock:
+                    if user_id not in self._dirty and self._entries.pop(user_id, None) is not None:
+                        self.counters["invalidated"] += 1
+        if entry is None or self._expired(entry[1], now):
+            with self._lock:
+                if entry is not None:
+                    self.counters["expired"] += 1
+                    self._entries.pop(user_id, None)
+                    self._touched.pop(user_id, None)
+                    self._mark(user_id, _DELETED)
+                self.counters["misses"] += 1
+            return default
+
+        with self._lock:
+            # رابط أحدث كُتب أثناء القراءة من القاعدة يبقى كما هو
+            if user_id in self._dirty:
+                current = self._dirty[user_id]
+                if current is _DELETED:
+                    self.counters["misses"] += 1
+                    return default
+                self._remember(user_id, (current[0], now))
+                return current[0]
+            cached = self._entries.get(user_id)
+            if loaded and cached is not None and cached[0] != entry[0]:
+                self.counters["invalidated"] += 1
+            self._touch(user_id, entry[0], now, now if loaded else entry[2])
+        return entry[0]
+
+    def _load(self, user_id: Hashable) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._reader.execute(
+                "SELECT thread_id, last_used FROM threads WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        if row is not None:
+            with self._lock:
+                self.counters["loads"] += 1
+        return row
+
+    def _remember(self, user_id: Hashable, entry: Tuple[str, float]):
+        """تخزين الرابط في الذاكرة وتسجيل تعديله (يُستدعى مع القفل)"""
+        self._cache(user_id, (entry[0], entry[1], entry[1]))
+        self._touched.pop(user_id, None)
+        self._mark(user_id, entry)
+
+    def _touch(self, user_id: Hashable, thread_id: str, now: float, checked_at: float):
+        """تحديث آخر استخدام لرابط موجود في القاعدة (يُستدعى مع القفل)"""
+        self._cache(user_id, (thread_id, now, checked_at))
+        self._touched[user_id] = (thread_id, now)
+        if len(self._touched) >= self.batch_size:
+            self._flush_needed.notify()
+
+    def _cache(self, user_id: Hashable, entry: Tuple[str, float, float]):
+        self._entries[user_id] = entry
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            # يبقى في القاعدة (أو في التعديلات المؤجلة) ويُقرأ منها عند الحاجة
+            self._entries.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    def _mark(self, user_id: Hashable, entry: Optional[Tuple[str, float]]):
+        self._dirty[user_id] = entry
+        if len(self._dirty) >= self.batch_size:
+            self._flush_needed.notify()
+
+    def __contains__(self, user_id: Hashable) -> bool:
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id: Hashable) -> str:
+        thread_id = self.get(user_id)
+        if thread_id is None:
+            raise KeyError(user_id)
+        return thread_id
+
+    def __setitem__(self, user_id: Hashable, thread_id: str):
+        with self._lock:
+            self._remember(user_id, (thread_id, self.clock()))
+
+    def __delitem__(self, user_id: Hashable):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._touched.pop(user_id, None)
+            self._mark(user_id, _DELETED)
+
+    def setdefault(self, user_id: Hashable, thread_id: str) -> str:
+        """thread المستخدم الحالي، أو ربطه بـ thread_id إن لم يكن له"""
+        current = self.get(user_id)
+        if current is not None:
+            return current
+        self[user_id] = thread_id
+        return thread_id
+
+    def __len__(self) -> int:
+        """عدد الروابط في الذاكرة"""
+        return len(self._entries)
+
+    def flush(self):
+        """كتابة التعديلات المؤجلة في معاملة واحدة وحذف الروابط الخاملة"""
+        with self._lock:
+            batch = dict(self._dirty)
+            touched = dict(self._touched)
+        now = self.clock()
+        sweep = self.idle_ttl > 0 and now - self._last_sweep >= self.sweep_interval
+        if not batch and not touched and not sweep:
+            return
+
+        upserts: List[Tuple[str, str, float]] = []
+        deletes: List[Tuple[str]] = []
+        for user_id, entry in batch.items():
+            if entry is _DELETED:
+                deletes.append((str(user_id),))
+            else:
+                upserts.append((str(user_id), entry[0], entry[1]))
+        touches = [(entry[1], str(user_id), entry[0]) for user_id, entry in touched.items()]
+        with self._write_lock:
+            with self._connection:
+                if upserts:
+                    self._connection.executemany(
+                        "INSERT INTO threads (user_id, thread_id, last_used) VALUES (?, ?, ?) "
+                        "ON CONFLICT(user_id) DO UPDATE SET thread_id = excluded.thread_id, "
+                        "last_used = MAX(threads.last_used, excluded.last_used)",
+                        upserts
+                    )
+                if deletes:
+                    self._connection.executemany("DELETE FROM threads WHERE user_id = ?", deletes)
+                if touches:
+                    self._connection.executemany(
+                        "UPDATE threads SET last_used = MAX(last_used, ?) WHERE user_id = ? AND thread_id = ?",
+                        touches
+                    )
+                if sweep:
+                    self._connection.execute("DELETE FROM threads WHERE last_used < ?", (now - self.idle_ttl,))
+                    self._last_sweep = now
+
+        with self._lock:
+            for user_id, entry in batch.items():
+                # ما عُدل أثناء الكتابة يبقى للدفعة التالية
+                if self._dirty.get(user_id, entry) is entry:
+                    self._dirty.pop(user_id, None)
+            for user_id, entry in touched.items():
+                if self._touched.get(user_id, entry) is entry:
+                    self._touched.pop(user_id, None)
+            if sweep:
+                idle = [user_id for user_id, entry in self._entries.items() if self._expired(entry[1], now)]
+                for user_id in idle:
+                    del self._entries[user_id]
+                self.counters["expired"] += len(idle)
+            self.counters["flushes"] += 1
+
+    def _write_behind(self):
+        while True:
+            with self._lock:
+                if not self._closed and max(len(self._dirty), len(self._touched)) < self.batch_size:
+                    self._flush_needed.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"تعذر كتابة روابط threads: {e}")
+            if closed:
+                return
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["size"] = len(self._entries)
+            stats["pending_writes"] = len(self._dirty) + len(self._touched)
+        return stats
+
+    def close(self):
+        """كتابة ما تبقى وإغلاق القاعدة"""
+        with self._lock:
+            self._closed = True
+            self._flush_needed.notify()
+        self._writer.join()
+        with self._write_lock:
+            self._connection.close()
+        with self._db_lock:
+            self._reader.close()
@@ -0,0 +1,181 @@
+"""
+موزع التحديثات حسب المستخدم
+بديل مجمع خيوط telebot المشترك: رسائل كل مستخدم تُعالج بالترتيب واحدة تلو
+الأخرى (فلا تتداخل تحولات SessionState لرسالتين سريعتين)، ومستخدمون مختلفون
+يُعالجون بالتوازي. للعمل مساران بخيوط منفصلة:
+- سريع: الأوامر والشارح المحلي، وكل رسالة تبدأ فيه
+- بطيء: استفسارات OpenAI؛ المعالج ينقل بقية عمله إليه عبر continue_slow
+  فلا يحجز طلب مساعد بطيء خيطاً تحتاجه الردود المحلية للمستخدمين الآخرين
+مع عمق الطوابير وزمن الانتظار (p50/p99) لكل مسار.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from run_poller import percentile
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+SLOW = "slow"
+
+
+class _Task:
+    """عمل واحد ووقت دخوله الطابور"""
+
+    __slots__ = ("fn", "args", "queued_at")
+
+    def __init__(self, fn: Callable, args: tuple, queued_at: float):
+        self.fn = fn
+        self.args = args
+        self.queued_at = queued_at
+
+
+class _UserQueue:
+    """أعمال المستخدم المنتظرة خلف العمل الجاري"""
+
+    __slots__ = ("tasks",)
+
+    def __init__(self):
+        self.tasks: Deque[_Task] = deque()
+
+
+class UserDispatcher:
+    """توزيع الأعمال على مسارين مع الحفاظ على ترتيب أعمال كل مستخدم"""
+
+    def __init__(self, fast_workers: int = 4, slow_workers: int = 16, history_size: int = 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        """slow_workers=0: لا مسار بطيء، وعمل continue_slow يُنفذ في المسار السريع"""
+        if fast_workers < 1:
+            raise ValueError("الموزع يحتاج خيطاً واحداً على الأقل في المسار السريع")
+        if slow_workers < 0:
+            raise ValueError("عدد خيوط المسار البطيء لا يكون سالباً")
+        self.clock = clock
+        self.slow_workers = slow_workers
+        self._lock = threading.Lock()
+        self._lanes = {FAST: threading.Condition(self._lock), SLOW: threading.Condition(self._lock)}
+        # الأعمال الجاهزة للتنفيذ في كل مسار (عمل واحد على الأكثر لكل مستخدم)
+        self._ready: Dict[str, Deque[Tuple[Any, _Task]]] = {FAST: deque(), SLOW: deque()}
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=history_size) for lane in (FAST, SLOW)}
+        # المستخدمون الذين لهم عمل جارٍ أو جاهز؛ يُحذف المستخدم عند فراغ طابوره
+        self._users: Dict[Any, _UserQueue] = {}
+        self._local = threading.local()
+        self._closed = False
+        self.counters = {"submitted": 0, "completed": 0, "errors": 0, "handoffs": 0}
+        self._threads: List[threading.Thread] = []
+        for lane, workers in ((FAST, fast_workers), (SLOW, slow_workers)):
+            for i in range(workers):
+                thread = threading.Thread(target=self._work, args=(lane,), name=f"dispatch-{lane}-{i}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, key, fn: Callable, *args):
+        """إضافة عمل للمستخدم key في المسار السريع بعد أعماله السابقة"""
+        task = _Task(fn, args, self.clock())
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("الموزع مغلق")
+            self.counters["submitted"] += 1
+            user = self._users.get(key)
+            if user is not None:
+                user.tasks.append(task)
+                return
+            self._users[key] = _UserQueue()
+            self._ready[FAST].append((key, task))
+            self._lanes[FAST].notify()
+
+    def continue_slow(self, fn: Callable, *args):
+        """نقل بقية عمل المعالج الحالي إلى المسار البطيء
+
+        يُنفذ fn بعد عودة المعالج، وتبقى رسائل المستخدم التالية منتظرة حتى
+        ينتهي. خارج المسار السريع (أو دون موزع أو خيوط بطيئة) يُنفذ fn مباشرة.
+        """
+        if (not self.slow_workers or getattr(self._local, "lane", None) != FAST
+                or self._local.continuation is not None):
+            fn(*args)
+            return
+        self._local.continuation = _Task(fn, args, self.clock())
+
+    def _work(self, lane: str):
+        condition = self._lanes[lane]
+        ready = self._ready[lane]
+        while True:
+            with condition:
+                while not ready and not (self._closed and not self._users):
+                    condition.wait()
+                if not ready:
+                    return
+                key, task = ready.popleft()
+                self._waits[lane].append(self.clock() - task.queued_at)
+
+            self._local.lane = lane
+            self._local.continuation = None
+            try:
+                task.fn(*task.args)
+                failed = False
+            except Exception as e:
+                logger.error(f"خطأ في معالجة عمل المستخدم {key}: {e}")
+                failed = True
+            continuation = None if failed else self._local.continuation
+            self._local.lane = None
+            self._local.continuation = None
+
+            with self._lock:
+                if failed:
+                    self.counters["errors"] += 1
+                if continuation is not None:
+                    self.counters["handoffs"] += 1
+                    self._ready[SLOW].append((key, continuation))
+                    self._lanes[SLOW].notify()
+                    continue
+                self.counters["completed"] += 1
+                self._advance(key)
+
+    def _advance(self, key):
+        """جدولة العمل التالي للمستخدم أو حذفه إن لم يبقَ له شيء"""
+        user = self._users[key]
+        if user.tasks:
+            self._ready[FAST].append((key, user.tasks.popleft()))
+            self._lanes[FAST].notify()
+            return
+        del self._users[key]
+        if self._closed and not self._users:
+            for condition in self._lanes.values():
+                condition.notify_all()
+
+    def pending(self) -> int:
+        """عدد الأعمال التي لم يبدأ تنفيذها"""
+        with self._lock:
+            return self._pending()
+
+    def _pending(self) -> int:
+        return (sum(len(user.tasks) for user in self._users.values())
+                + len(self._ready[FAST]) + len(self._ready[SLOW]))
+
+    def stats(self) -> Dict[str, float]:
+        """العدادات وعمق الطوابير وp50/p99 لزمن الانتظار بالمللي ثانية لكل مسار"""
+        with self._lock:
+            stats: Dict[str, float] = dict(self.counters)
+            stats["pending"] = self._pending()
+            stats["active_users"] = len(self._users)
+            waits = {lane: list(values) for lane, values in self._waits.items()}
+            for lane, ready in self._ready.items():
+                stats[f"{lane}_ready"] = len(ready)
+        for lane, values in waits.items():
+            stats[f"{lane}_wait_p50_ms"] = percentile(values, 0.50) * 1000
+            stats[f"{lane}_wait_p99_ms"] = percentile(values, 0.99) * 1000
+        return stats
+
+    def close(self, timeout: Optional[float] = None):
+        """رفض الأعمال الجديدة وإنهاء الخيوط بعد إكمال ما في الطوابير"""
+        with self._lock:
+            self._closed = True
+            for condition in self._lanes.values():
+                condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
@@ -0,0 +1,156 @@
+"""
+استقبال تحديثات تيليجرام عبر webhook
+خادم HTTP محلي خفيف يتحقق من الرمز السري في ترويسة
+X-Telegram-Bot-Api-Secret-Token ويضع التحديثات في طابور محدود يستهلكه عدد
+قابل للضبط من خيوط المعالجة. دون رمز سري مُعطى يُولَّد رمز عشوائي يُسجل مع
+set_webhook، فلا يقبل الخادم تحديثات مزورة من غير تيليجرام. عند امتلاء الطابور يرد الخادم بـ 503 فيعيد
+تيليجرام الإرسال لاحقاً (ضغط عكسي بدلاً من تراكم غير محدود في الذاكرة).
+"""
+
+import hmac
+import json
+import logging
+import queue
+import secrets
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# أكبر جسم طلب مقبول (تحديثات تيليجرام أصغر بكثير)
+MAX_BODY_SIZE = 1 << 20
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # طابور الاتصالات الافتراضي (5) يقطع الاتصالات المتزامنة من تيليجرام
+    request_queue_size = 128
+
+
+class WebhookServer:
+    """خادم webhook بطابور محدود وخيوط معالجة"""
+
+    def __init__(self, process_update: Callable[[Dict[str, Any]], Any], secret_token: Optional[str] = None,
+                 host: str = "0.0.0.0", port: int = 8443, path: str = "/webhook",
+                 workers: int = 8, queue_size: int = 1000):
+        """process_update: تُستدعى في خيط معالجة لكل تحديث (قاموس JSON)
+        secret_token: يُمرر إلى set_webhook؛ يُولَّد عشوائياً إن لم يُعطَ
+        """
+        self.process_update = process_update
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.path = path
+        self.workers = workers
+        self.updates: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self.counters = {"received": 0, "rejected": 0, "dropped": 0, "processed": 0, "errors": 0}
+        self._counters_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._server = _HTTPServer((host, port), self._request_handler())
+
+    @property
+    def port(self) -> int:
+        """المنفذ الفعلي (مفيد مع المنفذ 0 في الاختبارات)"""
+        return self._server.server_address[1]
+
+    def _count(self, name: str):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def _request_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.send_response(server.accept(self.path, self.headers, self.rfile))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def accept(self, path: str, headers, body) -> int:
+        """التحقق من الطلب ووضع التحديث في الطابور وإرجاع رمز حالة HTTP"""
+        if path != self.path:
+            return 404
+        if not hmac.compare_digest(headers.get(SECRET_TOKEN_HEADER, ""), self.secret_token):
+            self._count("rejected")
+            return 403
+
+        try:
+            length = int(headers.get("Content-Length") or 0)
+        except ValueError:
+            return 400
+        if length <= 0 or length > MAX_BODY_SIZE:
+            return 400
+        try:
+            update = json.loads(body.read(length))
+        except ValueError:
+            return 400
+
+        try:
+            self.updates.put_nowait(update)
+        except queue.Full:
+            # تيليجرام يعيد إرسال التحديث لاحقاً
+            self._count("dropped")
+            return 503
+        self._count("received")
+        return 200
+
+    def _work(self):
+        while True:
+            update = self.updates.get()
+            if update is None:
+                break
+            try:
+                self.process_update(update)
+                self._count("processed")
+            except Exception as e:
+                logger.error(f"خطأ في معالجة تحديث webhook: {e}")
+                self._count("errors")
+
+    def _start_workers(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"webhook-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def start(self):
+        """تشغيل خيوط المعالجة والخادم في الخلفية"""
+        self._start_workers()
+        threading.Thread(target=self._server.serve_forever, name="webhook-server", daemon=True).start()
+
+    def stop(self):
+        """إيقاف الاستقبال ثم إنهاء الخيوط بعد معالجة ما في الطابور"""
+        self._server.shutdown()
+        self._server.server_close()
+        for _ in self._threads:
+            self.updates.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._counters_lock:
+            stats = dict(self.counters)
+        stats["queue_depth"] = self.updates.qsize()
+        return stats
+
+
+def send_fake_update(url: str, update: Dict[str, Any], secret_token: Optional[str] = None,
+                     timeout: float = 5.0) -> int:
+    """إرسال تحديث كما يرسله تيليجرام وإرجاع رمز الحالة (للاختبارات والقياس)"""
+    request = urllib.request.Request(url, data=json.dumps(update).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    if secret_token:
+        request.add_header(SECRET_TOKEN_HEADER, secret_token)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code